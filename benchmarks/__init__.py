@@ -0,0 +1,4 @@
+"""
+Benchmarks de ASFORP. Se ejecutan desde la raíz del repositorio con
+`python -m benchmarks.<nombre>`.
+"""
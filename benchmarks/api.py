@@ -0,0 +1,242 @@
+"""
+Prueba de carga reproducible de los endpoints /api.
+
+Crea una base de datos temporal con N usuarios sintéticos, lanza register,
+login, verify-email, profile, upgrade-premium y el listado de usuarios contra
+la app WSGI (en proceso, con el cliente de pruebas de Flask) a varios niveles
+de concurrencia e informa de p50/p95/p99 y peticiones por segundo.
+
+    python -m benchmarks.api --users 100000 --concurrency 1,8,32 --requests 500 --output results.json
+    python -m benchmarks.api --users 100000 --compare results.json
+
+El envío de emails se sustituye por una función vacía.
+"""
+import argparse
+import itertools
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import (
+    load_results, run_concurrent, save_results, stub_email, use_throwaway_database
+)
+
+SCENARIOS = ['register', 'login', 'verify-email', 'profile', 'upgrade-premium', 'list-users']
+SEED_PASSWORD = 'benchmark-password'
+
+
+def seed_users(app, count, chunk=10000):
+    """
+    Inserta `count` usuarios con INSERTs masivos. Todos comparten un único hash
+    de contraseña (calculado con el método configurado) para no tardar horas.
+    Usuario i: verificado si i es par, premium si i es múltiplo de 10.
+    """
+    from sqlalchemy import insert
+    from src.models.user import User, db
+    from src.utils.passwords import password_hasher
+
+    password_hash = password_hasher.hash(SEED_PASSWORD)
+    now = datetime.utcnow()
+    with app.app_context():
+        for start in range(0, count, chunk):
+            rows = []
+            for i in range(start, min(start + chunk, count)):
+                rows.append({
+                    'username': f'bench{i}',
+                    'email': f'bench{i}@bench.local',
+                    'password_hash': password_hash,
+                    'full_name': f'Usuario Benchmark {i}',
+                    'phone': '',
+                    'is_verified': i % 2 == 0,
+                    'is_premium': i % 10 == 0,
+                    'created_at': now,
+                    'premium_expires_at': now + timedelta(days=365) if i % 10 == 0 else None
+                })
+            db.session.execute(insert(User), rows)
+            db.session.commit()
+
+
+class Pools:
+    """
+    Usuarios sembrados agrupados por estado. Los escenarios que modifican el
+    usuario (verify-email, upgrade-premium) consumen cada usuario una sola vez.
+    """
+
+    def __init__(self, count):
+        ids = range(1, count + 1)
+        self.verified = [i for i in ids if (i - 1) % 2 == 0]
+        self.unverified = itertools.cycle([i for i in ids if (i - 1) % 2 == 1])
+        self.upgradable = iter([i for i in ids if (i - 1) % 2 == 0 and (i - 1) % 10 != 0])
+        self.count = count
+        self.register_counter = itertools.count()
+        self.lock = threading.Lock()
+
+    def next(self, iterator):
+        with self.lock:
+            return next(iterator)
+
+
+def login_client(client, user_id):
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+        session['username'] = f'bench{user_id - 1}'
+
+
+def make_worker(app, scenario, pools, expected):
+    from src.utils.tokens import generate_verification_token
+
+    def worker(index, iterations, latencies, errors):
+        client = app.test_client()
+        rng = random.Random(index)
+        if scenario == 'profile':
+            login_client(client, rng.choice(pools.verified))
+
+        for _ in range(iterations):
+            # Preparación fuera de la medida
+            if scenario == 'register':
+                n = pools.next(pools.register_counter)
+                request = lambda: client.post('/api/register', json={
+                    'username': f'new{n}', 'email': f'new{n}@bench.local',
+                    'password': SEED_PASSWORD, 'full_name': f'Nuevo {n}'
+                })
+            elif scenario == 'login':
+                user = rng.choice(pools.verified) - 1
+                request = lambda: client.post('/api/login', json={'username': f'bench{user}', 'password': SEED_PASSWORD})
+            elif scenario == 'verify-email':
+                user_id = pools.next(pools.unverified)
+                with app.app_context():
+                    token = generate_verification_token(user_id, f'bench{user_id - 1}@bench.local')
+                request = lambda: client.get(f'/api/verify-email?token={token}')
+            elif scenario == 'profile':
+                request = lambda: client.get('/api/profile')
+            elif scenario == 'upgrade-premium':
+                login_client(client, pools.next(pools.upgradable))
+                request = lambda: client.post('/api/upgrade-premium', json={'payment_reference': 'BENCH'})
+            else:
+                cursor = rng.randrange(pools.count)
+                request = lambda: client.get(f'/api/?cursor={cursor}&limit=100')
+
+            start = time.perf_counter()
+            response = request()
+            response.get_data()
+            latencies.append(time.perf_counter() - start)
+            if response.status_code not in expected:
+                errors.append(response.status_code)
+
+    return worker
+
+
+EXPECTED_STATUS = {
+    'register': {201},
+    'login': {200},
+    'verify-email': {200},
+    'profile': {200},
+    'upgrade-premium': {200},
+    'list-users': {200},
+}
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(current, baseline, threshold):
+    """
+    Imprime la diferencia con una ejecución anterior. Devuelve True si hay
+    alguna regresión mayor que `threshold` (en %) en req/s o en p95.
+    """
+    previous = {(r['scenario'], r['concurrency']): r for r in baseline['results']}
+    regressed = False
+    print(f"\n{'escenario':<18}{'conc':>5}{'req/s':>12}{'Δ':>9}{'p95 ms':>10}{'Δ':>9}")
+    for result in current['results']:
+        old = previous.get((result['scenario'], result['concurrency']))
+        if not old:
+            continue
+        rps_delta = (result['requests_per_second'] - old['requests_per_second']) / old['requests_per_second'] * 100 if old['requests_per_second'] else 0
+        p95_delta = (result['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100 if old['p95_ms'] else 0
+        flag = ''
+        if rps_delta < -threshold or p95_delta > threshold:
+            regressed = True
+            flag = '  REGRESIÓN'
+        print(f"{result['scenario']:<18}{result['concurrency']:>5}{result['requests_per_second']:>12.1f}"
+              f"{rps_delta:>8.1f}%{result['p95_ms']:>10.2f}{p95_delta:>8.1f}%{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10000, help='Usuarios sintéticos a sembrar (10k a 1M)')
+    parser.add_argument('--concurrency', type=lambda v: [int(x) for x in v.split(',')], default=[1, 8, 32])
+    parser.add_argument('--requests', type=int, default=300, help='Peticiones por escenario y nivel de concurrencia')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--hash-method', help='PASSWORD_HASH_METHOD para la ejecución (por defecto el de la app)')
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--output', help='Guarda los resultados en este fichero JSON')
+    parser.add_argument('--compare', help='JSON de una ejecución anterior con el que comparar')
+    parser.add_argument('--threshold', type=float, default=10.0, help='% de empeoramiento considerado regresión')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    scenarios = args.scenarios.split(',')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        use_throwaway_database(tmp)
+        from src.main import create_app
+        # Todas las peticiones salen de la misma IP: se mide la app, no el limitador
+        app = create_app({'SCHEMA_AUTO_CREATE': True, 'RATE_LIMIT_ENABLED': False})
+        from src.routes import user as user_routes
+        from src.utils.passwords import password_hasher
+
+        if args.hash_method:
+            password_hasher.configure(method=args.hash_method)
+        stub_email(user_routes.email_service)
+
+        start = time.perf_counter()
+        seed_users(app, args.users)
+        print(f"Sembrados {args.users} usuarios en {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+        pools = Pools(args.users)
+        results = []
+        for scenario in scenarios:
+            for concurrency in args.concurrency:
+                worker = make_worker(app, scenario, pools, EXPECTED_STATUS[scenario])
+                summary = run_concurrent(concurrency, args.requests, worker)
+                summary.update({'scenario': scenario, 'concurrency': concurrency})
+                results.append(summary)
+                print(f"{scenario:<18} c={concurrency:<3} {summary['requests_per_second']:>9.1f} req/s  "
+                      f"p50={summary['p50_ms']:.2f}ms p95={summary['p95_ms']:.2f}ms p99={summary['p99_ms']:.2f}ms "
+                      f"errores={summary['errors']}")
+
+        report = {
+            'meta': {
+                'timestamp': datetime.utcnow().isoformat(),
+                'git_revision': git_revision(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'users': args.users,
+                'requests': args.requests,
+                'concurrency': args.concurrency,
+                'password_hash_method': password_hasher.method,
+                'sqlite_profile': app.config.get('SQLITE_PROFILE')
+            },
+            'results': results
+        }
+
+    if args.output:
+        save_results(args.output, report)
+
+    if args.compare:
+        if compare(report, load_results(args.compare), args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Utilidades compartidas por los benchmarks.
+"""
+import json
+import math
+import os
+import threading
+import time
+
+
+def use_throwaway_database(directory):
+    """
+    Apunta la app a una base de datos temporal y desactiva los workers de email.
+    Debe llamarse antes de create_app().
+    """
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+    os.environ.setdefault('EMAIL_WORKERS', '0')
+
+
+def stub_email(email_service):
+    """
+    Sustituye el envío de emails por una función que no hace nada, para que
+    los números midan solo la app. Devuelve el dict email -> token de verificación.
+    """
+    tokens = {}
+
+    def send_verification_email(user_email, user_name, verification_token, **kwargs):
+        tokens[user_email] = verification_token
+        return True
+
+    def send_premium_confirmation_email(user_email, user_name, **kwargs):
+        return True
+
+    email_service.send_verification_email = send_verification_email
+    email_service.send_premium_confirmation_email = send_premium_confirmation_email
+    return tokens
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    rank = max(int(math.ceil(pct / 100 * len(sorted_values))) - 1, 0)
+    return sorted_values[rank]
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        'requests': count,
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'requests_per_second': round(count / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2) if latencies else 0.0
+    }
+
+
+def run_concurrent(concurrency, total, worker):
+    """
+    Reparte `total` iteraciones entre `concurrency` hilos. `worker(thread_index,
+    iterations, latencies, errors)` añade a las listas compartidas la latencia de
+    cada petición y los códigos inesperados.
+    """
+    per_thread = [total // concurrency + (1 if i < total % concurrency else 0) for i in range(concurrency)]
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def run(index):
+        local_latencies = []
+        local_errors = []
+        worker(index, per_thread[index], local_latencies, local_errors)
+        with lock:
+            latencies.extend(local_latencies)
+            errors.extend(local_errors)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return summarize(latencies, len(errors), elapsed)
+
+
+def save_results(path, results):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,111 @@
+"""
+Coste y ahorro de la compresión gzip de las respuestas de la API.
+
+Para cada endpoint pide la respuesta sin comprimir y con gzip a varios
+niveles, y compara los bytes enviados con el tiempo de CPU por petición
+(time.process_time del proceso, que incluye la serialización y la compresión).
+
+    python -m benchmarks.compression --users 20000 --levels 1,6,9 --requests 50 --output compression.json
+
+Las peticiones van por el cliente de pruebas de Flask, que consume el cuerpo
+entero también en las respuestas en streaming.
+"""
+import argparse
+import sys
+import tempfile
+import time
+
+from benchmarks.api import seed_users
+from benchmarks.common import percentile, save_results, use_throwaway_database
+
+ADMIN_TOKEN = 'benchmark-admin-token'
+
+ENDPOINTS = {
+    'list-users-1000': '/api/?limit=1000',
+    'list-users-1000-ndjson': '/api/?limit=1000&format=ndjson',
+    'list-users-100': '/api/?limit=100',
+    'list-users-3': '/api/?limit=3',
+    'search-users': '/api/users/search?q=usuario&limit=100',
+}
+
+
+def measure(client, path, requests, accept_encoding):
+    headers = {'X-Admin-Token': ADMIN_TOKEN, 'Accept-Encoding': accept_encoding}
+    latencies = []
+    cpu = 0.0
+    size = 0
+    encoding = None
+    for _ in range(requests):
+        cpu_start = time.process_time()
+        start = time.perf_counter()
+        response = client.get(path, headers=headers)
+        body = response.get_data()
+        latencies.append(time.perf_counter() - start)
+        cpu += time.process_time() - cpu_start
+        size = len(body)
+        encoding = response.headers.get('Content-Encoding', 'identity')
+    latencies.sort()
+    return {
+        'bytes': size,
+        'encoding': encoding,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'cpu_ms': round(cpu / requests * 1000, 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=5000, help='Usuarios sintéticos a sembrar')
+    parser.add_argument('--levels', type=lambda v: [int(x) for x in v.split(',')], default=[1, 6, 9])
+    parser.add_argument('--requests', type=int, default=30, help='Peticiones por endpoint y nivel')
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS))
+    parser.add_argument('--output', help='Guarda los resultados en este fichero JSON')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        use_throwaway_database(tmp)
+        from src.main import create_app
+        from src.utils.compression import compressor
+
+        app = create_app({
+            'SCHEMA_AUTO_CREATE': True,
+            'RATE_LIMIT_ENABLED': False,
+            'ADMIN_API_TOKEN': ADMIN_TOKEN
+        })
+        start = time.perf_counter()
+        seed_users(app, args.users)
+        print(f"Sembrados {args.users} usuarios en {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+        client = app.test_client()
+        results = []
+        print(f"{'endpoint':<24}{'nivel':>6}{'bytes':>10}{'ahorro':>9}{'p50 ms':>9}{'CPU ms':>9}{'Δ CPU ms':>10}")
+        for name in args.endpoints.split(','):
+            path = ENDPOINTS[name]
+            # Calentamiento: cachés, compilación del serializador, páginas de SQLite
+            measure(client, path, 3, 'gzip')
+            plain = measure(client, path, args.requests, 'identity')
+            plain.update({'endpoint': name, 'level': 0})
+            results.append(plain)
+            print(f"{name:<24}{'-':>6}{plain['bytes']:>10}{'':>9}{plain['p50_ms']:>9.2f}{plain['cpu_ms']:>9.2f}{'':>10}")
+
+            for level in args.levels:
+                compressor.level = level
+                result = measure(client, path, args.requests, 'gzip')
+                saved = (1 - result['bytes'] / plain['bytes']) * 100 if plain['bytes'] else 0.0
+                result.update({
+                    'endpoint': name,
+                    'level': level,
+                    'saved_pct': round(saved, 1),
+                    'extra_cpu_ms': round(result['cpu_ms'] - plain['cpu_ms'], 3)
+                })
+                results.append(result)
+                note = '' if result['encoding'] == 'gzip' else '  (sin comprimir: bajo el mínimo)'
+                print(f"{'':<24}{level:>6}{result['bytes']:>10}{saved:>8.1f}%{result['p50_ms']:>9.2f}"
+                      f"{result['cpu_ms']:>9.2f}{result['extra_cpu_ms']:>10.2f}{note}")
+
+    if args.output:
+        save_results(args.output, {'users': args.users, 'requests': args.requests, 'results': results})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Mide cuántos emails por segundo se renderizan con las plantillas compiladas.
+
+    python -m benchmarks.email_templates --count 5000
+"""
+import argparse
+import json
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from src.utils.email import EmailService
+
+
+def run(label, count, fn):
+    start = time.perf_counter()
+    for i in range(count):
+        fn(i)
+    elapsed = time.perf_counter() - start
+    return {'case': label, 'count': count, 'seconds': round(elapsed, 4), 'messages_per_second': round(count / elapsed, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=5000)
+    parser.add_argument('--json', action='store_true', help='Imprime los resultados como JSON')
+    args = parser.parse_args()
+
+    service = EmailService()
+    templates = service.templates
+
+    def render_only(i):
+        templates.render_pair('verification', user_name=f'Usuario {i}', verification_url=f'http://localhost:5174/verify-email?token={i}')
+
+    def verification(i):
+        service.build_verification_message(f'usuario{i}@example.com', f'Usuario {i}', f'token-{i}')
+
+    def premium(i):
+        service.build_premium_confirmation_message(f'usuario{i}@example.com', f'Usuario {i}')
+
+    def mime_tree(i):
+        # Referencia: el mismo contenido construido con el árbol MIMEMultipart
+        text_content, html_content = templates.render_pair('verification', user_name=f'Usuario {i}', verification_url=f'http://localhost:5174/verify-email?token={i}')
+        msg = MIMEMultipart('alternative')
+        msg['Subject'] = service.VERIFICATION_SUBJECT
+        msg['From'] = service.email
+        msg['To'] = f'usuario{i}@example.com'
+        msg.attach(MIMEText(text_content, 'plain', 'utf-8'))
+        msg.attach(MIMEText(html_content, 'html', 'utf-8'))
+        msg.as_string()
+
+    results = [
+        run('render_only', args.count, render_only),
+        run('verification_message', args.count, verification),
+        run('premium_confirmation_message', args.count, premium),
+        run('verification_mime_tree', args.count, mime_tree),
+    ]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for result in results:
+            print(f"{result['case']:<30} {result['messages_per_second']:>10.1f} msg/s")
+
+
+if __name__ == '__main__':
+    main()
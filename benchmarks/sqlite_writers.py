@@ -0,0 +1,123 @@
+"""
+Throughput de escritura (register + verify-email) con 1, 8 y 32 clientes
+concurrentes para cada perfil del engine SQLite.
+
+    python -m benchmarks.sqlite_writers --users 400 --clients 1,8,32 --profiles production,default
+
+Cada perfil se ejecuta en un subproceso con una base de datos temporal.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+
+def run_level(app, clients, users, prefix, tokens):
+    per_client = max(users // clients, 1)
+    errors = []
+    locked = []
+
+    def client_loop(n):
+        client = app.test_client()
+        for i in range(per_client):
+            username = f'{prefix}_{n}_{i}'
+            email = f'{username}@bench.local'
+            response = client.post('/api/register', json={
+                'username': username,
+                'email': email,
+                'password': 'benchmark-password',
+                'full_name': f'Bench {username}'
+            })
+            if response.status_code != 201:
+                errors.append(response.status_code)
+                continue
+            response = client.get(f'/api/verify-email?token={tokens.pop(email)}')
+            if response.status_code != 200:
+                errors.append(response.status_code)
+
+    threads = [threading.Thread(target=client_loop, args=(n,)) for n in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    operations = per_client * clients * 2
+    return {
+        'clients': clients,
+        'operations': operations,
+        'errors': len(errors),
+        'seconds': round(elapsed, 3),
+        'writes_per_second': round((operations - len(errors)) / elapsed, 1)
+    }
+
+
+def worker(args):
+    # Crear la app solo en el subproceso, ya con DATABASE_URL/SQLITE_PROFILE definidos
+    from src.main import create_app
+    app = create_app({'SCHEMA_AUTO_CREATE': True, 'RATE_LIMIT_ENABLED': False})
+    from src.routes import user as user_routes
+    from src.utils.passwords import password_hasher
+
+    # Hashing barato y email simulado: se mide la base de datos, no el CPU
+    password_hasher.configure(method='pbkdf2:sha256:1')
+    tokens = {}
+
+    def capture_token(user_email, user_name, verification_token, **kwargs):
+        tokens[user_email] = verification_token
+        return True
+
+    user_routes.email_service.send_verification_email = capture_token
+
+    results = []
+    for clients in args.clients:
+        results.append(run_level(app, clients, args.users, f'c{clients}', tokens))
+    print(json.dumps(results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=400, help='Registros por nivel de concurrencia')
+    parser.add_argument('--clients', type=lambda v: [int(x) for x in v.split(',')], default=[1, 8, 32])
+    parser.add_argument('--profiles', default='production,default')
+    parser.add_argument('--output', help='Guarda los resultados en este fichero JSON')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args)
+        return
+
+    report = {}
+    for profile in args.profiles.split(','):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ)
+            env.update({
+                'DATABASE_URL': f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                'SQLITE_PROFILE': profile,
+                'EMAIL_WORKERS': '0'
+            })
+            output = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.sqlite_writers', '--worker',
+                 '--users', str(args.users), '--clients', ','.join(map(str, args.clients))],
+                env=env, check=True, capture_output=True, text=True
+            ).stdout
+            report[profile] = json.loads(output.strip().splitlines()[-1])
+
+    for profile, results in report.items():
+        for result in results:
+            print(f"{profile:<12} clients={result['clients']:<3} "
+                  f"{result['writes_per_second']:>8.1f} writes/s  errors={result['errors']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Tiempo de arranque de un worker: importar src.main, create_app() y la
+primera petición (perfil sin sesión, sin base de datos) y la primera que
+consulta la base de datos (listado de usuarios). Cada repetición es un
+proceso nuevo, así que los módulos no están en caché de sys.modules.
+
+    python -m benchmarks.startup --runs 20 --output startup.json
+    python -m benchmarks.startup --runs 20 --compare startup.json
+
+La base de datos temporal se crea antes con `flask init-db`, igual que en un
+despliegue, para que el arranque no incluya la creación del esquema.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import load_results, percentile, save_results
+
+PHASES = ['import', 'create_app', 'first_request', 'first_query', 'total']
+
+
+def child():
+    start = time.perf_counter()
+    import src.main
+    imported = time.perf_counter()
+    app = src.main.create_app()
+    created = time.perf_counter()
+    client = app.test_client()
+    client.get('/api/profile')
+    first = time.perf_counter()
+    client.get('/api/?limit=10')
+    queried = time.perf_counter()
+    print(json.dumps({
+        'import': imported - start,
+        'create_app': created - imported,
+        'first_request': first - created,
+        'first_query': queried - first,
+        'total': queried - start
+    }))
+
+
+def run(runs, env):
+    samples = {phase: [] for phase in PHASES}
+    process_ms = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.startup', '--child'],
+            env=env, check=True, capture_output=True, text=True
+        ).stdout
+        process_ms.append(time.perf_counter() - start)
+        timings = json.loads(output.strip().splitlines()[-1])
+        for phase in PHASES:
+            samples[phase].append(timings[phase])
+
+    samples['process'] = process_ms
+    results = {}
+    for phase, values in samples.items():
+        values.sort()
+        results[phase] = {
+            'p50_ms': round(percentile(values, 50) * 1000, 2),
+            'p95_ms': round(percentile(values, 95) * 1000, 2)
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--output', help='Guarda los resultados en este fichero JSON')
+    parser.add_argument('--compare', help='JSON de una ejecución anterior con el que comparar')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child()
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env.update({
+            'DATABASE_URL': f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+            'EMAIL_WORKERS': '0',
+            'FLASK_APP': 'src.main'
+        })
+        subprocess.run([sys.executable, '-m', 'flask', 'init-db'], env=env, check=True, capture_output=True)
+        results = run(args.runs, env)
+
+    baseline = load_results(args.compare)['results'] if args.compare else {}
+    print(f"{'fase':<15}{'p50 ms':>10}{'p95 ms':>10}{'Δ p50':>10}")
+    for phase, result in results.items():
+        delta = ''
+        old = baseline.get(phase)
+        if old and old['p50_ms']:
+            delta = f"{(result['p50_ms'] - old['p50_ms']) / old['p50_ms'] * 100:>9.1f}%"
+        print(f"{phase:<15}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{delta:>10}")
+
+    if args.output:
+        save_results(args.output, {'runs': args.runs, 'results': results})
+
+
+if __name__ == '__main__':
+    main()
@@ -3,42 +3,143 @@ import sys
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, send_from_directory
-from flask_cors import CORS
-from src.models.user import db
-from src.routes.user import user_bp
+from flask import Flask
 
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
-app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
+STATIC_FOLDER = os.path.join(os.path.dirname(__file__), 'static')
+DEFAULT_DATABASE_URI = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
 
-# Habilitar CORS para todas las rutas
-CORS(app, supports_credentials=True)
 
-app.register_blueprint(user_bp, url_prefix='/api')
+def create_app(config=None):
+    """
+    Construye la app. Importar este módulo no abre la base de datos ni crea
+    tablas: el esquema se crea o actualiza con `flask init-db` (o con
+    SCHEMA_AUTO_CREATE=True, que usa el servidor de desarrollo). Los
+    subsistemas se importan aquí para que importar src.main sea barato.
+    """
+    from flask_cors import CORS
+    from src.models.user import db
+    from src.models.email_outbox import EmailOutbox
+    from src.models.schema import init_db_command, init_schema
+    from src.routes.user import user_bp
+    from src.utils.auth_events import auth_event_log, auth_events_collector
+    from src.utils.availability import availability_index
+    from src.utils.cache import user_cache
+    from src.utils.compression import compressor
+    from src.utils.campaigns import campaign_cli
+    from src.utils.email_queue import email_worker
+    from src.utils.maintenance import maintenance_scheduler
+    from src.utils.metrics import metrics, cache_stats_collector
+    from src.utils.passwords import password_hasher
+    from src.utils.profiling import profiler
+    from src.utils.ratelimit import rate_limiter
+    from src.utils.sessions import init_sessions
+    from src.utils.sqlite import configure_sqlite, register_sqlite_pragmas
+    from src.utils.stats import stats_cli
+    from src.utils.user_io import users_cli
+
+    app = Flask(__name__, static_folder=STATIC_FOLDER)
+    app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
+    # 'signed' (tokens firmados con itsdangerous) o 'legacy' (token aleatorio guardado en la tabla)
+    app.config['VERIFICATION_TOKEN_MODE'] = 'signed'
+    # uncomment if you need to use database
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', DEFAULT_DATABASE_URI)
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Perfil del engine SQLite: 'production' (WAL, busy_timeout, mmap...) o 'default'
+    app.config['SQLITE_PROFILE'] = os.getenv('SQLITE_PROFILE', 'production')
+    app.config['SCHEMA_AUTO_CREATE'] = os.getenv('SCHEMA_AUTO_CREATE', '0') == '1'
+    # Token de la consola de administración (cabecera X-Admin-Token); sin él, deshabilitada
+    app.config['ADMIN_API_TOKEN'] = os.getenv('ADMIN_API_TOKEN')
+    # /metrics sin token (solo si el puerto no es accesible desde fuera)
+    app.config['METRICS_PUBLIC'] = os.getenv('METRICS_PUBLIC', '0') == '1'
+    # Perfilado de peticiones (ver src/utils/profiling.py); desactivado no cuesta nada
+    app.config['PROFILE_ENABLED'] = os.getenv('PROFILE_ENABLED', '0') == '1'
+    app.config['PROFILE_MODE'] = os.getenv('PROFILE_MODE', 'cprofile')
+    app.config['PROFILE_SAMPLE_RATE'] = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+    # Segundos entre ejecuciones del mantenimiento en segundo plano (0 = solo `flask maintenance run`)
+    app.config['MAINTENANCE_INTERVAL'] = float(os.getenv('MAINTENANCE_INTERVAL', '0'))
+    if config:
+        app.config.update(config)
+
+    # Habilitar CORS para todas las rutas
+    CORS(app, supports_credentials=True)
+
+    app.register_blueprint(user_bp, url_prefix='/api')
+
+    configure_sqlite(app)
+    db.init_app(app)
+    email_worker.init_app(app)
+    password_hasher.init_app(app)
+    rate_limiter.init_app(app)
+    auth_event_log.init_app(app)
+    availability_index.init_app(app)
+    user_cache.init_app(app)
+    init_sessions(app)
+    maintenance_scheduler.init_app(app)
+    profiler.init_app(app)
+    app.cli.add_command(users_cli)
+    app.cli.add_command(campaign_cli)
+    app.cli.add_command(stats_cli)
+    app.cli.add_command(init_db_command)
+    with app.app_context():
+        # Crear el engine no abre conexiones; la primera se abre con la primera consulta
+        register_sqlite_pragmas(app, db.engine)
+        metrics.init_app(app, db.engine)
+        metrics.add_collector(cache_stats_collector('user', user_cache.cache))
+        metrics.add_collector(auth_events_collector(auth_event_log))
+        if hasattr(app.session_interface, 'cache'):
+            metrics.add_collector(cache_stats_collector('session', app.session_interface.cache))
+        # Después de metrics: los after_request se ejecutan en orden inverso,
+        # así que la compresión entra en la medida de la petición
+        compressor.init_app(app)
+        if app.config['SCHEMA_AUTO_CREATE']:
+            init_schema()
+        engines = list(db.engines.values())
+
+    # Un proceso hijo no debe reutilizar las conexiones abiertas por el padre
+    os.register_at_fork(after_in_child=lambda: [engine.dispose(close=False) for engine in engines])
+
+    app.add_url_rule('/', 'serve', serve, defaults={'path': ''})
+    app.add_url_rule('/<path:path>', 'serve', serve)
+    return app
+
+
+def get_static_manifest(app):
+    """
+    Manifiesto de estáticos: se recorre la carpeta una sola vez, en la primera petición.
+    """
+    from src.utils.static_files import StaticManifest
+
+    manifest = app.extensions.get('static_manifest')
+    if manifest is None:
+        manifest = app.extensions['static_manifest'] = StaticManifest(app.static_folder)
+    return manifest
 
-# uncomment if you need to use database
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
-with app.app_context():
-    db.create_all()
 
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
 def serve(path):
-    static_folder_path = app.static_folder
-    if static_folder_path is None:
+    from flask import current_app
+
+    if current_app.static_folder is None:
             return "Static folder not configured", 404
 
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
-    else:
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
-        else:
+    static_manifest = get_static_manifest(current_app)
+    asset = static_manifest.get(path) if path != "" else None
+    if asset is None:
+        # Fallback de la SPA: cualquier ruta desconocida sirve index.html
+        asset = static_manifest.index
+        if asset is None:
             return "index.html not found", 404
+    return static_manifest.respond(asset)
+
+
+def __getattr__(name):
+    # `from src.main import app` (y `flask --app src.main`) construyen la app
+    # por defecto la primera vez que se piden
+    if name == 'app':
+        app = globals()['app'] = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
+# Servidor de desarrollo. En producción: python -m src.serve (ver src/serve.py)
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    create_app({'SCHEMA_AUTO_CREATE': True}).run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,49 @@
+import json
+from datetime import datetime
+from src.models.user import db
+
+class AuthEvent(db.Model):
+    """
+    Registro de solo inserción de eventos de autenticación (logins, logins
+    fallidos, verificaciones y upgrades a premium) para soporte y revisión de
+    fraude. Las filas las escribe por lotes AuthEventLog (src/utils/auth_events.py).
+    """
+    __tablename__ = 'auth_event'
+
+    LOGIN = 'login'
+    LOGIN_FAILED = 'login_failed'
+    EMAIL_VERIFIED = 'email_verified'
+    PREMIUM_UPGRADE = 'premium_upgrade'
+    TYPES = (LOGIN, LOGIN_FAILED, EMAIL_VERIFIED, PREMIUM_UPGRADE)
+
+    id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    event_type = db.Column(db.String(32), nullable=False)
+    user_id = db.Column(db.Integer, nullable=True)
+    # Lo que se escribió en el login: en los fallidos puede no existir el usuario
+    username = db.Column(db.String(120), nullable=True)
+    ip = db.Column(db.String(45), nullable=True)
+    user_agent = db.Column(db.String(255), nullable=True)
+    details = db.Column(db.Text, nullable=True)
+
+    # Todas las consultas son por rango de tiempo, solo o junto a usuario/tipo
+    __table_args__ = (
+        db.Index('ix_auth_event_created_at', 'created_at'),
+        db.Index('ix_auth_event_user_created_at', 'user_id', 'created_at'),
+        db.Index('ix_auth_event_type_created_at', 'event_type', 'created_at'),
+    )
+
+    def __repr__(self):
+        return f'<AuthEvent {self.event_type} {self.user_id}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'created_at': self.created_at.isoformat(),
+            'event_type': self.event_type,
+            'user_id': self.user_id,
+            'username': self.username,
+            'ip': self.ip,
+            'user_agent': self.user_agent,
+            'details': json.loads(self.details) if self.details else None
+        }
@@ -0,0 +1,49 @@
+from datetime import datetime
+from src.models.user import db
+
+class EmailCampaign(db.Model):
+    """
+    Envío masivo con punto de control. Los usuarios se recorren en orden
+    (premium_expires_at, id); tras cada lote enviado se guarda la última
+    clave, así que una ejecución interrumpida continúa desde ahí.
+    """
+    __tablename__ = 'email_campaign'
+
+    STATUS_RUNNING = 'running'
+    STATUS_PAUSED = 'paused'
+    STATUS_COMPLETED = 'completed'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), unique=True, nullable=False)
+    template = db.Column(db.String(80), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    window_start = db.Column(db.DateTime, nullable=False)
+    window_end = db.Column(db.DateTime, nullable=False)
+    status = db.Column(db.String(16), nullable=False, default=STATUS_RUNNING)
+    last_expires_at = db.Column(db.DateTime, nullable=True)
+    last_user_id = db.Column(db.Integer, nullable=True)
+    sent = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<EmailCampaign {self.name} {self.status}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'template': self.template,
+            'window_start': self.window_start.isoformat(),
+            'window_end': self.window_end.isoformat(),
+            'status': self.status,
+            'sent': self.sent,
+            'failed': self.failed,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
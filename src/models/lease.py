@@ -0,0 +1,16 @@
+from src.models.user import db
+
+class Lease(db.Model):
+    """
+    Concesión con caducidad para que una tarea periódica la ejecute un solo
+    proceso aunque haya varios workers (ver src/utils/leases.py).
+    `expires_at` es un timestamp Unix para que sea comparable entre procesos.
+    """
+    __tablename__ = 'lease'
+
+    name = db.Column(db.String(80), primary_key=True)
+    owner = db.Column(db.String(120), nullable=False)
+    expires_at = db.Column(db.Float, nullable=False)
+
+    def __repr__(self):
+        return f'<Lease {self.name} {self.owner}>'
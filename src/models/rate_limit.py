@@ -0,0 +1,16 @@
+from src.models.user import db
+
+class RateLimitBucket(db.Model):
+    """
+    Estado compartido del limitador de peticiones (backend 'sqlite'): un token
+    bucket por clave. `updated_at` es un timestamp Unix para que sea comparable
+    entre procesos.
+    """
+    __tablename__ = 'rate_limit_bucket'
+
+    key = db.Column(db.String(255), primary_key=True)
+    tokens = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.Float, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<RateLimitBucket {self.key}>'
@@ -0,0 +1,46 @@
+import click
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn
+from src.models.user import db
+from src.utils.search import install_user_search
+from src.utils.stats import install_user_stats
+
+
+def upgrade_schema():
+    """
+    Cambios de esquema idempotentes que db.create_all() no aplica a tablas ya
+    existentes: columnas nuevas (ALTER TABLE ... ADD COLUMN, por lo que deben
+    admitir NULL o tener server_default), índices añadidos después, el
+    índice de búsqueda FTS5 y los contadores de usuarios con sus triggers.
+    """
+    inspector = inspect(db.engine)
+    dialect = db.engine.dialect
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    ddl = CreateColumn(column).compile(dialect=dialect)
+                    conn.execute(text(f'ALTER TABLE {dialect.identifier_preparer.format_table(table)} ADD COLUMN {ddl}'))
+
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+
+    install_user_search(db.engine)
+    install_user_stats(db.engine)
+
+
+def init_schema():
+    """
+    Crea las tablas que falten y aplica upgrade_schema(). Es idempotente.
+    """
+    db.create_all()
+    upgrade_schema()
+
+
+@click.command('init-db')
+def init_db_command():
+    """Crea o actualiza el esquema de la base de datos."""
+    init_schema()
+    click.echo('Esquema actualizado')
@@ -0,0 +1,19 @@
+from datetime import datetime
+from src.models.user import db
+
+class UserSession(db.Model):
+    """
+    Sesión guardada en el servidor. La cookie solo lleva un identificador opaco;
+    aquí se guarda su hash SHA-256, nunca el identificador en claro.
+    """
+    __tablename__ = 'user_session'
+
+    id = db.Column(db.String(64), primary_key=True)
+    user_id = db.Column(db.Integer, nullable=True, index=True)
+    data = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_seen_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<UserSession user={self.user_id}>'
@@ -1,6 +1,9 @@
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+from src.utils.passwords import password_hasher
+from src.utils.serializers import Serializer, isoformat
 
 db = SQLAlchemy()
 
@@ -16,25 +19,51 @@ class User(db.Model):
     verification_token = db.Column(db.String(255), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     premium_expires_at = db.Column(db.DateTime, nullable=True)
+    # Se incrementa en cada cambio de la fila; es la base de los ETag.
+    # Los UPDATE de Core deben incrementarla a mano: values(version=User.version + 1)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
+    __table_args__ = (
+        # Usados por las tareas de mantenimiento (src/utils/maintenance.py)
+        db.Index('ix_user_premium_expires_at', 'premium_expires_at'),
+        db.Index('ix_user_verified_created_at', 'is_verified', 'created_at'),
+    )
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        """
+        Comprueba la contraseña y, si el hash usa un método o coste antiguo,
+        lo actualiza (el llamador debe hacer commit).
+        """
+        valid, new_hash = password_hasher.verify_and_update(self.password_hash, password)
+        if new_hash:
+            self.password_hash = new_hash
+        return valid
 
     def __repr__(self):
         return f'<User {self.username}>'
 
     def to_dict(self):
-        return {
-            'id': self.id,
-            'username': self.username,
-            'email': self.email,
-            'full_name': self.full_name,
-            'phone': self.phone,
-            'is_verified': self.is_verified,
-            'is_premium': self.is_premium,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'premium_expires_at': self.premium_expires_at.isoformat() if self.premium_expires_at else None
-        }
+        return user_serializer.serialize(self)
+
+
+@event.listens_for(User, 'before_update')
+def _bump_version(mapper, connection, target):
+    session = object_session(target)
+    if session is None or session.is_modified(target, include_collections=False):
+        target.version = User.version + 1
+
+
+# Campos públicos de un usuario; `version` solo se devuelve si se pide con ?fields=
+USER_FIELDS = (
+    'id', 'username', 'email', 'full_name', 'phone', 'is_verified', 'is_premium',
+    'created_at', 'premium_expires_at', 'version'
+)
+
+user_serializer = Serializer(
+    USER_FIELDS,
+    default_fields=USER_FIELDS[:-1],
+    formatters={'created_at': isoformat, 'premium_expires_at': isoformat}
+)
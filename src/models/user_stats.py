@@ -0,0 +1,50 @@
+from src.models.user import db
+
+class UserCounter(db.Model):
+    """
+    Contadores globales de usuarios ('total', 'verified', 'premium'). Los
+    mantienen triggers de SQLite sobre `user` (ver src/utils/stats.py), en la
+    misma transacción que el cambio, así que leerlos no recorre la tabla.
+    """
+    __tablename__ = 'user_counter'
+
+    TOTAL = 'total'
+    VERIFIED = 'verified'
+    PREMIUM = 'premium'
+    NAMES = (TOTAL, VERIFIED, PREMIUM)
+
+    name = db.Column(db.String(32), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<UserCounter {self.name}={self.value}>'
+
+
+class UserSignupDay(db.Model):
+    """
+    Altas por día (UTC) de los usuarios que siguen existiendo: al borrar un
+    usuario se descuenta de su día, igual que al recalcular desde cero.
+    """
+    __tablename__ = 'user_signup_day'
+
+    day = db.Column(db.Date, primary_key=True)
+    signups = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<UserSignupDay {self.day}={self.signups}>'
+
+
+class UserDeletions(db.Model):
+    """
+    Usuarios borrados desde siempre (una sola fila, id=1), incrementado por un
+    trigger. No se recalcula: solo crece. SQLite reutiliza el mayor rowid tras
+    un borrado, así que el ETag del listado lo necesita para distinguir un
+    borrado seguido de un alta de una página sin cambios.
+    """
+    __tablename__ = 'user_deletions'
+
+    id = db.Column(db.Integer, primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<UserDeletions {self.value}>'
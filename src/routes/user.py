@@ -1,14 +1,58 @@
-from flask import Blueprint, request, jsonify, session
-from werkzeug.security import generate_password_hash, check_password_hash
-from src.models.user import User, db
+from flask import Blueprint, Response, current_app, request, jsonify, session, stream_with_context
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError, OperationalError
+from itsdangerous import BadSignature, SignatureExpired
+from werkzeug.utils import secure_filename
+from src.models.auth_event import AuthEvent
+from src.models.user import User, db, user_serializer
+from src.models.user_stats import UserDeletions
+from src.utils.admin import admin_required
+from src.utils.auth_events import auth_event_log, query_auth_events
+from src.utils.availability import availability_index
+from src.utils.cache import user_cache
+from src.utils.compression import etag_matches
 from src.utils.email import EmailService
+from src.utils.metrics import timed
+from src.utils.passwords import PasswordHashingOverloaded
+from src.utils.profiling import list_profiles, merge_collapsed, merge_pstats, profiler
+from src.utils.ratelimit import rate_limit, rate_limiter
+from src.utils.search import build_match_query, search_users_statement, user_search_available
+from src.utils.stats import STATS_DEFAULT_DAYS, STATS_MAX_DAYS, get_user_stats
+from src.utils.tokens import (
+    generate_verification_token, is_signed_token, load_verification_token,
+    signed_tokens_enabled, token_matches_email
+)
+import json
+import os
 import secrets
+import tempfile
+import zlib
 from datetime import datetime, timedelta
 import re
 
 user_bp = Blueprint('user', __name__)
+# Los límites se comprueban antes de que la vista consulte la base de datos o calcule un hash
+user_bp.before_request(rate_limiter.check)
 email_service = EmailService()
 
+# Paginación del listado de usuarios
+USERS_PAGE_SIZE = 100
+USERS_MAX_PAGE_SIZE = 1000
+USERS_STREAM_CHUNK = 200
+
+# Paginación del registro de eventos de autenticación
+AUTH_EVENTS_PAGE_SIZE = 100
+AUTH_EVENTS_MAX_PAGE_SIZE = 1000
+
+# Paginación de la búsqueda (por offset: los resultados van por relevancia)
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+SEARCH_MAX_OFFSET = 1000
+
+# Campos por defecto (sin ?fields=) de cada respuesta
+USER_LIST_FIELDS = ('id', 'username', 'email', 'full_name', 'is_verified', 'is_premium', 'created_at')
+LOGIN_FIELDS = ('id', 'username', 'email', 'full_name', 'is_verified', 'is_premium')
+
 def validate_email(email):
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
     return re.match(pattern, email) is not None
@@ -16,7 +60,44 @@ def validate_email(email):
 def validate_password(password):
     return len(password) >= 8
 
+def unique_violation_column(error):
+    """
+    Devuelve la columna que violó una restricción UNIQUE de `user`, si se puede saber.
+    """
+    message = str(error.orig)
+    for column in ('username', 'email'):
+        if f'user.{column}' in message or f'user_{column}' in message:
+            return column
+    return None
+
+def requested_fields(default=None):
+    """
+    Campos pedidos con ?fields=a,b. Lanza ValueError si alguno no existe.
+    """
+    return user_serializer.parse_fields(request.args.get('fields'), default)
+
+def invalid_fields_response(error):
+    return jsonify({'error': f'Campos desconocidos: {error}'}), 400
+
+def make_etag(*parts):
+    return '-'.join(str(part) for part in parts)
+
+def fields_stamp(fields):
+    return f"{zlib.crc32(','.join(fields).encode()):08x}"
+
+def not_modified_response(etag, cache_control):
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+def hashing_overloaded_response():
+    response = jsonify({'error': 'Servidor ocupado, inténtalo de nuevo en unos segundos'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
 @user_bp.route('/register', methods=['POST'])
+@rate_limit(ip='10/minute')
 def register():
     try:
         data = request.get_json()
@@ -43,37 +124,35 @@ def register():
         if not validate_password(password):
             return jsonify({'error': 'La contraseña debe tener al menos 8 caracteres'}), 400
         
-        # Verificar si el usuario ya existe
-        if User.query.filter_by(username=username).first():
-            return jsonify({'error': 'El nombre de usuario ya está en uso'}), 400
-        
-        if User.query.filter_by(email=email).first():
-            return jsonify({'error': 'El email ya está registrado'}), 400
-        
-        # Generar token de verificación
-        verification_token = secrets.token_urlsafe(32)
-        
+        # Los duplicados los detectan las restricciones UNIQUE al hacer flush/commit
         # Crear nuevo usuario
         user = User(
             username=username,
             email=email,
-            password_hash=generate_password_hash(password),
             full_name=full_name,
             phone=phone,
-            verification_token=verification_token,
             is_verified=False,
             is_premium=False
         )
+        user.set_password(password)
         
         db.session.add(user)
-        db.session.commit()
         
-        # Enviar email de verificación
+        # Generar token de verificación
+        if signed_tokens_enabled():
+            db.session.flush()  # para obtener user.id
+            verification_token = generate_verification_token(user.id, email)
+        else:
+            verification_token = secrets.token_urlsafe(32)
+            user.verification_token = verification_token
+        
+        # Encolar email de verificación (se guarda en el mismo commit que el usuario)
         email_sent = email_service.send_verification_email(
             user_email=email,
             user_name=full_name,
             verification_token=verification_token
         )
+        db.session.commit()
         
         if email_sent:
             return jsonify({
@@ -86,10 +165,48 @@ def register():
                 'user_id': user.id
             }), 201
         
+    except IntegrityError as e:
+        db.session.rollback()
+        if unique_violation_column(e) == 'username':
+            return jsonify({'error': 'El nombre de usuario ya está en uso'}), 400
+        return jsonify({'error': 'El email ya está registrado'}), 400
+    except PasswordHashingOverloaded:
+        db.session.rollback()
+        return hashing_overloaded_response()
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Error interno del servidor'}), 500
 
+@user_bp.route('/check-availability', methods=['GET'])
+@rate_limit(ip='60/minute')
+def check_availability():
+    """
+    Comprueba si un username y/o email están libres. Pensado para llamarse en
+    cada pulsación del formulario de registro: los valores claramente libres
+    se resuelven con el filtro de Bloom sin consultar la base de datos. El
+    límite por IP evita que se use para enumerar las cuentas registradas.
+    """
+    username = request.args.get('username', '').strip()
+    email = request.args.get('email', '').strip().lower()
+    
+    if not username and not email:
+        return jsonify({'error': 'Indica username o email'}), 400
+    
+    result = {}
+    if username:
+        if len(username) < 3:
+            result['username'] = {'available': False, 'error': 'El nombre de usuario debe tener al menos 3 caracteres'}
+        else:
+            result['username'] = {'available': availability_index.is_username_available(username)}
+    
+    if email:
+        if not validate_email(email):
+            result['email'] = {'available': False, 'error': 'Email inválido'}
+        else:
+            result['email'] = {'available': availability_index.is_email_available(email)}
+    
+    return jsonify(result), 200
+
 @user_bp.route('/verify-email', methods=['GET', 'POST'])
 def verify_email():
     try:
@@ -98,23 +215,41 @@ def verify_email():
         if not token:
             return jsonify({'error': 'Token de verificación requerido'}), 400
         
-        # Buscar usuario por token
-        user = User.query.filter_by(verification_token=token).first()
-        
-        if not user:
-            return jsonify({'error': 'Token de verificación inválido'}), 400
-        
-        if user.is_verified:
-            return jsonify({'message': 'La cuenta ya está verificada'}), 200
-        
-        # Verificar si el token ha expirado (24 horas)
-        if user.created_at < datetime.utcnow() - timedelta(hours=24):
-            return jsonify({'error': 'El token de verificación ha expirado'}), 400
+        if is_signed_token(token):
+            # Token firmado: la caducidad va en el propio token, basta con buscar por id
+            try:
+                user_id, fingerprint = load_verification_token(token)
+            except SignatureExpired:
+                return jsonify({'error': 'El token de verificación ha expirado'}), 400
+            except BadSignature:
+                return jsonify({'error': 'Token de verificación inválido'}), 400
+            
+            user = db.session.get(User, user_id)
+            if not user or not token_matches_email(fingerprint, user.email):
+                return jsonify({'error': 'Token de verificación inválido'}), 400
+            
+            if user.is_verified:
+                return jsonify({'message': 'La cuenta ya está verificada'}), 200
+        else:
+            # Tokens guardados antes de usar tokens firmados
+            user = User.query.filter_by(verification_token=token).first()
+            
+            if not user:
+                return jsonify({'error': 'Token de verificación inválido'}), 400
+            
+            if user.is_verified:
+                return jsonify({'message': 'La cuenta ya está verificada'}), 200
+            
+            # Verificar si el token ha expirado (24 horas)
+            if user.created_at < datetime.utcnow() - timedelta(hours=24):
+                return jsonify({'error': 'El token de verificación ha expirado'}), 400
         
         # Verificar la cuenta
         user.is_verified = True
         user.verification_token = None  # Limpiar el token
         db.session.commit()
+        user_cache.invalidate(user.id)
+        auth_event_log.record(AuthEvent.EMAIL_VERIFIED, user_id=user.id, username=user.username)
         
         return jsonify({'message': 'Cuenta verificada exitosamente'}), 200
         
@@ -123,7 +258,13 @@ def verify_email():
         return jsonify({'error': 'Error interno del servidor'}), 500
 
 @user_bp.route('/login', methods=['POST'])
+@rate_limit(ip='30/minute', account_ip='10/minute', account='100/hour', account_field='username')
 def login():
+    try:
+        fields = requested_fields(LOGIN_FIELDS)
+    except ValueError as e:
+        return invalid_fields_response(e)
+
     try:
         data = request.get_json()
         
@@ -138,30 +279,34 @@ def login():
             (User.username == username) | (User.email == username)
         ).first()
         
-        if not user or not check_password_hash(user.password_hash, password):
+        if not user or not user.check_password(password):
+            auth_event_log.record(AuthEvent.LOGIN_FAILED, user_id=user.id if user else None,
+                                  username=username, reason='credentials')
             return jsonify({'error': 'Credenciales inválidas'}), 401
         
         if not user.is_verified:
+            auth_event_log.record(AuthEvent.LOGIN_FAILED, user_id=user.id, username=username, reason='unverified')
             return jsonify({'error': 'Debes verificar tu email antes de iniciar sesión'}), 401
         
+        # check_password actualiza el hash si se cambió el método o el coste
+        if db.session.is_modified(user):
+            db.session.commit()
+        
         # Crear sesión
+        # is_premium no se guarda en la sesión: se lee del usuario (ver get_profile)
         session['user_id'] = user.id
         session['username'] = user.username
-        session['is_premium'] = user.is_premium
+        auth_event_log.record(AuthEvent.LOGIN, user_id=user.id, username=username)
         
         return jsonify({
             'message': 'Inicio de sesión exitoso',
-            'user': {
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'full_name': user.full_name,
-                'is_premium': user.is_premium,
-                'is_verified': user.is_verified
-            }
+            'user': user_serializer.serialize(user, fields)
         }), 200
         
+    except PasswordHashingOverloaded:
+        return hashing_overloaded_response()
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': 'Error interno del servidor'}), 500
 
 @user_bp.route('/logout', methods=['POST'])
@@ -169,28 +314,51 @@ def logout():
     session.clear()
     return jsonify({'message': 'Sesión cerrada exitosamente'}), 200
 
+@user_bp.route('/logout-all', methods=['POST'])
+def logout_all():
+    """
+    Cierra todas las sesiones del usuario, también las de otros dispositivos.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+    
+    session_interface = current_app.session_interface
+    if not hasattr(session_interface, 'revoke_user'):
+        return jsonify({'error': 'El backend de sesiones no permite revocar sesiones'}), 400
+    
+    revoked = session_interface.revoke_user(session['user_id'])
+    session.clear()
+    return jsonify({'message': 'Todas las sesiones se han cerrado', 'revoked': revoked}), 200
+
 @user_bp.route('/profile', methods=['GET'])
 def get_profile():
+    """
+    Perfil del usuario de la sesión. Admite ?fields= y peticiones condicionales:
+    el ETag sale de `version`, así que un If-None-Match vigente recibe un 304
+    sin construir el cuerpo. Se sirve de la caché de usuarios sin consultar
+    la base de datos: un cambio hecho en otro worker tarda como mucho
+    USER_CACHE_TTL segundos en verse (ver UserCache).
+    """
     if 'user_id' not in session:
         return jsonify({'error': 'No autorizado'}), 401
     
-    user = User.query.get(session['user_id'])
+    try:
+        fields = requested_fields()
+    except ValueError as e:
+        return invalid_fields_response(e)
+    
+    user = user_cache.get(session['user_id'])
     if not user:
         return jsonify({'error': 'Usuario no encontrado'}), 404
     
-    return jsonify({
-        'user': {
-            'id': user.id,
-            'username': user.username,
-            'email': user.email,
-            'full_name': user.full_name,
-            'phone': user.phone,
-            'is_premium': user.is_premium,
-            'is_verified': user.is_verified,
-            'created_at': user.created_at.isoformat(),
-            'premium_expires_at': user.premium_expires_at.isoformat() if user.premium_expires_at else None
-        }
-    }), 200
+    etag = make_etag('u', user['id'], user['version'], fields_stamp(fields))
+    if etag_matches(etag):
+        return not_modified_response(etag, 'private, no-cache')
+    
+    response = jsonify({'user': user_serializer.project(user, fields)})
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 @user_bp.route('/upgrade-premium', methods=['POST'])
 def upgrade_premium():
@@ -204,33 +372,45 @@ def upgrade_premium():
         if not payment_reference:
             return jsonify({'error': 'Referencia de pago requerida'}), 400
         
-        user = User.query.get(session['user_id'])
+        user_id = session['user_id']
+        # Validada contra la base de datos: el mantenimiento u otro worker
+        # pueden haber caducado el premium sin invalidar la caché de este proceso
+        user = user_cache.get_current(user_id)
         if not user:
             return jsonify({'error': 'Usuario no encontrado'}), 404
         
-        if user.is_premium:
+        if user['is_premium']:
             return jsonify({'error': 'El usuario ya es premium'}), 400
         
         # En un entorno real, aquí verificarías el pago con Bizum
         # Por ahora, simulamos que el pago es válido
         
-        # Actualizar usuario a premium (válido por 1 año)
-        user.is_premium = True
-        user.premium_expires_at = datetime.utcnow() + timedelta(days=365)
-        db.session.commit()
-        
-        # Actualizar sesión
-        session['is_premium'] = True
+        # Actualizar usuario a premium (válido por 1 año). El UPDATE condicional
+        # evita releer la fila y protege frente a una caché desactualizada.
+        premium_expires_at = datetime.utcnow() + timedelta(days=365)
+        result = db.session.execute(
+            update(User)
+            .where(User.id == user_id, User.is_premium.isnot(True))
+            .values(is_premium=True, premium_expires_at=premium_expires_at, version=User.version + 1)
+        )
+        if result.rowcount == 0:
+            db.session.rollback()
+            user_cache.invalidate(user_id)
+            return jsonify({'error': 'El usuario ya es premium'}), 400
         
-        # Enviar email de confirmación
+        # Encolar email de confirmación
         email_service.send_premium_confirmation_email(
-            user_email=user.email,
-            user_name=user.full_name
+            user_email=user['email'],
+            user_name=user['full_name']
         )
+        db.session.commit()
+        user_cache.invalidate(user_id)
+        auth_event_log.record(AuthEvent.PREMIUM_UPGRADE, user_id=user_id, username=user['username'],
+                              payment_reference=payment_reference)
         
         return jsonify({
             'message': 'Upgrade a premium exitoso',
-            'premium_expires_at': user.premium_expires_at.isoformat()
+            'premium_expires_at': premium_expires_at.isoformat()
         }), 200
         
     except Exception as e:
@@ -238,6 +418,7 @@ def upgrade_premium():
         return jsonify({'error': 'Error interno del servidor'}), 500
 
 @user_bp.route('/resend-verification', methods=['POST'])
+@rate_limit(ip='5/minute', account='3/hour', account_field='email')
 def resend_verification():
     try:
         data = request.get_json()
@@ -254,16 +435,21 @@ def resend_verification():
         if user.is_verified:
             return jsonify({'error': 'La cuenta ya está verificada'}), 400
         
-        # Generar nuevo token
-        user.verification_token = secrets.token_urlsafe(32)
-        db.session.commit()
+        # Generar nuevo token (los firmados no se guardan en la base de datos)
+        if signed_tokens_enabled():
+            verification_token = generate_verification_token(user.id, user.email)
+        else:
+            verification_token = secrets.token_urlsafe(32)
+            user.verification_token = verification_token
         
-        # Enviar nuevo email
+        # Encolar nuevo email
         email_sent = email_service.send_verification_email(
             user_email=user.email,
             user_name=user.full_name,
-            verification_token=user.verification_token
+            verification_token=verification_token
         )
+        db.session.commit()
+        user_cache.invalidate(user.id)
         
         if email_sent:
             return jsonify({'message': 'Email de verificación reenviado'}), 200
@@ -276,14 +462,267 @@ def resend_verification():
 
 @user_bp.route('/', methods=['GET'])
 def get_users():
-    users = User.query.all()
-    return jsonify([{
-        'id': user.id,
-        'username': user.username,
-        'email': user.email,
-        'full_name': user.full_name,
-        'is_verified': user.is_verified,
-        'is_premium': user.is_premium,
-        'created_at': user.created_at.isoformat()
-    } for user in users]), 200
+    """
+    Listado paginado por cursor (keyset sobre `id`): ?cursor=<último id>&limit=N.
+    Con ?format=ndjson devuelve un usuario por línea; en JSON incluye
+    `next_cursor` al final. La respuesta se envía en streaming.
+
+    ?fields= limita las columnas leídas y devueltas. El ETag de la página se
+    calcula con una consulta agregada sobre (id, version), sin leer el resto
+    de columnas ni serializar. Incluye el contador de borrados: SQLite reutiliza
+    el mayor id, y borrar el último usuario y registrar otro deja igual el
+    número de filas, el último id y la suma de versiones.
+    """
+    try:
+        limit = int(request.args.get('limit', USERS_PAGE_SIZE))
+        cursor = int(request.args.get('cursor', 0))
+    except ValueError:
+        return jsonify({'error': 'Parámetros de paginación inválidos'}), 400
+
+    if limit < 1:
+        return jsonify({'error': 'Parámetros de paginación inválidos'}), 400
+    limit = min(limit, USERS_MAX_PAGE_SIZE)
+
+    output_format = request.args.get('format', 'json')
+    if output_format not in ('json', 'ndjson'):
+        return jsonify({'error': 'Formato no soportado'}), 400
+
+    try:
+        fields = requested_fields(USER_LIST_FIELDS)
+    except ValueError as e:
+        return invalid_fields_response(e)
+
+    page = (
+        select(User.id, User.version)
+        .where(User.id > cursor)
+        .order_by(User.id)
+        .limit(limit)
+        .subquery()
+    )
+    deletions = select(UserDeletions.value).where(UserDeletions.id == 1).scalar_subquery()
+    count, last_id, versions, deleted = db.session.execute(
+        select(func.count(), func.coalesce(func.max(page.c.id), 0), func.coalesce(func.sum(page.c.version), 0),
+               func.coalesce(deletions, 0))
+    ).one()
+    etag = make_etag('l', cursor, limit, output_format, fields_stamp(fields), count, last_id, versions, deleted)
+    if etag_matches(etag):
+        return not_modified_response(etag, 'no-cache')
+
+    # Solo las columnas que se devuelven (más id para el cursor), sin construir entidades User
+    columns = [User.id] + [getattr(User, name) for name in fields if name != 'id']
+    rows = db.session.execute(
+        select(*columns)
+        .where(User.id > cursor)
+        .order_by(User.id)
+        .limit(limit)
+        .execution_options(yield_per=USERS_STREAM_CHUNK)
+    )
+    serialize = user_serializer.compile(fields)
+
+    if output_format == 'ndjson':
+        response = Response(stream_with_context(_stream_users_ndjson(rows, serialize)), mimetype='application/x-ndjson')
+    else:
+        response = Response(stream_with_context(_stream_users_json(rows, limit, serialize)), mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@user_bp.route('/users/search', methods=['GET'])
+@admin_required
+def search_users():
+    """
+    Búsqueda para la consola de administración: ?q=<texto>&limit=N&offset=M.
+    Cada palabra de `q` se busca como prefijo en username, nombre y email
+    (índice FTS5) y los resultados se ordenan por relevancia. Admite ?fields=.
+    Si SQLite no tiene FTS5 o el índice no existe responde 503.
+    """
+    match = build_match_query(request.args.get('q', ''))
+    if match is None:
+        return jsonify({'error': 'El parámetro q es obligatorio'}), 400
+
+    try:
+        limit = int(request.args.get('limit', SEARCH_PAGE_SIZE))
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return jsonify({'error': 'Parámetros de paginación inválidos'}), 400
+
+    if limit < 1 or offset < 0 or offset > SEARCH_MAX_OFFSET:
+        return jsonify({'error': 'Parámetros de paginación inválidos'}), 400
+    limit = min(limit, SEARCH_MAX_PAGE_SIZE)
+
+    try:
+        fields = requested_fields(USER_LIST_FIELDS)
+    except ValueError as e:
+        return invalid_fields_response(e)
+
+    columns = [User.id] + [getattr(User, name) for name in fields if name != 'id']
+    # Se pide una fila de más para saber si hay otra página sin contar todas las coincidencias
+    try:
+        rows = db.session.execute(search_users_statement(match, columns, limit + 1, offset)).all()
+    except OperationalError:
+        db.session.rollback()
+        if user_search_available(db.engine):
+            raise
+        return jsonify({'error': 'La búsqueda no está disponible: falta el índice FTS5'}), 503
+    serialize = user_serializer.compile(fields)
+
+    next_offset = offset + limit if len(rows) > limit else None
+    response = jsonify({
+        'users': [serialize(row) for row in rows[:limit]],
+        'next_offset': next_offset
+    })
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@user_bp.route('/stats', methods=['GET'])
+@admin_required
+def get_stats():
+    """
+    Totales de usuarios (todos, verificados, premium) y altas por día de los
+    últimos ?days=N días. Sale de contadores mantenidos por triggers: el coste
+    no depende del número de usuarios.
+    """
+    try:
+        days = int(request.args.get('days', STATS_DEFAULT_DAYS))
+    except ValueError:
+        return jsonify({'error': 'Parámetro days inválido'}), 400
+    if days < 1 or days > STATS_MAX_DAYS:
+        return jsonify({'error': 'Parámetro days inválido'}), 400
+
+    response = jsonify(get_user_stats(days))
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@user_bp.route('/profiles', methods=['GET'])
+@admin_required
+def get_profiles():
+    """
+    Perfiles guardados en PROFILE_DIR (de todos los procesos) y lo acumulado
+    por el proceso que atiende la petición, que se vuelca antes.
+    """
+    profiler.flush()
+    return jsonify({
+        'enabled': profiler.enabled,
+        'mode': profiler.mode,
+        'endpoints': list_profiles(profiler.directory),
+        'process': profiler.summary()
+    }), 200
+
+@user_bp.route('/profiles/<endpoint>', methods=['GET'])
+@admin_required
+def download_profile(endpoint):
+    """
+    Perfil de `endpoint` (p. ej. user.get_users) juntando todos los procesos:
+    ?format=pstats (binario, para pstats/snakeviz) o ?format=collapsed
+    (texto, para flamegraph.pl/speedscope).
+    """
+    output_format = request.args.get('format', 'pstats')
+    if output_format not in ('pstats', 'collapsed'):
+        return jsonify({'error': 'Formato no soportado'}), 400
+
+    profiler.flush()
+    if output_format == 'collapsed':
+        body = merge_collapsed(profiler.directory, endpoint)
+        mimetype = 'text/plain'
+    else:
+        fd, path = tempfile.mkstemp(suffix='.pstats')
+        os.close(fd)
+        try:
+            body = None
+            if merge_pstats(profiler.directory, endpoint, path):
+                with open(path, 'rb') as f:
+                    body = f.read()
+        finally:
+            os.remove(path)
+        mimetype = 'application/octet-stream'
+    if not body:
+        return jsonify({'error': 'No hay perfiles de ese endpoint'}), 404
+
+    response = Response(body, mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{secure_filename(endpoint)}.{output_format}"'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@user_bp.route('/profiles', methods=['DELETE'])
+@admin_required
+def clear_profiles():
+    removed = profiler.reset()
+    return jsonify({'message': 'Perfiles borrados', 'files': removed}), 200
+
+def parse_datetime_arg(name):
+    """
+    Lee un parámetro ISO 8601 (?since=2024-01-31T10:00:00). Lanza ValueError si no es válido.
+    """
+    value = request.args.get(name)
+    return datetime.fromisoformat(value) if value else None
+
+@user_bp.route('/auth-events', methods=['GET'])
+@admin_required
+def get_auth_events():
+    """
+    Eventos de autenticación, del más reciente al más antiguo:
+    ?since=&until= (ISO 8601, UTC), ?user_id=, ?type=, ?limit= y ?cursor=
+    (el `next_cursor` de la página anterior). Los eventos aún en el buffer
+    del proceso no aparecen hasta que se vuelcan (como mucho
+    AUTH_EVENTS_FLUSH_INTERVAL segundos).
+    """
+    try:
+        since = parse_datetime_arg('since')
+        until = parse_datetime_arg('until')
+        user_id = request.args.get('user_id', type=int)
+        limit = int(request.args.get('limit', AUTH_EVENTS_PAGE_SIZE))
+        before = None
+        cursor = request.args.get('cursor')
+        if cursor:
+            created_at, event_id = cursor.rsplit('_', 1)
+            before = (datetime.fromisoformat(created_at), int(event_id))
+    except ValueError:
+        return jsonify({'error': 'Parámetros inválidos'}), 400
+
+    if limit < 1:
+        return jsonify({'error': 'Parámetros inválidos'}), 400
+    limit = min(limit, AUTH_EVENTS_MAX_PAGE_SIZE)
+
+    event_type = request.args.get('type')
+    if event_type is not None and event_type not in AuthEvent.TYPES:
+        return jsonify({'error': 'Tipo de evento desconocido'}), 400
+
+    events = query_auth_events(since=since, until=until, user_id=user_id, event_type=event_type,
+                               before=before, limit=limit)
+    next_cursor = None
+    if len(events) == limit:
+        next_cursor = f"{events[-1].created_at.isoformat()}_{events[-1].id}"
+    response = jsonify({'events': [event.to_dict() for event in events], 'next_cursor': next_cursor})
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+def _fetch_partitions(rows):
+    # Las filas se leen del cursor mientras se envía la respuesta: cuenta como
+    # tiempo de base de datos de la petición (ver src/utils/metrics.py)
+    partitions = rows.partitions()
+    while True:
+        with timed('db'):
+            chunk = next(partitions, None)
+        if chunk is None:
+            return
+        yield chunk
+
+def _stream_users_json(rows, limit, serialize):
+    yield '{"users":['
+    count = 0
+    last_id = None
+    for chunk in _fetch_partitions(rows):
+        parts = []
+        for row in chunk:
+            parts.append(json.dumps(serialize(row), ensure_ascii=False))
+            last_id = row.id
+        yield (',' if count else '') + ','.join(parts)
+        count += len(chunk)
+
+    # Si la página vino llena puede haber más usuarios después del último id
+    next_cursor = last_id if count == limit else None
+    yield f'],"next_cursor":{json.dumps(next_cursor)}}}'
 
+def _stream_users_ndjson(rows, serialize):
+    for chunk in _fetch_partitions(rows):
+        yield ''.join(json.dumps(serialize(row), ensure_ascii=False) + '\n' for row in chunk)
@@ -0,0 +1,392 @@
+"""
+Servidor de producción multiproceso (solo biblioteca estándar y Werkzeug).
+
+    python -m src.serve --workers 4 --threads 8 --port 5000
+
+El proceso maestro abre el socket (con SO_REUSEPORT, para poder arrancar
+otra instancia en el mismo puerto durante un despliegue) y lanza N workers
+con fork que lo comparten; cada worker atiende con un pool de hilos fijo.
+
+Señales del maestro:
+    SIGTERM / SIGINT   parada ordenada: los workers dejan de aceptar conexiones
+                       y terminan las peticiones en curso
+    SIGHUP             recarga sin cortes: arranca un worker nuevo, espera a que
+                       esté listo y retira uno antiguo, uno a uno
+
+Los workers que mueren se relanzan. Sin --preload cada worker importa la app
+después del fork, así que un SIGHUP carga el código nuevo.
+"""
+import argparse
+import os
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+
+def log(message):
+    print(f"[SERVE {os.getpid()}] {message}", file=sys.stderr, flush=True)
+
+
+class RequestHandler(WSGIRequestHandler):
+    # Tiempo máximo de espera en una conexión keep-alive inactiva
+    timeout = 5
+    access_log = False
+
+    def log_request(self, code='-', size='-'):
+        if self.access_log:
+            super().log_request(code, size)
+
+    def end_headers(self):
+        # Al parar, se cierra cada conexión keep-alive tras su respuesta en curso
+        if self.server.stopping:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        super().end_headers()
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """
+    Servidor WSGI de Werkzeug que atiende cada conexión en un pool de hilos
+    de tamaño fijo (ThreadingMixIn crea un hilo por conexión, sin límite).
+    """
+    multithread = True
+
+    def __init__(self, host, port, app, threads, fd=None, handler=RequestHandler):
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='http')
+        self.stopping = False
+        super().__init__(host, port, app, handler=handler, fd=fd)
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def drain(self):
+        """
+        Espera a que terminen las conexiones que ya se estaban atendiendo.
+        """
+        self.executor.shutdown(wait=True)
+
+
+def load_app():
+    from src.main import create_app
+    return create_app()
+
+
+def run_worker(sock, options, ready_fd, app=None):
+    """
+    Bucle de un worker. Avisa al maestro por `ready_fd` cuando la app está
+    cargada y el servidor listo para aceptar conexiones.
+    """
+    master_pid = os.getppid()
+    for signum in (signal.SIGHUP, signal.SIGCHLD):
+        signal.signal(signum, signal.SIG_DFL)
+    signal.set_wakeup_fd(-1)
+
+    if app is None:
+        app = load_app()
+    RequestHandler.timeout = options.keepalive
+    RequestHandler.access_log = options.access_log
+    server = PooledWSGIServer(options.host, options.port, app, options.threads, fd=sock.fileno())
+    sock.close()
+
+    stopping = threading.Event()
+
+    def stop(signum=None, frame=None):
+        if not stopping.is_set():
+            stopping.set()
+            server.stopping = True
+            # shutdown() espera al bucle de serve_forever: no puede llamarse desde su mismo hilo
+            threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    def watch_master():
+        # Si el maestro muere (p. ej. con SIGKILL), el worker se retira solo
+        while not stopping.wait(1.0):
+            if os.getppid() != master_pid:
+                stop()
+
+    threading.Thread(target=watch_master, name='watch-master', daemon=True).start()
+
+    try:
+        os.write(ready_fd, b'1')
+    except OSError:
+        pass
+    os.close(ready_fd)
+
+    server.serve_forever(poll_interval=0.5)
+    server.drain()
+
+    # El worker sale con os._exit, que no ejecuta los atexit: volcar aquí lo pendiente
+    event_log = app.extensions.get('auth_event_log')
+    if event_log is not None:
+        event_log.stop()
+    maintenance = app.extensions.get('maintenance_scheduler')
+    if maintenance is not None:
+        maintenance.stop()
+    profiler = app.extensions.get('profiler')
+    if profiler is not None and profiler.enabled:
+        profiler.flush()
+
+
+class Worker:
+    __slots__ = ('pid', 'generation', 'started_at', 'ready_fd', 'retire_deadline')
+
+    def __init__(self, pid, generation, ready_fd):
+        self.pid = pid
+        self.generation = generation
+        self.started_at = time.monotonic()
+        self.ready_fd = ready_fd
+        self.retire_deadline = None
+
+
+class Arbiter:
+    """
+    Proceso maestro: mantiene `workers` procesos vivos, los relanza si mueren
+    y coordina la parada y la recarga.
+    """
+
+    # Un worker que muere antes de este tiempo se considera un fallo al arrancar
+    MIN_WORKER_LIFETIME = 1.0
+
+    def __init__(self, options):
+        self.options = options
+        self.workers = {}
+        self.generation = 0
+        self.sock = None
+        self.app = None
+        self.stopping = False
+        self.reload_requested = False
+        self._wakeup_r = None
+        self._wakeup_w = None
+
+    def bind(self):
+        family = socket.AF_INET6 if ':' in self.options.host else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, 'SO_REUSEPORT'):
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind((self.options.host, self.options.port))
+        sock.listen(self.options.backlog)
+        sock.set_inheritable(True)
+        self.sock = sock
+        # Con --port 0 el sistema elige el puerto; los workers usan el real
+        self.options.port = sock.getsockname()[1]
+
+    def install_signals(self):
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        os.set_blocking(self._wakeup_r, False)
+        os.set_blocking(self._wakeup_w, False)
+        signal.set_wakeup_fd(self._wakeup_w)
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGHUP, self._handle_reload)
+        # Sin manejador SIGCHLD no despierta a select(); con uno vacío sí
+        signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+
+    def _handle_stop(self, signum, frame):
+        self.stopping = True
+
+    def _handle_reload(self, signum, frame):
+        self.reload_requested = True
+
+    def sleep(self, timeout):
+        try:
+            ready, _, _ = select.select([self._wakeup_r], [], [], timeout)
+        except InterruptedError:
+            return
+        if ready:
+            try:
+                while os.read(self._wakeup_r, 1024):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def spawn(self):
+        ready_r, ready_w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                os.close(ready_r)
+                os.close(self._wakeup_r)
+                os.close(self._wakeup_w)
+                run_worker(self.sock, self.options, ready_w, self.app)
+            except BaseException:
+                traceback.print_exc()
+                status = 1
+            finally:
+                sys.stderr.flush()
+                os._exit(status)
+
+        os.close(ready_w)
+        self.workers[pid] = Worker(pid, self.generation, ready_r)
+        return self.workers[pid]
+
+    def wait_ready(self, worker, timeout):
+        """
+        Espera el aviso del worker. Devuelve False si muere o tarda demasiado.
+        """
+        deadline = time.monotonic() + timeout
+        while worker.ready_fd is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            ready, _, _ = select.select([worker.ready_fd], [], [], remaining)
+            if ready:
+                data = os.read(worker.ready_fd, 1)
+                os.close(worker.ready_fd)
+                worker.ready_fd = None
+                return data == b'1'
+        return True
+
+    def kill(self, worker, signum):
+        try:
+            os.kill(worker.pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def retire(self, worker):
+        worker.retire_deadline = time.monotonic() + self.options.graceful_timeout
+        self.kill(worker, signal.SIGTERM)
+
+    def reap(self):
+        """
+        Recoge los workers que han terminado. Devuelve cuántos murieron sin
+        que se les pidiera (y a qué edad murió el más joven).
+        """
+        unexpected = 0
+        youngest = None
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            worker = self.workers.pop(pid, None)
+            if worker is None:
+                continue
+            if worker.ready_fd is not None:
+                os.close(worker.ready_fd)
+            if worker.retire_deadline is None and not self.stopping:
+                age = time.monotonic() - worker.started_at
+                youngest = age if youngest is None else min(youngest, age)
+                unexpected += 1
+                log(f"worker {pid} terminó inesperadamente (estado {status}); se relanza")
+        return unexpected, youngest
+
+    def active_workers(self):
+        return [worker for worker in self.workers.values() if worker.retire_deadline is None]
+
+    def manage_workers(self):
+        now = time.monotonic()
+        for worker in list(self.workers.values()):
+            if worker.retire_deadline is not None and now > worker.retire_deadline:
+                log(f"worker {worker.pid} no terminó a tiempo; SIGKILL")
+                self.kill(worker, signal.SIGKILL)
+                worker.retire_deadline = float('inf')
+
+        for _ in range(self.options.workers - len(self.active_workers())):
+            self.spawn()
+
+    def reload(self):
+        self.reload_requested = False
+        self.generation += 1
+        log(f"recarga: generación {self.generation}")
+        for old in [w for w in self.active_workers() if w.generation < self.generation]:
+            if self.stopping:
+                return
+            new = self.spawn()
+            if not self.wait_ready(new, self.options.startup_timeout):
+                log(f"el worker nuevo {new.pid} no arrancó; se cancela la recarga")
+                self.retire(new)
+                return
+            self.retire(old)
+        log("recarga completada")
+
+    def run(self):
+        if self.options.preload:
+            self.app = load_app()
+        self.bind()
+        self.install_signals()
+        log(f"escuchando en {self.options.host}:{self.options.port} con "
+            f"{self.options.workers} workers x {self.options.threads} hilos")
+
+        for worker in [self.spawn() for _ in range(self.options.workers)]:
+            if not self.wait_ready(worker, self.options.startup_timeout):
+                log(f"el worker {worker.pid} no arrancó")
+
+        while not self.stopping:
+            unexpected, youngest = self.reap()
+            if unexpected and youngest < self.MIN_WORKER_LIFETIME:
+                # Evita relanzar en bucle un worker que falla al arrancar
+                self.sleep(self.MIN_WORKER_LIFETIME)
+            if self.stopping:
+                break
+            if self.reload_requested:
+                self.reload()
+            self.manage_workers()
+            self.sleep(1.0)
+
+        self.shutdown()
+
+    def shutdown(self):
+        log("parando workers")
+        deadline = time.monotonic() + self.options.graceful_timeout
+        for worker in self.workers.values():
+            self.kill(worker, signal.SIGTERM)
+        while self.workers and time.monotonic() < deadline:
+            self.reap()
+            self.sleep(0.1)
+        for worker in self.workers.values():
+            self.kill(worker, signal.SIGKILL)
+        while self.workers:
+            pid, _ = os.waitpid(-1, 0)
+            self.workers.pop(pid, None)
+        self.sock.close()
+        log("parado")
+
+
+def parse_args(argv=None):
+    env = os.environ.get
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default=env('SERVE_HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(env('SERVE_PORT', '5000')))
+    parser.add_argument('--workers', type=int, default=int(env('SERVE_WORKERS', str(os.cpu_count() or 1))),
+                        help='Procesos worker (por defecto, uno por núcleo)')
+    parser.add_argument('--threads', type=int, default=int(env('SERVE_THREADS', '8')),
+                        help='Hilos por worker (no más que SQLITE_POOL_SIZE)')
+    parser.add_argument('--backlog', type=int, default=int(env('SERVE_BACKLOG', '2048')))
+    parser.add_argument('--keepalive', type=float, default=float(env('SERVE_KEEPALIVE', '5')),
+                        help='Segundos que se mantiene abierta una conexión inactiva')
+    parser.add_argument('--graceful-timeout', type=float, default=float(env('SERVE_GRACEFUL_TIMEOUT', '30')),
+                        help='Segundos para terminar las peticiones en curso antes de SIGKILL')
+    parser.add_argument('--startup-timeout', type=float, default=float(env('SERVE_STARTUP_TIMEOUT', '60')))
+    parser.add_argument('--preload', action='store_true',
+                        help='Carga la app en el maestro antes del fork (SIGHUP no carga código nuevo)')
+    parser.add_argument('--access-log', action='store_true', help='Registra cada petición en stderr')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    Arbiter(parse_args(argv)).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,25 @@
+import hmac
+from functools import wraps
+
+from flask import current_app, jsonify, request
+
+
+def admin_required(view):
+    """
+    Protege los endpoints de la consola de administración con el token
+    compartido ADMIN_API_TOKEN, enviado en la cabecera X-Admin-Token o como
+    `Authorization: Bearer <token>` (lo que admite Prometheus para /metrics).
+    Sin token configurado los endpoints quedan deshabilitados.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        expected = current_app.config.get('ADMIN_API_TOKEN')
+        if not expected:
+            return jsonify({'error': 'Administración deshabilitada'}), 403
+        provided = request.headers.get('X-Admin-Token', '')
+        if not provided and request.authorization is not None and request.authorization.type == 'bearer':
+            provided = request.authorization.token or ''
+        if not hmac.compare_digest(provided.encode(), expected.encode()):
+            return jsonify({'error': 'No autorizado'}), 401
+        return view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,188 @@
+import atexit
+import json
+import os
+import threading
+from collections import deque
+from datetime import datetime
+
+from flask import has_request_context, request
+from sqlalchemy import insert, select, tuple_
+
+from src.models.auth_event import AuthEvent
+from src.models.user import db
+from src.utils.ratelimit import rate_limiter
+
+
+class AuthEventLog:
+    """
+    Registro de eventos con escritura agrupada: las vistas solo añaden el
+    evento a un buffer en memoria y un hilo por proceso lo vuelca con un único
+    INSERT por lote cuando se juntan AUTH_EVENTS_BATCH_SIZE eventos o pasan
+    AUTH_EVENTS_FLUSH_INTERVAL segundos. Así un login no añade un commit más.
+
+    El buffer tiene como máximo AUTH_EVENTS_MAX_BUFFER eventos; si la base de
+    datos no da abasto se descartan los más antiguos y se cuentan en `dropped`.
+    Lo pendiente se vuelca al parar el proceso (atexit, o stop() en los
+    workers de src/serve.py, que salen con os._exit).
+    """
+
+    def __init__(self):
+        self.app = None
+        self.enabled = True
+        self.batch_size = 200
+        self.flush_interval = 1.0
+        self.max_buffer = 10000
+        self.written = 0
+        self.dropped = 0
+        self._buffer = deque()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+
+    def init_app(self, app):
+        app.config.setdefault('AUTH_EVENTS_ENABLED', self.enabled)
+        app.config.setdefault('AUTH_EVENTS_BATCH_SIZE', self.batch_size)
+        app.config.setdefault('AUTH_EVENTS_FLUSH_INTERVAL', self.flush_interval)
+        app.config.setdefault('AUTH_EVENTS_MAX_BUFFER', self.max_buffer)
+        self.enabled = app.config['AUTH_EVENTS_ENABLED']
+        self.batch_size = app.config['AUTH_EVENTS_BATCH_SIZE']
+        self.flush_interval = app.config['AUTH_EVENTS_FLUSH_INTERVAL']
+        self.max_buffer = app.config['AUTH_EVENTS_MAX_BUFFER']
+        self.app = app
+        app.extensions['auth_event_log'] = self
+
+    def record(self, event_type, user_id=None, username=None, **details):
+        """
+        Añade un evento al buffer. No toca la base de datos.
+        """
+        if not self.enabled:
+            return
+        event = {
+            'created_at': datetime.utcnow(),
+            'event_type': event_type,
+            'user_id': user_id,
+            'username': username,
+            'ip': None,
+            'user_agent': None,
+            'details': json.dumps(details, ensure_ascii=False) if details else None
+        }
+        if has_request_context():
+            event['ip'] = rate_limiter.client_ip()
+            event['user_agent'] = request.user_agent.string[:255] or None
+
+        self._ensure_started()
+        with self._lock:
+            if len(self._buffer) >= self.max_buffer:
+                self._buffer.popleft()
+                self.dropped += 1
+            self._buffer.append(event)
+            pending = len(self._buffer)
+        if pending >= self.batch_size:
+            self._wakeup.set()
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # Tras un fork el hilo del padre no existe y su buffer no es nuestro
+            self._buffer.clear()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='auth-events', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+            atexit.register(self.stop)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error guardando eventos de autenticación: {str(e)}")
+
+    def flush(self):
+        """
+        Vuelca todo el buffer en transacciones de hasta `batch_size` filas.
+        Si una falla, sus eventos vuelven al buffer para el siguiente intento.
+        """
+        total = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+                if not batch:
+                    return total
+                try:
+                    with self.app.app_context(), db.engine.begin() as conn:
+                        conn.execute(insert(AuthEvent), batch)
+                except Exception:
+                    with self._lock:
+                        self._requeue(batch)
+                    raise
+                total += len(batch)
+                self.written += len(batch)
+
+    def _requeue(self, batch):
+        room = self.max_buffer - len(self._buffer)
+        if room < len(batch):
+            self.dropped += len(batch) - max(room, 0)
+            batch = batch[len(batch) - max(room, 0):]
+        self._buffer.extendleft(reversed(batch))
+
+    def stop(self, timeout=5):
+        if self._pid != os.getpid():
+            return
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Error guardando eventos de autenticación: {str(e)}")
+
+    def pending(self):
+        return len(self._buffer)
+
+
+auth_event_log = AuthEventLog()
+
+
+def query_auth_events(since=None, until=None, user_id=None, event_type=None, before=None, limit=100):
+    """
+    Eventos más recientes primero, filtrados por rango [since, until) y
+    opcionalmente por usuario y tipo. `before` es la clave (created_at, id)
+    del último evento de la página anterior.
+    """
+    stmt = select(AuthEvent)
+    if since is not None:
+        stmt = stmt.where(AuthEvent.created_at >= since)
+    if until is not None:
+        stmt = stmt.where(AuthEvent.created_at < until)
+    if user_id is not None:
+        stmt = stmt.where(AuthEvent.user_id == user_id)
+    if event_type is not None:
+        stmt = stmt.where(AuthEvent.event_type == event_type)
+    if before is not None:
+        stmt = stmt.where(tuple_(AuthEvent.created_at, AuthEvent.id) < tuple_(*before))
+    stmt = stmt.order_by(AuthEvent.created_at.desc(), AuthEvent.id.desc()).limit(limit)
+    return db.session.execute(stmt).scalars().all()
+
+
+def auth_events_collector(event_log):
+    def collect():
+        return [
+            '# TYPE asforp_auth_events_written_total counter',
+            f'asforp_auth_events_written_total {event_log.written}',
+            '# TYPE asforp_auth_events_dropped_total counter',
+            f'asforp_auth_events_dropped_total {event_log.dropped}',
+            '# TYPE asforp_auth_events_pending gauge',
+            f'asforp_auth_events_pending {event_log.pending()}',
+        ]
+    return collect
@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+
+from sqlalchemy import event, exists, func, select
+
+from src.models.user import User, db
+from src.utils.bloom import BloomFilter
+
+
+class AvailabilityIndex:
+    """
+    Índice en memoria (filtro de Bloom) de usernames y emails registrados.
+    Si el filtro dice que un valor no existe, está libre sin consultar SQLite;
+    si dice que puede existir, se confirma con la base de datos.
+
+    Se construye en segundo plano desde la tabla, se actualiza con cada INSERT
+    de User hecho por el ORM o por `flask users import` y se reconstruye cada
+    AVAILABILITY_REFRESH_SECONDS (para recoger altas de otros procesos y
+    olvidar los usuarios borrados) o cuando se llena.
+
+    Un "no existe" del filtro puede quedarse atrás respecto a las altas de
+    otro proceso hasta la siguiente reconstrucción. Es inofensivo: /register
+    se apoya en los índices UNIQUE y responde que el valor ya está en uso.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.error_rate = 0.01
+        self.refresh_seconds = 600
+        self._filter = None
+        self._pid = None
+        self._built_at = 0
+        self._building = False
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.config.setdefault('AVAILABILITY_ERROR_RATE', self.error_rate)
+        app.config.setdefault('AVAILABILITY_REFRESH_SECONDS', self.refresh_seconds)
+        self.error_rate = app.config['AVAILABILITY_ERROR_RATE']
+        self.refresh_seconds = app.config['AVAILABILITY_REFRESH_SECONDS']
+        self.app = app
+        # Un filtro de otra app (otra base de datos) no sirve
+        self._filter = None
+        self._pid = None
+        app.extensions['availability_index'] = self
+
+    def _is_stale(self):
+        return (
+            self._filter is None
+            or self._pid != os.getpid()
+            or time.monotonic() - self._built_at > self.refresh_seconds
+            or self._filter.is_full
+        )
+
+    def _ensure_fresh(self):
+        if not self._is_stale() or self.app is None:
+            return
+        with self._lock:
+            if self._building and self._pid == os.getpid():
+                return
+            if self._pid != os.getpid():
+                # Filtro heredado de otro proceso: no es fiable
+                self._filter = None
+                self._pid = os.getpid()
+            self._building = True
+            self._pending = []
+        threading.Thread(target=self._rebuild_in_background, name='availability-index', daemon=True).start()
+
+    def _rebuild_in_background(self):
+        try:
+            with self.app.app_context():
+                self.rebuild()
+        except Exception as e:
+            print(f"Error construyendo el índice de disponibilidad: {str(e)}")
+        finally:
+            self._building = False
+
+    def rebuild(self):
+        total = db.session.scalar(select(func.count(User.id))) or 0
+        bloom = BloomFilter(max(total * 2, 10000), self.error_rate)
+        rows = db.session.execute(
+            select(User.username, User.email).execution_options(yield_per=5000)
+        )
+        for username, email in rows:
+            bloom.add(f'u:{username}')
+            bloom.add(f'e:{email}')
+        db.session.rollback()
+
+        with self._lock:
+            # Altas que llegaron mientras se recorría la tabla
+            for key in self._pending:
+                bloom.add(key)
+            self._pending = []
+            self._filter = bloom
+            self._built_at = time.monotonic()
+            self._pid = os.getpid()
+
+    def _add_key(self, key):
+        # Con el lock que usa rebuild() para cambiar de filtro: la clave entra
+        # en el filtro que queda activo o en la lista de pendientes
+        with self._lock:
+            bloom = self._filter
+            if bloom is not None:
+                bloom.add(key)
+            if self._building:
+                self._pending.append(key)
+
+    def add(self, username, email):
+        self._add_key(f'u:{username}')
+        self._add_key(f'e:{email}')
+
+    def _might_exist(self, key):
+        self._ensure_fresh()
+        bloom = self._filter
+        if bloom is None or self._pid != os.getpid():
+            return True
+        return key in bloom
+
+    def is_username_available(self, username):
+        if not self._might_exist(f'u:{username}'):
+            return True
+        return not db.session.scalar(select(exists().where(User.username == username)))
+
+    def is_email_available(self, email):
+        if not self._might_exist(f'e:{email}'):
+            return True
+        return not db.session.scalar(select(exists().where(User.email == email)))
+
+
+availability_index = AvailabilityIndex()
+
+
+@event.listens_for(User, 'after_insert')
+def _index_new_user(mapper, connection, target):
+    availability_index.add(target.username, target.email)
@@ -0,0 +1,148 @@
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import select
+
+from src.models.user import User, db, user_serializer, USER_FIELDS
+
+
+class LRUCache:
+    """
+    Caché LRU con TTL, segura entre hilos y local a cada proceso.
+    Los valores devueltos se comparten: no deben modificarse.
+    """
+
+    def __init__(self, maxsize=10000, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_where(self, predicate):
+        """
+        Elimina las entradas cuyo valor cumple `predicate`. Recorre toda la caché.
+        """
+        with self._lock:
+            keys = [key for key, (_, value) in self._data.items() if predicate(value)]
+            for key in keys:
+                del self._data[key]
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'hit_ratio': round(self.hits / total, 4) if total else 0.0
+        }
+
+
+class UserCache:
+    """
+    Caché de lectura de usuarios serializados (todos los campos, incluida
+    `version`) por id, para que las rutas autenticadas por sesión no abran una
+    transacción en cada petición.
+    Las rutas que modifican el usuario llaman a invalidate() tras el commit.
+
+    La caché es de cada proceso: un cambio hecho en otro worker (o por el
+    mantenimiento, o por la CLI) no la invalida. get() puede devolver una copia
+    de hasta USER_CACHE_TTL segundos, lo que se acepta para leer el perfil;
+    las operaciones que deciden con el valor (p. ej. upgrade-premium) usan
+    get_current(), que compara `version` con la base de datos.
+    """
+
+    def __init__(self):
+        self.cache = LRUCache()
+        self.stale = 0
+
+    def init_app(self, app):
+        app.config.setdefault('USER_CACHE_SIZE', 10000)
+        app.config.setdefault('USER_CACHE_TTL', 60)
+        self.cache = LRUCache(maxsize=app.config['USER_CACHE_SIZE'], ttl=app.config['USER_CACHE_TTL'])
+        self.stale = 0
+        app.extensions['user_cache'] = self
+
+    def get(self, user_id):
+        data = self.cache.get(user_id)
+        if data is not None:
+            return data
+        return self._load(user_id)
+
+    def get_current(self, user_id):
+        """
+        Como get(), pero confirma la copia en caché leyendo solo `version` por
+        clave primaria. Si la fila cambió en otro proceso se vuelve a cargar.
+        """
+        data = self.cache.get(user_id)
+        if data is None:
+            return self._load(user_id)
+        version = db.session.scalar(select(User.version).where(User.id == user_id))
+        if version == data['version']:
+            return data
+        self.stale += 1
+        self.cache.delete(user_id)
+        if version is None:
+            return None
+        return self._load(user_id)
+
+    def _load(self, user_id):
+        user = db.session.get(User, user_id)
+        if not user:
+            return None
+        data = user_serializer.serialize(user, USER_FIELDS)
+        self.cache.set(user_id, data)
+        return data
+
+    def invalidate(self, user_id):
+        self.cache.delete(user_id)
+
+    def stats(self):
+        return dict(self.cache.stats(), stale=self.stale)
+
+
+user_cache = UserCache()
@@ -0,0 +1,348 @@
+import os
+import smtplib
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from sqlalchemy import select, tuple_, update
+
+from src.models.email_campaign import EmailCampaign
+from src.models.user import User, db
+from src.utils.email_queue import smtp_pool_from_env
+from src.utils.email_templates import EmailTemplates, compose_message
+from src.utils.leases import acquire_lease, lease_owner, release_lease
+
+PREMIUM_RENEWAL_SUBJECT = "Tu membresía premium de ASFORP caduca pronto"
+
+# Duración de la concesión de una ejecución; se renueva cada tercio de este tiempo.
+# Si el proceso muere, otra ejecución puede tomar la campaña cuando caduca.
+CAMPAIGN_LEASE_SECONDS = 300
+
+_render_templates = None
+
+
+def _init_renderer():
+    global _render_templates
+    _render_templates = EmailTemplates()
+
+
+class CampaignLeaseLost(Exception):
+    """
+    Esta ejecución ya no tiene la concesión de la campaña: deja de enviar.
+    """
+
+
+def campaign_lease(campaign_id):
+    return f"campaign:{campaign_id}"
+
+
+def render_batch(template, subject, sender, base_url, now, users):
+    """
+    Renderiza un lote en un proceso del pool. `users` son tuplas
+    (email, nombre, premium_expires_at); devuelve [(email, mensaje)].
+    """
+    templates = _render_templates or EmailTemplates()
+    messages = []
+    for email, full_name, expires_at in users:
+        text, html = templates.render_pair(
+            template,
+            user_name=full_name,
+            expires_on=expires_at.strftime('%d/%m/%Y'),
+            days_left=max((expires_at - now).days, 1),
+            renewal_url=f"{base_url}/premium"
+        )
+        messages.append((email, compose_message(sender, email, subject, text, html)))
+    return messages
+
+
+class CampaignRunner:
+    """
+    Envía una campaña por lotes: lee los usuarios en streaming, renderiza el
+    lote siguiente en un pool de procesos mientras se envía el actual por
+    varias conexiones SMTP persistentes, y guarda el checkpoint tras cada lote.
+
+    La entrega es "al menos una vez": si el proceso muere a mitad de un lote,
+    ese lote se vuelve a enviar al reanudar.
+
+    Solo envía quien tiene la concesión campaign:<id> de la tabla lease (ver
+    start_campaign). Un hilo la renueva cada tercio de `lease_seconds` y cada
+    checkpoint la renueva en la misma transacción; antes de cada mensaje se
+    comprueba que la última renovación sigue vigente. Si otra ejecución la
+    toma, esta se detiene con CampaignLeaseLost sin tocar el checkpoint.
+    """
+
+    def __init__(self, campaign_id, batch_size=500, connections=4, render_workers=None,
+                 base_url="http://localhost:5174", progress=None, owner=None,
+                 lease_seconds=CAMPAIGN_LEASE_SECONDS):
+        self.campaign_id = campaign_id
+        self.batch_size = batch_size
+        self.connections = connections
+        self.render_workers = render_workers or os.cpu_count() or 1
+        self.base_url = base_url
+        self.progress = progress
+        self.sender = os.getenv('EMAIL_USER', 'noreply@asforp.com')
+        self.delivery = os.getenv('EMAIL_DELIVERY', 'simulado')
+        self.pool = None
+        self.owner = owner or lease_owner()
+        self.lease = campaign_lease(campaign_id)
+        self.lease_seconds = lease_seconds
+        self.lease_deadline = 0.0
+
+    def _renew(self, conn=None):
+        """
+        Renueva la concesión. Se da por vigente hasta dos tercios de su
+        duración después de renovarla, con margen para un latido perdido.
+        """
+        renewed_at = time.monotonic()
+        if acquire_lease(self.lease, self.owner, self.lease_seconds, conn=conn):
+            self.lease_deadline = renewed_at + self.lease_seconds * 2 / 3
+            return True
+        self.lease_deadline = 0.0
+        return False
+
+    def _check_lease(self):
+        if time.monotonic() >= self.lease_deadline:
+            raise CampaignLeaseLost(f"La campaña {self.campaign_id} ya no es de {self.owner}")
+
+    def _heartbeat(self, app, stop):
+        while not stop.wait(self.lease_seconds / 3):
+            try:
+                with app.app_context():
+                    if not self._renew():
+                        return
+            except Exception as e:
+                print(f"Error renovando la concesión de la campaña: {str(e)}")
+
+    def _user_batches(self, campaign):
+        """
+        Recorre los usuarios de la ventana en orden (premium_expires_at, id),
+        el mismo del índice ix_user_premium_expires_at, desde el checkpoint.
+
+        Cada lote es una consulta por clave (keyset) en su propia transacción
+        corta: un cursor abierto toda la campaña bloquearía los checkpoints con
+        el journal de rollback y, en WAL, impediría que el WAL se recortara.
+        """
+        stmt = (
+            select(User.id, User.email, User.full_name, User.premium_expires_at)
+            .where(
+                User.is_premium.is_(True),
+                User.premium_expires_at >= campaign.window_start,
+                User.premium_expires_at < campaign.window_end
+            )
+            .order_by(User.premium_expires_at, User.id)
+            .limit(self.batch_size)
+        )
+        last = None
+        if campaign.last_user_id is not None:
+            last = (campaign.last_expires_at, campaign.last_user_id)
+
+        while True:
+            page = stmt
+            if last is not None:
+                page = stmt.where(tuple_(User.premium_expires_at, User.id) > tuple_(*last))
+            with db.engine.connect() as conn:
+                rows = conn.execute(page).all()
+            if not rows:
+                return
+            yield rows
+            if len(rows) < self.batch_size:
+                return
+            last = (rows[-1].premium_expires_at, rows[-1].id)
+
+    def _send_one(self, item):
+        recipient, message = item
+        self._check_lease()
+        if self.delivery != 'smtp':
+            return None
+        for attempt in range(2):
+            try:
+                with self.pool.connection() as conn:
+                    conn.sendmail(self.sender, [recipient], message)
+                return None
+            except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused) as e:
+                # El servidor rechazó este mensaje; la conexión sigue siendo válida
+                return f"{recipient}: {type(e).__name__}: {str(e)}"
+            except (smtplib.SMTPException, OSError) as e:
+                # Conexión caída: el pool la descarta y se reintenta una vez con otra
+                error = f"{recipient}: {type(e).__name__}: {str(e)}"
+        return error
+
+    def _checkpoint(self, last_row, sent, failed, last_error):
+        values = {
+            'last_expires_at': last_row.premium_expires_at,
+            'last_user_id': last_row.id,
+            'sent': EmailCampaign.sent + sent,
+            'failed': EmailCampaign.failed + failed,
+            'updated_at': datetime.utcnow()
+        }
+        if last_error:
+            values['last_error'] = last_error[:1000]
+        with db.engine.begin() as conn:
+            if not self._renew(conn):
+                raise CampaignLeaseLost(f"La campaña {self.campaign_id} ya no es de {self.owner}")
+            conn.execute(update(EmailCampaign).where(EmailCampaign.id == self.campaign_id).values(**values))
+
+    def _finish(self, status):
+        """
+        Guarda el estado final y suelta la concesión, salvo que ya sea de otra
+        ejecución: entonces el estado es suyo.
+        """
+        values = {'status': status, 'updated_at': datetime.utcnow()}
+        if status == EmailCampaign.STATUS_COMPLETED:
+            values['finished_at'] = datetime.utcnow()
+        with db.engine.begin() as conn:
+            if not acquire_lease(self.lease, self.owner, self.lease_seconds, conn=conn):
+                return
+            conn.execute(update(EmailCampaign).where(EmailCampaign.id == self.campaign_id).values(**values))
+        release_lease(self.lease, self.owner)
+
+    def run(self):
+        """
+        Ejecuta la campaña hasta el final. Devuelve {'sent', 'failed', 'seconds', 'per_second'}.
+        Lanza CampaignLeaseLost si la campaña no es (o deja de ser) de esta ejecución.
+        """
+        campaign = db.session.get(EmailCampaign, self.campaign_id)
+        db.session.expunge(campaign)
+        db.session.rollback()
+        now = datetime.utcnow()
+        if not self._renew():
+            raise CampaignLeaseLost(f"La campaña {self.campaign_id} ya no es de {self.owner}")
+
+        if self.delivery == 'smtp':
+            self.pool = smtp_pool_from_env(size=self.connections)
+
+        stats = {'sent': 0, 'failed': 0}
+        start = time.perf_counter()
+        status = EmailCampaign.STATUS_PAUSED
+        stop = threading.Event()
+        threading.Thread(target=self._heartbeat, args=(current_app._get_current_object(), stop),
+                         name='campaign-lease', daemon=True).start()
+        try:
+            with ProcessPoolExecutor(max_workers=self.render_workers, initializer=_init_renderer) as renderers, \
+                    ThreadPoolExecutor(max_workers=self.connections, thread_name_prefix='campaign-smtp') as senders:
+                pending = None
+                for rows in self._user_batches(campaign):
+                    # Se renderiza este lote mientras se envía el anterior
+                    chunk = max(len(rows) // self.render_workers, 1)
+                    futures = [
+                        renderers.submit(
+                            render_batch, campaign.template, campaign.subject, self.sender, self.base_url, now,
+                            [(row.email, row.full_name, row.premium_expires_at) for row in rows[i:i + chunk]]
+                        )
+                        for i in range(0, len(rows), chunk)
+                    ]
+                    if pending is not None:
+                        self._send_batch(senders, *pending, stats, start)
+                    pending = (rows, futures)
+                if pending is not None:
+                    self._send_batch(senders, *pending, stats, start)
+            status = EmailCampaign.STATUS_COMPLETED
+        finally:
+            stop.set()
+            self._finish(status)
+            if self.pool is not None:
+                self.pool.close()
+
+        elapsed = time.perf_counter() - start
+        stats['seconds'] = round(elapsed, 3)
+        stats['per_second'] = round((stats['sent'] + stats['failed']) / elapsed, 1) if elapsed else 0.0
+        return stats
+
+    def _send_batch(self, senders, rows, futures, stats, start):
+        messages = [message for future in futures for message in future.result()]
+        errors = [error for error in senders.map(self._send_one, messages) if error]
+        sent = len(messages) - len(errors)
+        self._checkpoint(rows[-1], sent, len(errors), errors[-1] if errors else None)
+        stats['sent'] += sent
+        stats['failed'] += len(errors)
+        if self.progress:
+            self.progress(stats, time.perf_counter() - start)
+
+
+def start_campaign(name, template, subject, window_start, window_end, force=False, owner=None):
+    """
+    Crea la campaña `name` o recupera una interrumpida y toma su concesión
+    para `owner` (por defecto este proceso), que es quien debe ejecutarla con
+    CampaignRunner. Devuelve None si ya está completada o si otra ejecución
+    tiene la concesión; `force` se la quita.
+    """
+    owner = owner or lease_owner()
+    campaign = EmailCampaign.query.filter_by(name=name).first()
+    if campaign is None:
+        campaign = EmailCampaign(
+            name=name, template=template, subject=subject,
+            window_start=window_start, window_end=window_end,
+            status=EmailCampaign.STATUS_RUNNING
+        )
+        db.session.add(campaign)
+        db.session.commit()
+        if not acquire_lease(campaign_lease(campaign.id), owner, CAMPAIGN_LEASE_SECONDS):
+            return None
+        return campaign
+
+    if campaign.status == EmailCampaign.STATUS_COMPLETED:
+        return None
+
+    # Solo una ejecución puede tener la concesión; la de un proceso caído caduca
+    if not acquire_lease(campaign_lease(campaign.id), owner, CAMPAIGN_LEASE_SECONDS, force=force):
+        return None
+    campaign.status = EmailCampaign.STATUS_RUNNING
+    campaign.updated_at = datetime.utcnow()
+    db.session.commit()
+    return campaign
+
+
+@click.group('campaign')
+def campaign_cli():
+    """Campañas de email masivas."""
+
+
+def _run_campaign(campaign, batch_size, connections, render_workers, base_url):
+    click.echo(f"Campaña {campaign.name}: premium que caduca entre "
+               f"{campaign.window_start:%Y-%m-%d %H:%M} y {campaign.window_end:%Y-%m-%d %H:%M}")
+
+    def progress(stats, elapsed):
+        click.echo(f"  {stats['sent']} enviados, {stats['failed']} fallidos "
+                   f"({(stats['sent'] + stats['failed']) / elapsed:.0f} msg/s)", err=True)
+
+    runner = CampaignRunner(campaign.id, batch_size=batch_size, connections=connections,
+                            render_workers=render_workers, base_url=base_url, progress=progress)
+    try:
+        stats = runner.run()
+    except CampaignLeaseLost:
+        click.echo(f"Otra ejecución ha tomado la campaña {campaign.name}; esta se detiene")
+        return
+    click.echo(f"{stats['sent']} enviados, {stats['failed']} fallidos en {stats['seconds']}s "
+               f"({stats['per_second']} msg/s)")
+
+
+@campaign_cli.command('premium-renewal')
+@click.option('--days', type=int, default=7, show_default=True, help='Premium que caducan en los próximos N días.')
+@click.option('--name', help='Nombre de la campaña (por defecto premium-renewal-AAAA-MM-DD).')
+@click.option('--batch-size', type=int, default=500, show_default=True, help='Usuarios por lote y checkpoint.')
+@click.option('--connections', type=int, default=4, show_default=True, help='Conexiones SMTP simultáneas.')
+@click.option('--render-workers', type=int, help='Procesos de renderizado (por defecto, núcleos disponibles).')
+@click.option('--base-url', default='http://localhost:5174', show_default=True)
+@click.option('--force', is_flag=True, help='Quita la campaña a otra ejecución aunque su concesión siga vigente.')
+def premium_renewal_command(days, name, batch_size, connections, render_workers, base_url, force):
+    """
+    Avisa a los usuarios cuyo premium caduca pronto. Si la campaña del mismo
+    nombre se interrumpió, continúa desde el último lote confirmado.
+    """
+    now = datetime.utcnow()
+    name = name or f"premium-renewal-{now:%Y-%m-%d}"
+    campaign = start_campaign(name, 'premium_renewal', PREMIUM_RENEWAL_SUBJECT, now, now + timedelta(days=days), force)
+    if campaign is None:
+        click.echo(f"La campaña {name} ya está completada o en marcha")
+        return
+    _run_campaign(campaign, batch_size, connections, render_workers, base_url)
+
+
+@campaign_cli.command('list')
+def campaign_list_command():
+    """Muestra las campañas y su progreso."""
+    for campaign in EmailCampaign.query.order_by(EmailCampaign.created_at.desc()).all():
+        click.echo(f"{campaign.name:<32} {campaign.status:<10} {campaign.sent:>8} enviados {campaign.failed:>6} fallidos")
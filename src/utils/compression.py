@@ -0,0 +1,160 @@
+import zlib
+
+from flask import request
+
+from src.utils.metrics import timed
+
+# Respuestas dinámicas que se comprimen (los estáticos ya se sirven con su copia gzip)
+COMPRESS_MIMETYPES = {'application/json', 'application/x-ndjson', 'text/plain', 'text/html'}
+
+# Igual que en src/utils/static_files.py: la variante gzip lleva su propio ETag
+GZIP_ETAG_SUFFIX = '-gz'
+
+# wbits=31: formato gzip (cabecera y CRC) en vez de zlib
+GZIP_WBITS = 31
+
+
+def etag_matches(etag):
+    """
+    True si If-None-Match contiene `etag` en su variante sin comprimir o gzip.
+    Las vistas que responden 304 deben usar esto en vez de if_none_match.contains.
+    """
+    return request.if_none_match.contains(etag) or request.if_none_match.contains(etag + GZIP_ETAG_SUFFIX)
+
+
+class GzipStream:
+    """
+    Comprime un cuerpo en streaming trozo a trozo. Cada trozo se vacía con
+    Z_SYNC_FLUSH para que el cliente lo reciba en cuanto se genera (p. ej.
+    las líneas de NDJSON) en vez de esperar a que se llene el buffer de zlib.
+    """
+
+    def __init__(self, head, chunks, level, source=None):
+        self.head = head
+        self.chunks = chunks
+        self.level = level
+        self.source = source if source is not None else chunks
+
+    def __iter__(self):
+        # El tiempo de compresión cuenta en la fase 'compress' de la petición,
+        # cuya medida sigue abierta hasta que se envía el cuerpo entero
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, GZIP_WBITS)
+        with timed('compress'):
+            data = compressor.compress(self.head) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield data
+        for chunk in self.chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            if chunk:
+                with timed('compress'):
+                    data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+                yield data
+        yield compressor.flush()
+
+    def close(self):
+        # El iterable original (p. ej. stream_with_context) libera aquí su contexto
+        close = getattr(self.source, 'close', None)
+        if close is not None:
+            close()
+
+
+class Compressor:
+    """
+    Comprime con gzip las respuestas de la API cuando el cliente lo acepta y
+    el cuerpo pasa de COMPRESS_MIN_SIZE bytes.
+
+    Con respuestas en streaming no se conoce el tamaño: se leen trozos hasta
+    llegar al mínimo; si el cuerpo acaba antes se envía sin comprimir y, si
+    no, se comprime el resto trozo a trozo según se genera.
+
+    Configuración (app.config):
+        COMPRESS_ENABLED    True por defecto
+        COMPRESS_LEVEL      nivel de zlib, 1 (rápido) a 9 (más pequeño); 6 por defecto
+        COMPRESS_MIN_SIZE   bytes; por debajo no compensa (1024 por defecto)
+        COMPRESS_MIMETYPES  tipos que se comprimen
+    """
+
+    def __init__(self):
+        self.level = 6
+        self.min_size = 1024
+        self.mimetypes = COMPRESS_MIMETYPES
+
+    def init_app(self, app):
+        app.config.setdefault('COMPRESS_ENABLED', True)
+        app.config.setdefault('COMPRESS_LEVEL', self.level)
+        app.config.setdefault('COMPRESS_MIN_SIZE', self.min_size)
+        app.config.setdefault('COMPRESS_MIMETYPES', self.mimetypes)
+        if not app.config['COMPRESS_ENABLED']:
+            return
+        self.level = app.config['COMPRESS_LEVEL']
+        self.min_size = app.config['COMPRESS_MIN_SIZE']
+        self.mimetypes = set(app.config['COMPRESS_MIMETYPES'])
+        app.extensions['compressor'] = self
+        app.after_request(self.after_request)
+
+    def after_request(self, response):
+        if response.status_code == 304:
+            # El 304 debe llevar el ETag de la variante que tiene el cliente
+            etag, weak = response.get_etag()
+            if etag and request.if_none_match.contains(etag + GZIP_ETAG_SUFFIX):
+                response.set_etag(etag + GZIP_ETAG_SUFFIX, weak)
+            return response
+
+        if (response.mimetype not in self.mimetypes
+                or response.status_code < 200 or response.status_code == 204
+                or response.direct_passthrough
+                or 'Content-Encoding' in response.headers
+                or 'no-transform' in response.headers.get('Cache-Control', '')):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        if request.method == 'HEAD' or request.accept_encodings['gzip'] <= 0:
+            return response
+
+        if response.is_streamed:
+            return self._compress_stream(response)
+
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+        with timed('compress'):
+            response.set_data(self._compress(data))
+        self._mark_compressed(response)
+        return response
+
+    def _compress(self, data):
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, GZIP_WBITS)
+        return compressor.compress(data) + compressor.flush()
+
+    def _compress_stream(self, response):
+        chunks = iter(response.response)
+        head = []
+        size = 0
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            head.append(chunk)
+            size += len(chunk)
+            if size >= self.min_size:
+                break
+        else:
+            # El cuerpo entero cabía por debajo del mínimo: se envía tal cual
+            close = getattr(response.response, 'close', None)
+            if close is not None:
+                close()
+            response.set_data(b''.join(head))
+            return response
+
+        response.response = GzipStream(b''.join(head), chunks, self.level, source=response.response)
+        response.headers.pop('Content-Length', None)
+        self._mark_compressed(response)
+        return response
+
+    def _mark_compressed(self, response):
+        response.headers['Content-Encoding'] = 'gzip'
+        etag, weak = response.get_etag()
+        if etag:
+            response.set_etag(etag + GZIP_ETAG_SUFFIX, weak)
+
+
+compressor = Compressor()
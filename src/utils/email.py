@@ -1,237 +1,91 @@
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 import os
-from urllib.parse import urljoin
+
+from flask import current_app
+
+from src.utils.email_queue import enqueue_email
+from src.utils.email_templates import EmailTemplates, compose_message
+from src.utils.metrics import timed
 
 class EmailService:
-    def __init__(self):
+    VERIFICATION_SUBJECT = "Verifica tu cuenta en ASFORP"
+    PREMIUM_CONFIRMATION_SUBJECT = "¡Bienvenido a ASFORP Premium!"
+
+    def __init__(self, templates=None):
         # Configuración de email (usando Gmail como ejemplo)
-        self.smtp_server = "smtp.gmail.com"
-        self.smtp_port = 587
+        self.smtp_server = os.getenv('EMAIL_SMTP_SERVER', 'smtp.gmail.com')
+        self.smtp_port = int(os.getenv('EMAIL_SMTP_PORT', '587'))
         self.email = os.getenv('EMAIL_USER', 'noreply@asforp.com')
         self.password = os.getenv('EMAIL_PASSWORD', '')
-        
+        # 'simulado' (por defecto) o 'smtp'
+        self.delivery = os.getenv('EMAIL_DELIVERY', 'simulado')
+        self._templates = templates
+
+    @property
+    def templates(self):
+        # Las plantillas se compilan una vez, con el primer envío, y se comparten entre envíos
+        if self._templates is None:
+            self._templates = EmailTemplates()
+        return self._templates
+
+    def build_message(self, template, subject, user_email, **context):
+        """
+        Renderiza la plantilla `template` (.txt y .html) y devuelve el mensaje MIME serializado
+        """
+        text_content, html_content = self.templates.render_pair(template, **context)
+        return compose_message(self.email, user_email, subject, text_content, html_content)
+
+    def build_verification_message(self, user_email, user_name, verification_token, base_url="http://localhost:5174"):
+        verification_url = f"{base_url}/verify-email?token={verification_token}"
+        return self.build_message(
+            'verification',
+            self.VERIFICATION_SUBJECT,
+            user_email,
+            user_name=user_name,
+            verification_url=verification_url
+        )
+
+    def build_premium_confirmation_message(self, user_email, user_name):
+        return self.build_message(
+            'premium_confirmation',
+            self.PREMIUM_CONFIRMATION_SUBJECT,
+            user_email,
+            user_name=user_name
+        )
+
     def send_verification_email(self, user_email, user_name, verification_token, base_url="http://localhost:5174"):
         """
-        Envía un email de verificación al usuario
+        Encola un email de verificación para el usuario. El mensaje se guarda
+        en la bandeja de salida con el próximo commit de la sesión.
         """
         try:
-            # Crear el mensaje
-            msg = MIMEMultipart('alternative')
-            msg['Subject'] = "Verifica tu cuenta en ASFORP"
-            msg['From'] = self.email
-            msg['To'] = user_email
-            
-            # URL de verificación
-            verification_url = f"{base_url}/verify-email?token={verification_token}"
-            
-            # Contenido HTML del email
-            html_content = f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <meta charset="UTF-8">
-                <style>
-                    body {{ font-family: Arial, sans-serif; background-color: #1a1a1a; color: #ffffff; }}
-                    .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                    .header {{ text-align: center; margin-bottom: 30px; }}
-                    .logo {{ color: #fbbf24; font-size: 32px; font-weight: bold; }}
-                    .content {{ background-color: #374151; padding: 30px; border-radius: 10px; }}
-                    .button {{ 
-                        display: inline-block; 
-                        background-color: #fbbf24; 
-                        color: #1a1a1a; 
-                        padding: 12px 30px; 
-                        text-decoration: none; 
-                        border-radius: 5px; 
-                        font-weight: bold; 
-                        margin: 20px 0;
-                    }}
-                    .footer {{ text-align: center; margin-top: 30px; color: #9ca3af; }}
-                </style>
-            </head>
-            <body>
-                <div class="container">
-                    <div class="header">
-                        <div class="logo">ASFORP</div>
-                        <p>Asesoría y Formación Profesional</p>
-                    </div>
-                    
-                    <div class="content">
-                        <h2>¡Bienvenido a ASFORP, {user_name}!</h2>
-                        
-                        <p>Gracias por registrarte en nuestra plataforma. Para completar tu registro y activar tu cuenta, necesitas verificar tu dirección de email.</p>
-                        
-                        <p>Haz clic en el siguiente botón para verificar tu cuenta:</p>
-                        
-                        <div style="text-align: center;">
-                            <a href="{verification_url}" class="button">Verificar mi cuenta</a>
-                        </div>
-                        
-                        <p>Si no puedes hacer clic en el botón, copia y pega el siguiente enlace en tu navegador:</p>
-                        <p style="word-break: break-all; color: #fbbf24;">{verification_url}</p>
-                        
-                        <p><strong>Este enlace expirará en 24 horas.</strong></p>
-                        
-                        <p>Si no has creado una cuenta en ASFORP, puedes ignorar este email.</p>
-                    </div>
-                    
-                    <div class="footer">
-                        <p>© 2024 ASFORP - Asesoría y Formación Profesional</p>
-                        <p>Este es un email automático, por favor no respondas a este mensaje.</p>
-                    </div>
-                </div>
-            </body>
-            </html>
-            """
-            
-            # Contenido de texto plano como alternativa
-            text_content = f"""
-            ¡Bienvenido a ASFORP, {user_name}!
-            
-            Gracias por registrarte en nuestra plataforma. Para completar tu registro y activar tu cuenta, necesitas verificar tu dirección de email.
-            
-            Visita el siguiente enlace para verificar tu cuenta:
-            {verification_url}
-            
-            Este enlace expirará en 24 horas.
-            
-            Si no has creado una cuenta en ASFORP, puedes ignorar este email.
-            
-            © 2024 ASFORP - Asesoría y Formación Profesional
-            """
-            
-            # Crear las partes del mensaje
-            part1 = MIMEText(text_content, 'plain')
-            part2 = MIMEText(html_content, 'html')
-            
-            # Adjuntar las partes al mensaje
-            msg.attach(part1)
-            msg.attach(part2)
-            
-            # En desarrollo, solo simular el envío
-            print(f"[EMAIL SIMULADO] Enviando email de verificación a: {user_email}")
-            print(f"[EMAIL SIMULADO] URL de verificación: {verification_url}")
-            print(f"[EMAIL SIMULADO] Token: {verification_token}")
-            
-            # TODO: En producción, descomentar el código siguiente para envío real
-            """
-            # Conectar al servidor SMTP y enviar
-            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-            server.starttls()
-            server.login(self.email, self.password)
-            server.send_message(msg)
-            server.quit()
-            """
-            
+            with timed('email'):
+                message = self.build_verification_message(user_email, user_name, verification_token, base_url)
+
+                # La entrega real la hacen los workers de la bandeja de salida
+                enqueue_email(self.email, user_email, self.VERIFICATION_SUBJECT, message)
+
+            if self.delivery != 'smtp':
+                # Solo visible con el logger en DEBUG (servidor de desarrollo): el token da acceso a la cuenta
+                current_app.logger.debug("[EMAIL SIMULADO] URL de verificación: %s/verify-email?token=%s",
+                                         base_url, verification_token)
+
             return True
-            
-        except Exception as e:
-            print(f"Error enviando email: {str(e)}")
+
+        except Exception:
+            current_app.logger.exception("Error encolando email de verificación")
             return False
-    
+
     def send_premium_confirmation_email(self, user_email, user_name):
         """
-        Envía un email de confirmación cuando el usuario se convierte en premium
+        Encola un email de confirmación cuando el usuario se convierte en premium
         """
         try:
-            msg = MIMEMultipart('alternative')
-            msg['Subject'] = "¡Bienvenido a ASFORP Premium!"
-            msg['From'] = self.email
-            msg['To'] = user_email
-            
-            html_content = f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <meta charset="UTF-8">
-                <style>
-                    body {{ font-family: Arial, sans-serif; background-color: #1a1a1a; color: #ffffff; }}
-                    .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                    .header {{ text-align: center; margin-bottom: 30px; }}
-                    .logo {{ color: #fbbf24; font-size: 32px; font-weight: bold; }}
-                    .content {{ background-color: #374151; padding: 30px; border-radius: 10px; }}
-                    .premium-badge {{ 
-                        background: linear-gradient(45deg, #fbbf24, #f59e0b);
-                        color: #1a1a1a;
-                        padding: 10px 20px;
-                        border-radius: 25px;
-                        font-weight: bold;
-                        display: inline-block;
-                        margin: 10px 0;
-                    }}
-                    .footer {{ text-align: center; margin-top: 30px; color: #9ca3af; }}
-                </style>
-            </head>
-            <body>
-                <div class="container">
-                    <div class="header">
-                        <div class="logo">ASFORP</div>
-                        <p>Asesoría y Formación Profesional</p>
-                    </div>
-                    
-                    <div class="content">
-                        <h2>¡Felicidades {user_name}!</h2>
-                        
-                        <div style="text-align: center;">
-                            <div class="premium-badge">✨ USUARIO PREMIUM ✨</div>
-                        </div>
-                        
-                        <p>Tu pago ha sido procesado exitosamente y ahora tienes acceso completo a todo nuestro contenido premium de formación.</p>
-                        
-                        <h3>¿Qué incluye tu membresía premium?</h3>
-                        <ul>
-                            <li>Acceso a todos los cursos de formación profesional</li>
-                            <li>Material exclusivo y recursos descargables</li>
-                            <li>Certificados de finalización</li>
-                            <li>Soporte prioritario</li>
-                            <li>Actualizaciones de contenido sin costo adicional</li>
-                        </ul>
-                        
-                        <p>Ya puedes acceder a la sección de formación en tu cuenta.</p>
-                        
-                        <p>¡Gracias por confiar en ASFORP para tu desarrollo profesional!</p>
-                    </div>
-                    
-                    <div class="footer">
-                        <p>© 2024 ASFORP - Asesoría y Formación Profesional</p>
-                    </div>
-                </div>
-            </body>
-            </html>
-            """
-            
-            text_content = f"""
-            ¡Felicidades {user_name}!
-            
-            Tu pago ha sido procesado exitosamente y ahora tienes acceso completo a todo nuestro contenido premium de formación.
-            
-            ¿Qué incluye tu membresía premium?
-            - Acceso a todos los cursos de formación profesional
-            - Material exclusivo y recursos descargables
-            - Certificados de finalización
-            - Soporte prioritario
-            - Actualizaciones de contenido sin costo adicional
-            
-            Ya puedes acceder a la sección de formación en tu cuenta.
-            
-            ¡Gracias por confiar en ASFORP para tu desarrollo profesional!
-            
-            © 2024 ASFORP - Asesoría y Formación Profesional
-            """
-            
-            part1 = MIMEText(text_content, 'plain')
-            part2 = MIMEText(html_content, 'html')
-            
-            msg.attach(part1)
-            msg.attach(part2)
-            
-            print(f"[EMAIL SIMULADO] Enviando email de confirmación premium a: {user_email}")
-            
+            with timed('email'):
+                message = self.build_premium_confirmation_message(user_email, user_name)
+                enqueue_email(self.email, user_email, self.PREMIUM_CONFIRMATION_SUBJECT, message)
+
             return True
-            
-        except Exception as e:
-            print(f"Error enviando email premium: {str(e)}")
-            return False
 
+        except Exception:
+            current_app.logger.exception("Error encolando email premium")
+            return False
@@ -0,0 +1,385 @@
+import os
+import queue
+import random
+import smtplib
+import threading
+import time
+import atexit
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import click
+from sqlalchemy import event, select, update, or_, and_
+from sqlalchemy.orm import Session
+
+from src.models.user import db
+from src.models.email_outbox import EmailOutbox
+
+
+class SMTPConnectionPool:
+    """
+    Pool pequeño de conexiones SMTP persistentes. Cada conexión se abre una
+    sola vez (connect + STARTTLS + login) y se reutiliza para muchos mensajes.
+    """
+
+    def __init__(self, host, port, username=None, password=None, starttls=True,
+                 size=2, timeout=30, max_idle=60):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.size = size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        conn = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            conn.starttls()
+        if self.password:
+            conn.login(self.username, self.password)
+        return conn
+
+    def _checkout(self):
+        while True:
+            try:
+                conn, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+
+            # Las conexiones que llevan tiempo paradas se comprueban con NOOP
+            if time.monotonic() - last_used < self.max_idle:
+                return conn
+            try:
+                if conn.noop()[0] == 250:
+                    return conn
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._discard(conn)
+
+    def _discard(self, conn):
+        try:
+            conn.quit()
+        except Exception:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    @contextmanager
+    def connection(self):
+        """
+        Presta una conexión del pool. Si falla a nivel de conexión se descarta;
+        si el servidor solo rechaza el mensaje, la conexión vuelve al pool.
+        """
+        self._slots.acquire()
+        conn = None
+        try:
+            conn = self._checkout()
+            yield conn
+        except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+            if conn is not None:
+                self._idle.put((conn, time.monotonic()))
+                conn = None
+            raise
+        except BaseException:
+            if conn is not None:
+                self._discard(conn)
+                conn = None
+            raise
+        else:
+            self._idle.put((conn, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(conn)
+
+
+def smtp_pool_from_env(size=None):
+    """
+    Crea un SMTPConnectionPool con la misma configuración que EmailService.
+    """
+    return SMTPConnectionPool(
+        host=os.getenv('EMAIL_SMTP_SERVER', 'smtp.gmail.com'),
+        port=int(os.getenv('EMAIL_SMTP_PORT', '587')),
+        username=os.getenv('EMAIL_USER', 'noreply@asforp.com'),
+        password=os.getenv('EMAIL_PASSWORD', ''),
+        starttls=os.getenv('EMAIL_SMTP_STARTTLS', '1') == '1',
+        size=size if size is not None else int(os.getenv('EMAIL_SMTP_POOL_SIZE', '2')),
+        timeout=float(os.getenv('EMAIL_SMTP_TIMEOUT', '30')),
+        max_idle=float(os.getenv('EMAIL_SMTP_MAX_IDLE', '60'))
+    )
+
+
+def is_permanent_failure(exc):
+    """
+    Los códigos 5xx (salvo errores de autenticación, que son de configuración)
+    no se reintentan: el mensaje pasa directamente a 'dead'.
+    """
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in exc.recipients.values())
+    if isinstance(exc, smtplib.SMTPAuthenticationError):
+        return False
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return exc.smtp_code >= 500
+    return False
+
+
+def enqueue_email(sender, recipient, subject, message):
+    """
+    Añade el mensaje MIME ya serializado a la bandeja de salida dentro de la
+    sesión actual. Se guarda con el commit del llamador, así que el email y el
+    cambio que lo provoca se confirman en la misma transacción.
+    """
+    row = EmailOutbox(
+        sender=sender,
+        recipient=recipient,
+        subject=subject,
+        message=message
+    )
+    db.session.add(row)
+    db.session.info['email_outbox_pending'] = True
+    return row
+
+
+class EmailOutboxWorker:
+    """
+    Pool de hilos que vacía la tabla email_outbox usando un SMTPConnectionPool.
+    Los hilos se arrancan de forma perezosa en la primera petición de cada
+    proceso, así que también funciona con servidores pre-fork.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.pool = None
+        self._threads = []
+        self._pid = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+
+    def init_app(self, app):
+        self.app = app
+        self.delivery = os.getenv('EMAIL_DELIVERY', 'simulado')
+        self.workers = int(os.getenv('EMAIL_WORKERS', '2'))
+        self.batch_size = int(os.getenv('EMAIL_BATCH_SIZE', '20'))
+        self.max_attempts = int(os.getenv('EMAIL_MAX_ATTEMPTS', '8'))
+        self.retry_base = float(os.getenv('EMAIL_RETRY_BASE_SECONDS', '30'))
+        self.retry_max = float(os.getenv('EMAIL_RETRY_MAX_SECONDS', '3600'))
+        self.poll_interval = float(os.getenv('EMAIL_POLL_INTERVAL', '5'))
+        self.lock_timeout = float(os.getenv('EMAIL_LOCK_TIMEOUT', '300'))
+
+        app.extensions['email_outbox_worker'] = self
+        app.cli.add_command(email_cli)
+        if self.workers > 0:
+            app.before_request(self._ensure_started)
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # Tras un fork los hilos del padre no existen en el hijo
+            self._threads = []
+            self._stop.clear()
+            self.pool = smtp_pool_from_env()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f'email-outbox-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            self._pid = os.getpid()
+            atexit.register(self.stop)
+
+    def wakeup(self):
+        self._wakeup.set()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        if self.pool is not None:
+            self.pool.close()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    processed = self.process_batch()
+            except Exception as e:
+                print(f"Error procesando la bandeja de salida: {str(e)}")
+                processed = 0
+
+            if not processed:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def claim(self, limit):
+        """
+        Reserva hasta `limit` mensajes pendientes con un único UPDATE ... RETURNING.
+        También recupera los que quedaron en 'sending' por un worker caído.
+        """
+        now = datetime.utcnow()
+        stale = now - timedelta(seconds=self.lock_timeout)
+        due = select(EmailOutbox.id).where(or_(
+            and_(EmailOutbox.status == EmailOutbox.STATUS_PENDING, EmailOutbox.next_attempt_at <= now),
+            and_(EmailOutbox.status == EmailOutbox.STATUS_SENDING, EmailOutbox.locked_at < stale)
+        )).order_by(EmailOutbox.next_attempt_at).limit(limit)
+
+        stmt = update(EmailOutbox).where(EmailOutbox.id.in_(due.scalar_subquery())).values(
+            status=EmailOutbox.STATUS_SENDING,
+            locked_at=now,
+            attempts=EmailOutbox.attempts + 1
+        ).returning(
+            EmailOutbox.id, EmailOutbox.sender, EmailOutbox.recipient,
+            EmailOutbox.subject, EmailOutbox.message, EmailOutbox.attempts, EmailOutbox.locked_at
+        )
+        rows = db.session.execute(stmt, execution_options={'synchronize_session': False}).all()
+        db.session.commit()
+        return rows
+
+    def renew_claim(self, ids, claimed_at):
+        """
+        Renueva locked_at de los mensajes de `ids` que siguen reservados con
+        `claimed_at`. Devuelve el nuevo instante de reserva y los ids que
+        siguen siendo de este worker.
+        """
+        now = datetime.utcnow()
+        owned = db.session.execute(
+            update(EmailOutbox)
+            .where(EmailOutbox.id.in_(ids), EmailOutbox.status == EmailOutbox.STATUS_SENDING,
+                   EmailOutbox.locked_at == claimed_at)
+            .values(locked_at=now)
+            .returning(EmailOutbox.id),
+            execution_options={'synchronize_session': False}
+        ).scalars().all()
+        db.session.commit()
+        return now, set(owned)
+
+    def deliver(self, row):
+        if self.delivery != 'smtp':
+            # En desarrollo, solo simular el envío
+            print(f"[EMAIL SIMULADO] Enviando '{row.subject}' a: {row.recipient}")
+            return
+
+        if self.pool is None:
+            self.pool = smtp_pool_from_env()
+        with self.pool.connection() as conn:
+            conn.sendmail(row.sender, [row.recipient], row.message)
+
+    def retry_delay(self, attempts):
+        delay = min(self.retry_base * (2 ** (attempts - 1)), self.retry_max)
+        return delay * random.uniform(0.9, 1.1)
+
+    def process_batch(self, limit=None):
+        rows = self.claim(limit or self.batch_size)
+        if not rows:
+            return 0
+
+        # La reserva se renueva cada tercio de EMAIL_LOCK_TIMEOUT: un lote lento
+        # no debe parecer abandonado y que otro worker lo reenvíe
+        claimed_at = rows[0].locked_at
+        renewed = time.monotonic()
+        owned = {row.id for row in rows}
+        results = []
+        for row in rows:
+            if time.monotonic() - renewed > self.lock_timeout / 3:
+                claimed_at, owned = self.renew_claim([claimed.id for claimed in rows], claimed_at)
+                renewed = time.monotonic()
+            if row.id not in owned:
+                continue
+            now = datetime.utcnow()
+            result = {
+                'id': row.id,
+                'status': EmailOutbox.STATUS_SENT,
+                'locked_at': None,
+                'sent_at': now,
+                'last_error': None,
+                'next_attempt_at': now
+            }
+            try:
+                self.deliver(row)
+            except Exception as e:
+                result['sent_at'] = None
+                result['last_error'] = f"{type(e).__name__}: {str(e)}"[:1000]
+                if is_permanent_failure(e) or row.attempts >= self.max_attempts:
+                    result['status'] = EmailOutbox.STATUS_DEAD
+                else:
+                    result['status'] = EmailOutbox.STATUS_PENDING
+                    result['next_attempt_at'] = now + timedelta(seconds=self.retry_delay(row.attempts))
+            results.append(result)
+
+        # Un solo UPDATE por lote (bulk update por clave primaria), solo de las
+        # filas que siguen reservadas por este worker
+        if results:
+            db.session.execute(update(EmailOutbox).where(EmailOutbox.locked_at == claimed_at), results,
+                               execution_options={'synchronize_session': None})
+            db.session.commit()
+        return len(rows)
+
+    def drain(self):
+        """
+        Procesa la bandeja hasta que no quedan mensajes listos para enviar.
+        """
+        total = 0
+        while True:
+            processed = self.process_batch()
+            if not processed:
+                return total
+            total += processed
+
+
+email_worker = EmailOutboxWorker()
+
+
+@event.listens_for(Session, 'after_commit')
+def _wake_email_worker(session):
+    if session.info.pop('email_outbox_pending', False):
+        email_worker.wakeup()
+
+
+@click.group('email')
+def email_cli():
+    """Gestión de la bandeja de salida de emails."""
+
+
+@email_cli.command('worker')
+@click.option('--once', is_flag=True, help='Vacía la bandeja una vez y termina.')
+def email_worker_command(once):
+    """Entrega los emails pendientes en primer plano."""
+    if once:
+        sent = email_worker.drain()
+        click.echo(f'{sent} mensajes procesados')
+        return
+
+    try:
+        while True:
+            if not email_worker.drain():
+                time.sleep(email_worker.poll_interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if email_worker.pool is not None:
+            email_worker.pool.close()
+
+
+@email_cli.command('requeue-dead')
+def requeue_dead_command():
+    """Vuelve a poner en cola los mensajes en estado 'dead'."""
+    result = db.session.execute(
+        update(EmailOutbox)
+        .where(EmailOutbox.status == EmailOutbox.STATUS_DEAD)
+        .values(status=EmailOutbox.STATUS_PENDING, attempts=0, next_attempt_at=datetime.utcnow())
+    )
+    db.session.commit()
+    click.echo(f'{result.rowcount} mensajes reencolados')
@@ -0,0 +1,83 @@
+import os
+import base64
+import secrets
+from functools import lru_cache
+from email.header import Header
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+TEMPLATE_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'templates', 'email')
+
+
+class EmailTemplates:
+    """
+    Plantillas de email compiladas una sola vez. Todas comparten layout.html /
+    layout.txt y en cada envío solo se rellenan los campos del usuario.
+    """
+
+    def __init__(self, template_folder=TEMPLATE_FOLDER):
+        self.env = Environment(
+            loader=FileSystemLoader(template_folder),
+            autoescape=select_autoescape(['html']),
+            auto_reload=False
+        )
+        # Compilar todas las plantillas al arrancar en vez de en el primer envío
+        self._templates = {
+            name: self.env.get_template(name)
+            for name in self.env.list_templates(extensions=['html', 'txt'])
+        }
+
+    def render(self, name, **context):
+        return self._templates[name].render(context)
+
+    def render_pair(self, name, **context):
+        """
+        Devuelve (texto, html) para la plantilla `name`.
+        """
+        return (
+            self._templates[f'{name}.txt'].render(context),
+            self._templates[f'{name}.html'].render(context)
+        )
+
+
+@lru_cache(maxsize=64)
+def encode_subject(subject):
+    """
+    Codifica el asunto (RFC 2047) una vez por texto distinto.
+    """
+    if subject.isascii():
+        return subject
+    return Header(subject, 'utf-8').encode()
+
+
+def _base64_body(content):
+    return base64.encodebytes(content.encode('utf-8')).decode('ascii')
+
+
+def compose_message(sender, recipient, subject, text_content, html_content):
+    """
+    Construye directamente el texto MIME multipart/alternative (texto + HTML)
+    que producía MIMEMultipart.as_string(), sin crear el árbol de objetos.
+    """
+    recipient = recipient.replace('\r', '').replace('\n', '')
+    boundary = f'==============={secrets.token_hex(16)}=='
+    return (
+        f'Content-Type: multipart/alternative; boundary="{boundary}"\n'
+        'MIME-Version: 1.0\n'
+        f'Subject: {encode_subject(subject)}\n'
+        f'From: {sender}\n'
+        f'To: {recipient}\n'
+        '\n'
+        f'--{boundary}\n'
+        'Content-Type: text/plain; charset="utf-8"\n'
+        'MIME-Version: 1.0\n'
+        'Content-Transfer-Encoding: base64\n'
+        '\n'
+        f'{_base64_body(text_content)}\n'
+        f'--{boundary}\n'
+        'Content-Type: text/html; charset="utf-8"\n'
+        'MIME-Version: 1.0\n'
+        'Content-Transfer-Encoding: base64\n'
+        '\n'
+        f'{_base64_body(html_content)}\n'
+        f'--{boundary}--\n'
+    )
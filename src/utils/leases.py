@@ -0,0 +1,51 @@
+import os
+import socket
+import time
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.sqlite import insert
+
+from src.models.lease import Lease
+from src.models.user import db
+
+
+def lease_owner():
+    """
+    Identificador de este proceso. Tras un fork cambia el pid, así que cada
+    worker es un dueño distinto.
+    """
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def acquire_lease(name, owner, seconds, force=False, conn=None):
+    """
+    Toma la concesión `name` durante `seconds` segundos si está libre, caducada
+    o ya es de `owner` (en ese caso la renueva). Es un único UPSERT atómico:
+    dos procesos no pueden tomarla a la vez. Devuelve True si `owner` la tiene.
+
+    `force` la quita a quien la tenga. Con `conn` se ejecuta en esa
+    transacción, para renovarla en el mismo commit que el trabajo que protege.
+    """
+    now = time.time()
+    table = Lease.__table__
+    stmt = insert(table).values(name=name, owner=owner, expires_at=now + seconds)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.name],
+        set_={'owner': owner, 'expires_at': now + seconds},
+        where=None if force else (table.c.owner == owner) | (table.c.expires_at < now)
+    ).returning(table.c.owner)
+
+    if conn is not None:
+        return conn.execute(stmt).first() is not None
+    with db.engine.begin() as conn:
+        return conn.execute(stmt).first() is not None
+
+
+def release_lease(name, owner):
+    """
+    Suelta la concesión si sigue siendo de `owner`, para que otro proceso no
+    tenga que esperar a que caduque.
+    """
+    table = Lease.__table__
+    with db.engine.begin() as conn:
+        conn.execute(delete(table).where(table.c.name == name, table.c.owner == owner))
@@ -0,0 +1,317 @@
+import atexit
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from sqlalchemy import delete, select, update
+
+from src.models.user import User, db
+from src.models.auth_event import AuthEvent
+from src.models.email_outbox import EmailOutbox
+from src.models.rate_limit import RateLimitBucket
+from src.models.session import UserSession
+from src.utils.cache import user_cache
+from src.utils.leases import acquire_lease, lease_owner, release_lease
+
+MAINTENANCE_LEASE = 'maintenance'
+
+
+def _run_in_chunks(select_ids, apply, batch_size, pause, after_commit=None, heartbeat=None):
+    """
+    Selecciona hasta `batch_size` ids, aplica el cambio y hace commit; repite
+    hasta que no queden filas. Cada lote es una transacción corta, con una
+    pausa entre lotes para que las peticiones puedan coger el bloqueo de escritura.
+    `after_commit(ids)` se llama tras confirmar cada lote. `heartbeat()` también
+    (renueva la concesión): si devuelve False la tarea se detiene con
+    'stopped': True, porque otro proceso puede estar ejecutándola ya.
+    """
+    start = time.perf_counter()
+    rows = 0
+    batches = 0
+    stopped = False
+    while True:
+        ids = db.session.execute(select_ids.limit(batch_size)).scalars().all()
+        if not ids:
+            db.session.rollback()
+            break
+        rows += apply(ids)
+        db.session.commit()
+        if after_commit is not None:
+            after_commit(ids)
+        batches += 1
+        if len(ids) < batch_size:
+            break
+        if heartbeat is not None and not heartbeat():
+            stopped = True
+            break
+        if pause:
+            time.sleep(pause)
+    return {'rows': rows, 'batches': batches, 'seconds': round(time.perf_counter() - start, 3), 'stopped': stopped}
+
+
+def _invalidate_users(ids):
+    # Tras el commit: si se invalidara antes, una lectura concurrente podría
+    # volver a guardar en caché la fila antigua. La caché es de este proceso;
+    # en los demás, `version` (incrementada aquí) delata la copia antigua.
+    for user_id in ids:
+        user_cache.invalidate(user_id)
+
+
+def expire_premium(now=None, batch_size=500, pause=0.05, heartbeat=None):
+    """
+    Quita is_premium a los usuarios cuyo premium_expires_at ya pasó.
+    """
+    now = now or datetime.utcnow()
+    select_ids = (
+        select(User.id)
+        .where(User.premium_expires_at < now, User.is_premium.is_(True))
+        .order_by(User.premium_expires_at)
+    )
+
+    def apply(ids):
+        return db.session.execute(
+            update(User)
+            .where(User.id.in_(ids), User.is_premium.is_(True))
+            .values(is_premium=False, version=User.version + 1),
+            execution_options={'synchronize_session': False}
+        ).rowcount
+
+    return _run_in_chunks(select_ids, apply, batch_size, pause, after_commit=_invalidate_users, heartbeat=heartbeat)
+
+
+def purge_unverified(max_age_days=7, now=None, batch_size=500, pause=0.05, heartbeat=None):
+    """
+    Borra las cuentas que siguen sin verificar `max_age_days` días después del registro.
+    """
+    cutoff = (now or datetime.utcnow()) - timedelta(days=max_age_days)
+    select_ids = (
+        select(User.id)
+        .where(User.is_verified.is_(False), User.created_at < cutoff)
+        .order_by(User.created_at)
+    )
+
+    def apply(ids):
+        # Se repite la condición por si alguien verificó la cuenta entre medias
+        return db.session.execute(
+            delete(User).where(User.id.in_(ids), User.is_verified.is_(False)),
+            execution_options={'synchronize_session': False}
+        ).rowcount
+
+    return _run_in_chunks(select_ids, apply, batch_size, pause, after_commit=_invalidate_users, heartbeat=heartbeat)
+
+
+def purge_expired_sessions(now=None, batch_size=1000, pause=0.05, heartbeat=None):
+    now = now or datetime.utcnow()
+    select_ids = select(UserSession.id).where(UserSession.expires_at < now)
+
+    def apply(ids):
+        return db.session.execute(
+            delete(UserSession).where(UserSession.id.in_(ids)),
+            execution_options={'synchronize_session': False}
+        ).rowcount
+
+    return _run_in_chunks(select_ids, apply, batch_size, pause, heartbeat=heartbeat)
+
+
+def purge_sent_emails(max_age_days=30, now=None, batch_size=1000, pause=0.05, heartbeat=None):
+    cutoff = (now or datetime.utcnow()) - timedelta(days=max_age_days)
+    select_ids = select(EmailOutbox.id).where(
+        EmailOutbox.status == EmailOutbox.STATUS_SENT,
+        EmailOutbox.sent_at < cutoff
+    )
+
+    def apply(ids):
+        return db.session.execute(
+            delete(EmailOutbox).where(EmailOutbox.id.in_(ids)),
+            execution_options={'synchronize_session': False}
+        ).rowcount
+
+    return _run_in_chunks(select_ids, apply, batch_size, pause, heartbeat=heartbeat)
+
+
+def purge_rate_limit_buckets(max_idle_seconds=86400, now=None, batch_size=1000, pause=0.05, heartbeat=None):
+    """
+    Borra los buckets del limitador que llevan tiempo sin usarse (a estas
+    alturas estarían llenos, igual que uno inexistente).
+    """
+    cutoff = (now or time.time()) - max_idle_seconds
+    select_ids = select(RateLimitBucket.key).where(RateLimitBucket.updated_at < cutoff)
+
+    def apply(keys):
+        return db.session.execute(
+            delete(RateLimitBucket).where(RateLimitBucket.key.in_(keys)),
+            execution_options={'synchronize_session': False}
+        ).rowcount
+
+    return _run_in_chunks(select_ids, apply, batch_size, pause, heartbeat=heartbeat)
+
+
+def purge_auth_events(max_age_days=365, now=None, batch_size=1000, pause=0.05, heartbeat=None):
+    cutoff = (now or datetime.utcnow()) - timedelta(days=max_age_days)
+    select_ids = select(AuthEvent.id).where(AuthEvent.created_at < cutoff).order_by(AuthEvent.created_at)
+
+    def apply(ids):
+        return db.session.execute(
+            delete(AuthEvent).where(AuthEvent.id.in_(ids)),
+            execution_options={'synchronize_session': False}
+        ).rowcount
+
+    return _run_in_chunks(select_ids, apply, batch_size, pause, heartbeat=heartbeat)
+
+
+def run_maintenance(config, heartbeat=None):
+    """
+    Ejecuta todas las tareas y devuelve {tarea: {'rows', 'batches', 'seconds', 'stopped'}}.
+    Si se pasa `heartbeat`, se llama entre tareas y tras cada lote de cada
+    tarea; si devuelve False (se perdió la concesión) la tarea en curso se
+    detiene y no se ejecutan las que faltan.
+    """
+    batch_size = config.get('MAINTENANCE_BATCH_SIZE', 500)
+    pause = config.get('MAINTENANCE_BATCH_PAUSE', 0.05)
+    tasks = [
+        ('expire_premium', lambda: expire_premium(batch_size=batch_size, pause=pause, heartbeat=heartbeat)),
+        ('purge_unverified', lambda: purge_unverified(
+            max_age_days=config.get('MAINTENANCE_UNVERIFIED_MAX_AGE_DAYS', 7),
+            batch_size=batch_size, pause=pause, heartbeat=heartbeat
+        )),
+        ('purge_expired_sessions', lambda: purge_expired_sessions(batch_size=batch_size, pause=pause, heartbeat=heartbeat)),
+        ('purge_sent_emails', lambda: purge_sent_emails(
+            max_age_days=config.get('MAINTENANCE_SENT_EMAIL_MAX_AGE_DAYS', 30),
+            batch_size=batch_size, pause=pause, heartbeat=heartbeat
+        )),
+        ('purge_rate_limit_buckets', lambda: purge_rate_limit_buckets(batch_size=batch_size, pause=pause, heartbeat=heartbeat)),
+        ('purge_auth_events', lambda: purge_auth_events(
+            max_age_days=config.get('MAINTENANCE_AUTH_EVENT_MAX_AGE_DAYS', 365),
+            batch_size=batch_size, pause=pause, heartbeat=heartbeat
+        )),
+    ]
+    report = {}
+    for task, run in tasks:
+        if heartbeat is not None and not heartbeat():
+            break
+        report[task] = run()
+        if report[task]['stopped']:
+            break
+    return report
+
+
+def format_report(report):
+    return ', '.join(
+        f"{task}: {result['rows']} filas en {result['batches']} lotes ({result['seconds']}s)"
+        + (" detenida: se perdió la concesión" if result['stopped'] else "")
+        for task, result in report.items()
+    )
+
+
+class MaintenanceScheduler:
+    """
+    Ejecuta run_maintenance cada MAINTENANCE_INTERVAL segundos en un hilo del
+    proceso (0 = desactivado; en ese caso usar `flask maintenance run` desde cron).
+
+    Con varios workers (src/serve.py) cada uno arranca su hilo, pero solo
+    ejecuta las tareas el que tiene la concesión 'maintenance' de la tabla
+    lease. La renueva en cada vuelta y entre tareas; si el proceso muere, otro
+    la toma cuando caduca (MAINTENANCE_LEASE_SECONDS, por defecto el doble del
+    intervalo y como mínimo 5 minutos).
+    """
+
+    def __init__(self):
+        self.app = None
+        self.interval = 0
+        self.lease_seconds = 300
+        self.last_report = None
+        self._owner = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def init_app(self, app):
+        app.config.setdefault('MAINTENANCE_INTERVAL', 0)
+        app.config.setdefault('MAINTENANCE_LEASE_SECONDS', max(app.config['MAINTENANCE_INTERVAL'] * 2, 300))
+        app.config.setdefault('MAINTENANCE_BATCH_SIZE', 500)
+        app.config.setdefault('MAINTENANCE_BATCH_PAUSE', 0.05)
+        app.config.setdefault('MAINTENANCE_UNVERIFIED_MAX_AGE_DAYS', 7)
+        app.config.setdefault('MAINTENANCE_SENT_EMAIL_MAX_AGE_DAYS', 30)
+        app.config.setdefault('MAINTENANCE_AUTH_EVENT_MAX_AGE_DAYS', 365)
+        self.app = app
+        self.interval = app.config['MAINTENANCE_INTERVAL']
+        self.lease_seconds = app.config['MAINTENANCE_LEASE_SECONDS']
+        app.extensions['maintenance_scheduler'] = self
+        app.cli.add_command(maintenance_cli)
+        if self.interval > 0:
+            app.before_request(self._ensure_started)
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._stop.clear()
+            self._owner = lease_owner()
+            threading.Thread(target=self._run, name='maintenance', daemon=True).start()
+            self._pid = os.getpid()
+            atexit.register(self.stop)
+
+    def _renew(self):
+        return not self._stop.is_set() and acquire_lease(MAINTENANCE_LEASE, self._owner, self.lease_seconds)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                with self.app.app_context():
+                    if not self._renew():
+                        continue
+                    self.last_report = run_maintenance(self.app.config, heartbeat=self._renew)
+                print(f"[MANTENIMIENTO] {format_report(self.last_report)}")
+            except Exception as e:
+                print(f"Error en el mantenimiento: {str(e)}")
+
+    def stop(self):
+        """
+        Para el hilo y suelta la concesión para que otro worker la tome sin
+        esperar a que caduque. Los workers de src/serve.py salen con os._exit
+        y la llaman explícitamente.
+        """
+        if self._pid != os.getpid():
+            return
+        self._stop.set()
+        try:
+            with self.app.app_context():
+                release_lease(MAINTENANCE_LEASE, self._owner)
+        except Exception as e:
+            print(f"Error soltando la concesión de mantenimiento: {str(e)}")
+
+
+maintenance_scheduler = MaintenanceScheduler()
+
+
+@click.group('maintenance')
+def maintenance_cli():
+    """Tareas de mantenimiento de la base de datos."""
+
+
+@maintenance_cli.command('run')
+@click.option('--batch-size', type=int, help='Filas por transacción.')
+@click.option('--force', is_flag=True, help='Ejecuta aunque otro proceso tenga la concesión.')
+def maintenance_run_command(batch_size, force):
+    """Caduca premium vencidos y borra cuentas sin verificar, sesiones, emails y buckets del limitador antiguos."""
+    config = dict(current_app.config)
+    if batch_size:
+        config['MAINTENANCE_BATCH_SIZE'] = batch_size
+    owner = lease_owner()
+    lease_seconds = config['MAINTENANCE_LEASE_SECONDS']
+    if not acquire_lease(MAINTENANCE_LEASE, owner, lease_seconds) and not force:
+        click.echo('Otro proceso está ejecutando el mantenimiento (usa --force para ejecutarlo igualmente)')
+        return
+    try:
+        report = run_maintenance(config, heartbeat=lambda: acquire_lease(MAINTENANCE_LEASE, owner, lease_seconds) or force)
+    finally:
+        release_lease(MAINTENANCE_LEASE, owner)
+    for task, result in report.items():
+        click.echo(f"{task:<24} {result['rows']:>8} filas  {result['batches']:>5} lotes  {result['seconds']:>8}s")
+        if result['stopped']:
+            click.echo('Otro proceso ha tomado la concesión: el mantenimiento se detiene')
@@ -0,0 +1,304 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from flask import Response, request
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+
+from src.utils.admin import admin_required
+
+# Límites superiores (segundos) de los buckets de los histogramas
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Límites superiores (bytes) del histograma de tamaño de las respuestas
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Fases medidas dentro de cada petición; 'other' es el resto del tiempo
+PHASES = ('db', 'password_hash', 'email', 'json', 'compress')
+
+_current = threading.local()
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class RequestTimer:
+    """
+    Medidas de la petición en curso en este hilo. En las respuestas en
+    streaming sigue activo mientras se genera el cuerpo.
+    """
+    __slots__ = ('start', 'timings', 'queries', 'streaming')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.timings = {}
+        self.queries = 0
+        self.streaming = False
+
+
+def record_phase(phase, seconds):
+    """
+    Suma `seconds` a la fase `phase` de la petición que se está atendiendo en
+    este hilo. Fuera de una petición medida no hace nada.
+    """
+    timer = getattr(_current, 'timer', None)
+    if timer is not None:
+        timer.timings[phase] = timer.timings.get(phase, 0.0) + seconds
+
+
+@contextmanager
+def timed(phase):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(phase, time.perf_counter() - start)
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """
+    Proveedor JSON de Flask que cuenta el tiempo de serialización en la fase 'json'.
+    """
+
+    def dumps(self, obj, **kwargs):
+        with timed('json'):
+            return super().dumps(obj, **kwargs)
+
+
+class CountingBody:
+    """
+    Envuelve el cuerpo de una respuesta en streaming para contar los bytes
+    enviados. close() se propaga al iterable original.
+    """
+
+    def __init__(self, body):
+        self.body = body
+        self.size = 0
+
+    def __iter__(self):
+        for chunk in self.body:
+            self.size += len(chunk.encode() if isinstance(chunk, str) else chunk)
+            yield chunk
+
+    def close(self):
+        close = getattr(self.body, 'close', None)
+        if close is not None:
+            close()
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return ','.join(f'{name}="{_escape_label(value)}"' for name, value in labels.items())
+
+
+class Metrics:
+    """
+    Instrumentación por petición: duración total, tiempo en base de datos
+    (eventos del engine de SQLAlchemy), hashing de contraseñas, email, JSON y
+    compresión, número de consultas y tamaño de la respuesta. Se exporta en
+    formato Prometheus en /metrics.
+
+    En las respuestas en streaming la medida se cierra cuando el servidor
+    termina de enviar el cuerpo (response.call_on_close), así que incluye las
+    consultas y la compresión que se hacen mientras se genera.
+
+    Las métricas son por proceso: con varios workers cada uno expone las suyas.
+
+    Configuración (app.config):
+        METRICS_ENABLED   False desactiva toda la instrumentación
+        METRICS_PATH      ruta del endpoint (por defecto /metrics)
+        METRICS_PUBLIC    False (por defecto): /metrics pide el token de
+                          administración, como la consola (ver src/utils/admin.py)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}
+        self.durations = {}
+        self.phases = {}
+        self.sizes = {}
+        self.queries = {}
+        self.collectors = []
+
+    def init_app(self, app, engine):
+        app.config.setdefault('METRICS_ENABLED', True)
+        app.config.setdefault('METRICS_PATH', '/metrics')
+        app.config.setdefault('METRICS_PUBLIC', False)
+        if not app.config['METRICS_ENABLED']:
+            return
+
+        app.extensions['metrics'] = self
+        app.json = TimedJSONProvider(app)
+        # Primero de la lista para que la medida incluya el resto de hooks
+        app.before_request_funcs.setdefault(None, []).insert(0, self._start_request)
+        app.after_request(self._finish_request)
+        app.teardown_request(self._clear_request)
+        export = self.export if app.config['METRICS_PUBLIC'] else admin_required(self.export)
+        app.add_url_rule(app.config['METRICS_PATH'], 'metrics', export)
+
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def add_collector(self, collector):
+        """
+        Registra una función que devuelve líneas extra en formato Prometheus.
+        """
+        self.collectors.append(collector)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if getattr(_current, 'timer', None) is not None:
+            conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        timer = getattr(_current, 'timer', None)
+        starts = conn.info.get('query_start')
+        if timer is None or not starts:
+            return
+        timer.timings['db'] = timer.timings.get('db', 0.0) + time.perf_counter() - starts.pop()
+        timer.queries += 1
+
+    def _start_request(self):
+        _current.timer = RequestTimer()
+
+    def _finish_request(self, response):
+        timer = getattr(_current, 'timer', None)
+        if timer is None:
+            return response
+        labels = (request.endpoint or 'unmatched', request.method, response.status_code)
+
+        if not response.is_streamed:
+            _current.timer = None
+            self.observe(*labels, time.perf_counter() - timer.start, timer.timings, timer.queries,
+                         response.content_length or 0)
+            return response
+
+        # El cuerpo se genera después: la medida sigue abierta hasta que se envía entero
+        timer.streaming = True
+        size = response.content_length
+        body = None
+        if size is None:
+            body = response.response = CountingBody(response.response)
+
+        def finish():
+            if getattr(_current, 'timer', None) is timer:
+                _current.timer = None
+            self.observe(*labels, time.perf_counter() - timer.start, timer.timings, timer.queries,
+                         body.size if body is not None else size)
+
+        response.call_on_close(finish)
+        return response
+
+    def _clear_request(self, exc):
+        timer = getattr(_current, 'timer', None)
+        if timer is not None and not timer.streaming:
+            _current.timer = None
+
+    def observe(self, endpoint, method, status, elapsed, timings, queries, size=0):
+        other = max(elapsed - sum(timings.values()), 0.0)
+        with self._lock:
+            key = (endpoint, method)
+            status_key = (endpoint, method, status)
+            self.requests[status_key] = self.requests.get(status_key, 0) + 1
+            histogram = self.durations.get(key)
+            if histogram is None:
+                histogram = self.durations[key] = Histogram()
+            histogram.observe(elapsed)
+
+            histogram = self.sizes.get(key)
+            if histogram is None:
+                histogram = self.sizes[key] = Histogram(SIZE_BUCKETS)
+            histogram.observe(size)
+
+            for phase, seconds in list(timings.items()) + [('other', other)]:
+                phase_key = (endpoint, phase)
+                histogram = self.phases.get(phase_key)
+                if histogram is None:
+                    histogram = self.phases[phase_key] = Histogram()
+                histogram.observe(seconds)
+
+            self.queries[endpoint] = self.queries.get(endpoint, 0) + queries
+
+    def _histogram_lines(self, name, histogram, **labels):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{_labels(**labels, le=bound)}}} {cumulative}')
+        lines.append(f'{name}_bucket{{{_labels(**labels, le="+Inf")}}} {histogram.count}')
+        lines.append(f'{name}_sum{{{_labels(**labels)}}} {histogram.sum}')
+        lines.append(f'{name}_count{{{_labels(**labels)}}} {histogram.count}')
+        return lines
+
+    def render(self):
+        lines = []
+        with self._lock:
+            lines.append('# HELP asforp_requests_total Peticiones atendidas.')
+            lines.append('# TYPE asforp_requests_total counter')
+            for (endpoint, method, status), count in sorted(self.requests.items()):
+                lines.append(f'asforp_requests_total{{{_labels(endpoint=endpoint, method=method, status=status)}}} {count}')
+
+            lines.append('# HELP asforp_request_duration_seconds Duración de las peticiones.')
+            lines.append('# TYPE asforp_request_duration_seconds histogram')
+            for (endpoint, method), histogram in sorted(self.durations.items()):
+                lines.extend(self._histogram_lines('asforp_request_duration_seconds', histogram, endpoint=endpoint, method=method))
+
+            lines.append(f"# HELP asforp_request_phase_seconds Tiempo por fase ({', '.join(PHASES + ('other',))}) dentro de cada petición.")
+            lines.append('# TYPE asforp_request_phase_seconds histogram')
+            for (endpoint, phase), histogram in sorted(self.phases.items()):
+                lines.extend(self._histogram_lines('asforp_request_phase_seconds', histogram, endpoint=endpoint, phase=phase))
+
+            lines.append('# HELP asforp_response_size_bytes Tamaño del cuerpo enviado (comprimido si se comprimió).')
+            lines.append('# TYPE asforp_response_size_bytes histogram')
+            for (endpoint, method), histogram in sorted(self.sizes.items()):
+                lines.extend(self._histogram_lines('asforp_response_size_bytes', histogram, endpoint=endpoint, method=method))
+
+            lines.append('# HELP asforp_db_queries_total Consultas SQL ejecutadas durante peticiones.')
+            lines.append('# TYPE asforp_db_queries_total counter')
+            for endpoint, count in sorted(self.queries.items()):
+                lines.append(f'asforp_db_queries_total{{{_labels(endpoint=endpoint)}}} {count}')
+
+        for collector in self.collectors:
+            lines.extend(collector())
+        return '\n'.join(lines) + '\n'
+
+    def export(self):
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+
+def cache_stats_collector(name, cache):
+    """
+    Exporta los contadores de un LRUCache (src/utils/cache.py) como métricas.
+    """
+    def collect():
+        stats = cache.stats()
+        return [
+            f'# TYPE asforp_{name}_cache_hits_total counter',
+            f'asforp_{name}_cache_hits_total {stats["hits"]}',
+            f'# TYPE asforp_{name}_cache_misses_total counter',
+            f'asforp_{name}_cache_misses_total {stats["misses"]}',
+            f'# TYPE asforp_{name}_cache_evictions_total counter',
+            f'asforp_{name}_cache_evictions_total {stats["evictions"]}',
+            f'# TYPE asforp_{name}_cache_size gauge',
+            f'asforp_{name}_cache_size {stats["size"]}',
+        ]
+    return collect
+
+
+metrics = Metrics()
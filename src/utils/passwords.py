@@ -0,0 +1,134 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+from src.utils.metrics import timed
+
+
+class PasswordHashingOverloaded(Exception):
+    """
+    No hay hueco en el pool de hashing dentro del tiempo de espera configurado.
+    Las rutas lo traducen a un 503.
+    """
+
+
+class PasswordHasher:
+    """
+    Ejecuta el hashing de contraseñas en un pool dedicado y acotado, para que
+    una ráfaga de logins no ocupe todos los workers del servidor.
+
+    Configuración (app.config):
+        PASSWORD_HASH_METHOD         método y coste de werkzeug, p. ej. 'scrypt:32768:8:1'
+                                     o 'pbkdf2:sha256:600000'
+        PASSWORD_HASH_EXECUTOR       'thread' (por defecto) o 'process'
+        PASSWORD_HASH_WORKERS        tamaño del pool
+        PASSWORD_HASH_MAX_QUEUE      peticiones que pueden esperar además de las que se ejecutan
+        PASSWORD_HASH_QUEUE_TIMEOUT  segundos de espera por un hueco antes de dar 503
+    """
+
+    def __init__(self):
+        self.method = 'scrypt'
+        self.executor_type = 'thread'
+        self.workers = os.cpu_count() or 1
+        self.max_queue = self.workers * 4
+        self.queue_timeout = 2.0
+        self._executor = None
+        self._slots = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._method_prefix = None
+
+    def init_app(self, app):
+        app.config.setdefault('PASSWORD_HASH_METHOD', self.method)
+        app.config.setdefault('PASSWORD_HASH_EXECUTOR', self.executor_type)
+        app.config.setdefault('PASSWORD_HASH_WORKERS', self.workers)
+        app.config.setdefault('PASSWORD_HASH_MAX_QUEUE', app.config['PASSWORD_HASH_WORKERS'] * 4)
+        app.config.setdefault('PASSWORD_HASH_QUEUE_TIMEOUT', self.queue_timeout)
+
+        self.configure(
+            method=app.config['PASSWORD_HASH_METHOD'],
+            executor_type=app.config['PASSWORD_HASH_EXECUTOR'],
+            workers=app.config['PASSWORD_HASH_WORKERS'],
+            max_queue=app.config['PASSWORD_HASH_MAX_QUEUE'],
+            queue_timeout=app.config['PASSWORD_HASH_QUEUE_TIMEOUT']
+        )
+        app.extensions['password_hasher'] = self
+
+    def configure(self, method=None, executor_type=None, workers=None, max_queue=None, queue_timeout=None):
+        with self._lock:
+            if method is not None and method != self.method:
+                self.method = method
+                self._method_prefix = None
+            if executor_type is not None:
+                self.executor_type = executor_type
+            if workers is not None:
+                self.workers = int(workers)
+            if max_queue is not None:
+                self.max_queue = int(max_queue)
+            if queue_timeout is not None:
+                self.queue_timeout = float(queue_timeout)
+            self._shutdown()
+
+    def _shutdown(self):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=False)
+        self._executor = None
+        self._pid = None
+
+    def _get_executor(self):
+        # El pool se crea por proceso: tras un fork el del padre no sirve
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    executor_class = ProcessPoolExecutor if self.executor_type == 'process' else ThreadPoolExecutor
+                    self._executor = executor_class(max_workers=self.workers)
+                    self._slots = threading.BoundedSemaphore(self.workers + self.max_queue)
+                    self._pid = os.getpid()
+        return self._executor
+
+    def _run(self, fn, *args):
+        with timed('password_hash'):
+            executor = self._get_executor()
+            slots = self._slots
+            if not slots.acquire(timeout=self.queue_timeout):
+                raise PasswordHashingOverloaded()
+            try:
+                future = executor.submit(fn, *args)
+            except BaseException:
+                slots.release()
+                raise
+            future.add_done_callback(lambda _: slots.release())
+            return future.result()
+
+    @property
+    def method_prefix(self):
+        """
+        Prefijo que werkzeug guarda en el hash para el método configurado
+        (p. ej. 'scrypt' -> 'scrypt:32768:8:1'). Se calcula una vez.
+        """
+        if self._method_prefix is None:
+            self._method_prefix = generate_password_hash('', self.method, salt_length=1).split('$', 1)[0]
+        return self._method_prefix
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        return pwhash.split('$', 1)[0] != self.method_prefix
+
+    def verify_and_update(self, pwhash, password):
+        """
+        Devuelve (válida, nuevo_hash). `nuevo_hash` solo se calcula cuando la
+        contraseña es correcta y el hash guardado usa otro método o coste.
+        """
+        if not self.verify(pwhash, password):
+            return False, None
+        if self.needs_rehash(pwhash):
+            return True, self.hash(password)
+        return True, None
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,384 @@
+import atexit
+import cProfile
+import glob
+import os
+import pstats
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import click
+from flask import g, request
+
+from src.utils.ratelimit import rate_limiter
+
+MODES = ('cprofile', 'sampler')
+FORMATS = {'cprofile': 'pstats', 'sampler': 'collapsed'}
+
+DEFAULT_PROFILE_DIR = os.path.join(tempfile.gettempdir(), 'asforp-profiles')
+
+
+def _safe_name(endpoint):
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', endpoint)
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """
+    Muestreador de pilas: un hilo lee cada `interval` segundos la pila de los
+    hilos con una petición perfilada (sys._current_frames) y cuenta cada pila
+    en formato "collapsed" (marcos separados por ';', de la raíz a la hoja),
+    el que usan flamegraph.pl y speedscope. El hilo solo se despierta
+    mientras hay alguna petición perfilada en curso.
+    """
+
+    def __init__(self, interval, on_sample):
+        self.interval = interval
+        self.on_sample = on_sample
+        self.active = {}
+        self._has_active = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def start(self, endpoint):
+        self._ensure_started()
+        with self._lock:
+            self.active[threading.get_ident()] = endpoint
+            self._has_active.set()
+
+    def stop(self):
+        with self._lock:
+            self.active.pop(threading.get_ident(), None)
+            if not self.active:
+                self._has_active.clear()
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self.active = {}
+            threading.Thread(target=self._run, name='profile-sampler', daemon=True).start()
+            self._pid = os.getpid()
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            self._has_active.wait()
+            time.sleep(self.interval)
+            with self._lock:
+                active = dict(self.active)
+            samples = []
+            frame = None
+            frames = sys._current_frames()
+            for thread_id, endpoint in active.items():
+                frame = frames.get(thread_id)
+                if frame is None or thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                samples.append((endpoint, ';'.join(reversed(stack))))
+            # Soltar los marcos enseguida: si este hilo retuviera la última
+            # referencia a un objeto de la petición (p. ej. el generador de una
+            # respuesta en streaming), se finalizaría aquí, fuera de su contexto
+            del frames, frame
+            for endpoint, stack in samples:
+                self.on_sample(endpoint, stack)
+
+
+class RequestProfiler:
+    """
+    Perfilado bajo demanda de peticiones, agrupado por endpoint. Se perfila
+    una fracción PROFILE_SAMPLE_RATE de las peticiones y las que llegan con la
+    cabecera PROFILE_HEADER desde una IP de PROFILE_ALLOWED_IPS.
+
+    Dos modos (PROFILE_MODE):
+        'cprofile'  cProfile de la petición entera; se acumula en un pstats.Stats
+                    por endpoint (preciso, pero ralentiza la petición perfilada)
+        'sampler'   muestreo de pilas cada PROFILE_SAMPLE_INTERVAL segundos;
+                    coste casi nulo, resultados en formato collapsed para flamegraphs
+
+    Con PROFILE_ENABLED=False (por defecto) no se registra ningún hook, así
+    que no cuesta nada. El cuerpo de las respuestas en streaming se genera
+    después de la vista y no entra en el perfil.
+
+    Cada proceso acumula en memoria y escribe sus ficheros en PROFILE_DIR
+    (<endpoint>.<pid>.pstats / .collapsed) como mucho cada
+    PROFILE_FLUSH_INTERVAL segundos y al salir; `flask profile merge` y
+    GET /api/profiles/<endpoint> juntan los de todos los procesos.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.mode = 'cprofile'
+        self.sample_rate = 0.0
+        self.header = 'X-Profile'
+        self.allowed_ips = ('127.0.0.1', '::1')
+        self.directory = DEFAULT_PROFILE_DIR
+        self.flush_interval = 30.0
+        self.sampler = None
+        self._stats = {}
+        self._stacks = {}
+        self._requests = Counter()
+        self._dropped = 0
+        self._max_stacks = 20000
+        self._flushed_at = 0.0
+        self._dirty = False
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.config.setdefault('PROFILE_ENABLED', False)
+        app.config.setdefault('PROFILE_MODE', self.mode)
+        app.config.setdefault('PROFILE_SAMPLE_RATE', self.sample_rate)
+        app.config.setdefault('PROFILE_HEADER', self.header)
+        app.config.setdefault('PROFILE_ALLOWED_IPS', self.allowed_ips)
+        app.config.setdefault('PROFILE_DIR', self.directory)
+        app.config.setdefault('PROFILE_FLUSH_INTERVAL', self.flush_interval)
+        app.config.setdefault('PROFILE_SAMPLE_INTERVAL', 0.005)
+        app.config.setdefault('PROFILE_MAX_STACKS', self._max_stacks)
+        self.directory = app.config['PROFILE_DIR']
+        app.extensions['profiler'] = self
+        app.cli.add_command(profile_cli)
+
+        self.enabled = app.config['PROFILE_ENABLED']
+        if not self.enabled:
+            return
+        self.mode = app.config['PROFILE_MODE']
+        if self.mode not in MODES:
+            raise ValueError(f"PROFILE_MODE desconocido: {self.mode}")
+        self.sample_rate = app.config['PROFILE_SAMPLE_RATE']
+        self.header = app.config['PROFILE_HEADER']
+        self.allowed_ips = set(app.config['PROFILE_ALLOWED_IPS'])
+        self.flush_interval = app.config['PROFILE_FLUSH_INTERVAL']
+        self._max_stacks = app.config['PROFILE_MAX_STACKS']
+        if self.mode == 'sampler':
+            self.sampler = StackSampler(app.config['PROFILE_SAMPLE_INTERVAL'], self._add_sample)
+
+        # Primero de la lista para que el perfil incluya el resto de hooks
+        app.before_request_funcs.setdefault(None, []).insert(0, self._start_request)
+        app.teardown_request(self._finish_request)
+
+    def _should_profile(self):
+        if self.sample_rate and random.random() < self.sample_rate:
+            return True
+        return bool(request.headers.get(self.header)) and rate_limiter.client_ip() in self.allowed_ips
+
+    def _start_request(self):
+        if not self._should_profile():
+            return
+        endpoint = request.endpoint or 'unmatched'
+        if self.mode == 'sampler':
+            self.sampler.start(endpoint)
+            g._profile = (endpoint, None)
+            return
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Ya hay otro perfilador activo (en Python 3.12+ cProfile es global)
+            return
+        g._profile = (endpoint, profile)
+
+    def _finish_request(self, exc):
+        current = g.pop('_profile', None)
+        if current is None:
+            return
+        endpoint, profile = current
+        if profile is None:
+            self.sampler.stop()
+        else:
+            profile.disable()
+            stats = pstats.Stats(profile)
+            with self._lock:
+                self._ensure_process()
+                if endpoint in self._stats:
+                    self._stats[endpoint].add(stats)
+                else:
+                    self._stats[endpoint] = stats
+        with self._lock:
+            self._ensure_process()
+            self._requests[endpoint] += 1
+            self._dirty = True
+        if time.monotonic() - self._flushed_at >= self.flush_interval:
+            self.flush()
+
+    def _add_sample(self, endpoint, stack):
+        with self._lock:
+            self._ensure_process()
+            stacks = self._stacks.get(endpoint)
+            if stacks is None:
+                stacks = self._stacks[endpoint] = Counter()
+            if stack in stacks or len(stacks) < self._max_stacks:
+                stacks[stack] += 1
+            else:
+                self._dropped += 1
+            self._dirty = True
+
+    def _ensure_process(self):
+        # Tras un fork, lo acumulado por el padre no es de este proceso
+        if self._pid == os.getpid():
+            return
+        self._stats = {}
+        self._stacks = {}
+        self._requests = Counter()
+        self._pid = os.getpid()
+        atexit.register(self.flush)
+
+    def flush(self):
+        """
+        Escribe lo acumulado por este proceso en PROFILE_DIR (sobrescribe los
+        ficheros anteriores del mismo pid: el contenido es acumulativo).
+        """
+        with self._lock:
+            self._flushed_at = time.monotonic()
+            if self._pid != os.getpid() or not self._dirty:
+                return
+            self._dirty = False
+            stats = dict(self._stats)
+            stacks = {endpoint: dict(counter) for endpoint, counter in self._stacks.items()}
+
+        os.makedirs(self.directory, exist_ok=True)
+        pid = os.getpid()
+        for endpoint, endpoint_stats in stats.items():
+            path = os.path.join(self.directory, f'{_safe_name(endpoint)}.{pid}.pstats')
+            endpoint_stats.dump_stats(path + '.tmp')
+            os.replace(path + '.tmp', path)
+        for endpoint, counter in stacks.items():
+            path = os.path.join(self.directory, f'{_safe_name(endpoint)}.{pid}.collapsed')
+            with open(path + '.tmp', 'w') as f:
+                f.writelines(f'{stack} {count}\n' for stack, count in counter.items())
+            os.replace(path + '.tmp', path)
+
+    def reset(self):
+        """
+        Descarta lo acumulado en este proceso y borra los ficheros de PROFILE_DIR.
+        """
+        with self._lock:
+            self._stats = {}
+            self._stacks = {}
+            self._requests = Counter()
+            self._dropped = 0
+            self._dirty = False
+        return clear_profiles(self.directory)
+
+    def summary(self):
+        """
+        Lo acumulado en este proceso: peticiones perfiladas por endpoint y pilas
+        descartadas por superar PROFILE_MAX_STACKS.
+        """
+        with self._lock:
+            return {'requests': dict(self._requests), 'dropped_stacks': self._dropped}
+
+
+profiler = RequestProfiler()
+
+
+def list_profiles(directory):
+    """
+    {endpoint: {formato: número de procesos}} de los ficheros de `directory`.
+    """
+    profiles = {}
+    for path in glob.glob(os.path.join(directory, '*.*.*')):
+        name, pid, extension = os.path.basename(path).rsplit('.', 2)
+        if extension not in FORMATS.values() or not pid.isdigit():
+            continue
+        formats = profiles.setdefault(name, {})
+        formats[extension] = formats.get(extension, 0) + 1
+    return profiles
+
+
+def _profile_files(directory, endpoint, extension):
+    pattern = os.path.join(directory, f'{glob.escape(_safe_name(endpoint))}.*.{extension}')
+    return sorted(path for path in glob.glob(pattern) if path.rsplit('.', 2)[1].isdigit())
+
+
+def merge_pstats(directory, endpoint, output):
+    """
+    Junta los .pstats de todos los procesos para `endpoint` en `output`
+    (se abre con `python -m pstats`, snakeviz...). Devuelve los ficheros leídos.
+    """
+    files = _profile_files(directory, endpoint, 'pstats')
+    if not files:
+        return 0
+    stats = pstats.Stats(files[0])
+    for path in files[1:]:
+        stats.add(path)
+    stats.dump_stats(output)
+    return len(files)
+
+
+def merge_collapsed(directory, endpoint):
+    """
+    Suma las pilas de todos los procesos para `endpoint`. Devuelve el texto
+    en formato collapsed (entrada de flamegraph.pl o speedscope).
+    """
+    totals = Counter()
+    for path in _profile_files(directory, endpoint, 'collapsed'):
+        with open(path) as f:
+            for line in f:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                if stack:
+                    totals[stack] += int(count)
+    return ''.join(f'{stack} {count}\n' for stack, count in totals.most_common())
+
+
+def clear_profiles(directory):
+    removed = 0
+    for extension in FORMATS.values():
+        for path in glob.glob(os.path.join(directory, f'*.{extension}')):
+            os.remove(path)
+            removed += 1
+    return removed
+
+
+@click.group('profile')
+def profile_cli():
+    """Perfiles de peticiones (PROFILE_ENABLED)."""
+
+
+@profile_cli.command('list')
+def profile_list_command():
+    """Endpoints con perfiles guardados en PROFILE_DIR."""
+    for endpoint, formats in sorted(list_profiles(profiler.directory).items()):
+        details = ', '.join(f'{extension} ({count} procesos)' for extension, count in sorted(formats.items()))
+        click.echo(f'{endpoint:<40} {details}')
+
+
+@profile_cli.command('merge')
+@click.argument('endpoint')
+@click.option('--format', 'output_format', type=click.Choice(sorted(FORMATS.values())), default='pstats', show_default=True)
+@click.option('-o', '--output', required=True, help="Fichero de salida ('-' para collapsed por la salida estándar).")
+def profile_merge_command(endpoint, output_format, output):
+    """Junta los perfiles de ENDPOINT (p. ej. user.get_users) de todos los procesos."""
+    if output_format == 'pstats':
+        if output == '-':
+            raise click.UsageError('El formato pstats es binario: indica un fichero con -o')
+        files = merge_pstats(profiler.directory, endpoint, output)
+        if not files:
+            raise click.ClickException(f'No hay perfiles pstats de {endpoint}')
+        click.echo(f'{files} ficheros juntados en {output}', err=True)
+        return
+
+    collapsed = merge_collapsed(profiler.directory, endpoint)
+    if not collapsed:
+        raise click.ClickException(f'No hay perfiles collapsed de {endpoint}')
+    with click.open_file(output, 'w') as f:
+        f.write(collapsed)
+
+
+@profile_cli.command('clear')
+def profile_clear_command():
+    """Borra los perfiles guardados."""
+    click.echo(f'{clear_profiles(profiler.directory)} ficheros borrados')
@@ -0,0 +1,219 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from flask import current_app, jsonify, request
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert
+
+from src.models.rate_limit import RateLimitBucket
+from src.models.user import db
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+
+@lru_cache(maxsize=None)
+def parse_rate(value):
+    """
+    '5/minute' -> (tokens por segundo, capacidad del bucket).
+    """
+    count, period = value.split('/')
+    count = int(count)
+    return count / PERIODS[period.strip()], count
+
+
+class MemoryBucketStore:
+    """
+    Token buckets en memoria del proceso: clave -> (tokens, instante de la
+    última actualización). Al superar `maxsize` se descartan las claves usadas
+    hace más tiempo; un bucket olvidado equivale a uno lleno.
+    """
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key, rate, burst):
+        """
+        Gasta un token. Devuelve 0 si la petición pasa o los segundos que
+        faltan para que haya uno.
+        """
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                tokens = burst
+            else:
+                tokens = min(burst, item[0] + (now - item[1]) * rate)
+                self._data.move_to_end(key)
+
+            if tokens < 1:
+                self._data[key] = (tokens, now)
+                return (1 - tokens) / rate
+
+            self._data[key] = (tokens - 1, now)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            return 0.0
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteBucketStore:
+    """
+    Token buckets en la tabla rate_limit_bucket, compartidos por todos los
+    workers. Cada consumo es un único UPSERT atómico; solo las peticiones
+    rechazadas hacen una segunda consulta para calcular Retry-After.
+    """
+
+    def __init__(self):
+        self.table = RateLimitBucket.__table__
+
+    def consume(self, key, rate, burst):
+        now = time.time()
+        table = self.table
+        refilled = func.min(burst, table.c.tokens + (now - table.c.updated_at) * rate)
+        stmt = insert(table).values(key=key, tokens=burst - 1, updated_at=now)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.key],
+            set_={'tokens': refilled - 1, 'updated_at': now},
+            where=refilled >= 1
+        ).returning(table.c.tokens)
+
+        with db.engine.begin() as conn:
+            if conn.execute(stmt).first() is not None:
+                return 0.0
+            row = conn.execute(
+                select(table.c.tokens, table.c.updated_at).where(table.c.key == key)
+            ).one()
+        tokens = min(burst, row.tokens + (now - row.updated_at) * rate)
+        return max((1 - tokens) / rate, 0.0)
+
+
+def rate_limit(ip=None, account=None, account_field=None, account_ip=None):
+    """
+    Declara los límites de una ruta, p. ej. @rate_limit(ip='20/minute',
+    account_ip='5/minute', account='50/hour', account_field='username').
+    `account` se aplica al valor de `account_field` en el JSON de la petición
+    y `account_ip` a la pareja (cuenta, IP del cliente). RATE_LIMITS en
+    app.config puede sustituirlos por endpoint.
+
+    Un límite solo por cuenta lo agota cualquiera que conozca el nombre de
+    usuario y bloquea a la víctima; en el login el límite estricto es
+    `account_ip` y `account` queda como techo mucho más alto contra ataques
+    distribuidos.
+    """
+    def decorator(view):
+        view.rate_limits = {'ip': ip, 'account': account, 'account_field': account_field,
+                            'account_ip': account_ip}
+        return view
+    return decorator
+
+
+def rate_limited_response(retry_after):
+    response = jsonify({'error': 'Demasiadas peticiones, inténtalo de nuevo más tarde'})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(max(int(math.ceil(retry_after)), 1))
+    return response
+
+
+class RateLimiter:
+    """
+    Limita las peticiones por IP y por cuenta con token buckets. Se comprueba
+    en un before_request del blueprint, antes de que la vista toque la base de
+    datos o calcule un hash.
+
+    Configuración (app.config):
+        RATE_LIMIT_ENABLED      False desactiva el limitador
+        RATE_LIMIT_BACKEND      'memory' (por proceso) o 'sqlite' (compartido entre workers)
+        RATE_LIMIT_CACHE_SIZE   claves que guarda el backend en memoria
+        RATE_LIMIT_TRUST_PROXY  número de proxies de confianza delante de la app (0 = ninguno);
+                                la IP del cliente es la que añadió el más externo
+        RATE_LIMITS             {endpoint: {'ip': ..., 'account': ..., 'account_ip': ...,
+                                            'account_field': ...}}
+                                sustituye a lo declarado con @rate_limit
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.store = MemoryBucketStore()
+        self.trust_proxy = 0
+        self.overrides = {}
+
+    def init_app(self, app):
+        app.config.setdefault('RATE_LIMIT_ENABLED', True)
+        app.config.setdefault('RATE_LIMIT_BACKEND', 'memory')
+        app.config.setdefault('RATE_LIMIT_CACHE_SIZE', 100000)
+        app.config.setdefault('RATE_LIMIT_TRUST_PROXY', 0)
+        app.config.setdefault('RATE_LIMITS', {})
+
+        self.enabled = app.config['RATE_LIMIT_ENABLED']
+        if app.config['RATE_LIMIT_BACKEND'] == 'sqlite':
+            self.store = SQLiteBucketStore()
+        else:
+            self.store = MemoryBucketStore(maxsize=app.config['RATE_LIMIT_CACHE_SIZE'])
+        self.trust_proxy = int(app.config['RATE_LIMIT_TRUST_PROXY'])
+        self.overrides = app.config['RATE_LIMITS']
+        app.extensions['rate_limiter'] = self
+
+    def client_ip(self):
+        """
+        IP del cliente. Las entradas de la izquierda de X-Forwarded-For las
+        pone el cliente: solo vale la que añadió el proxy de confianza más
+        externo, la N-ésima por la derecha (como x_for=N de ProxyFix). Si hay
+        menos entradas que proxies, la cabecera no es de fiar.
+        """
+        if self.trust_proxy:
+            forwarded = [value.strip() for value in ','.join(request.headers.getlist('X-Forwarded-For')).split(',')]
+            forwarded = [value for value in forwarded if value]
+            if len(forwarded) >= self.trust_proxy:
+                return forwarded[-self.trust_proxy]
+        return request.remote_addr or 'desconocida'
+
+    def _limits_for(self, endpoint):
+        override = self.overrides.get(endpoint)
+        if override is not None:
+            return override
+        view = current_app.view_functions.get(endpoint)
+        return getattr(view, 'rate_limits', None)
+
+    def hit(self, key, limit):
+        rate, burst = parse_rate(limit)
+        return self.store.consume(key, rate, burst)
+
+    def check(self):
+        """
+        before_request: devuelve un 429 si alguno de los límites de la ruta se agotó.
+        """
+        if not self.enabled or request.endpoint is None:
+            return None
+        limits = self._limits_for(request.endpoint)
+        if not limits:
+            return None
+
+        retry_after = 0.0
+        ip = self.client_ip()
+        if limits.get('ip'):
+            retry_after = self.hit(f'{request.endpoint}:ip:{ip}', limits['ip'])
+
+        field = limits.get('account_field')
+        if not retry_after and field and (limits.get('account') or limits.get('account_ip')):
+            data = request.get_json(silent=True)
+            if not isinstance(data, dict):
+                data = {}
+            account = str(data.get(field) or '').strip().lower()
+            if account and limits.get('account_ip'):
+                retry_after = self.hit(f'{request.endpoint}:account_ip:{account}:{ip}', limits['account_ip'])
+            if account and not retry_after and limits.get('account'):
+                retry_after = self.hit(f'{request.endpoint}:account:{account}', limits['account'])
+
+        if retry_after:
+            return rate_limited_response(retry_after)
+        return None
+
+
+rate_limiter = RateLimiter()
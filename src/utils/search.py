@@ -0,0 +1,123 @@
+import re
+
+from sqlalchemy import column, select, table, text
+from sqlalchemy.exc import OperationalError
+
+from src.models.user import User
+
+# Índice FTS5 de contenido externo: guarda solo los tokens y lee las columnas
+# de `user` por rowid, así que no duplica los datos. unicode61 parte los emails
+# por '@' y '.', y remove_diacritics permite buscar "jose" y encontrar "José".
+# Los índices de prefijo de 2 y 3 caracteres evitan recorrer el vocabulario
+# en las búsquedas que se hacen mientras se escribe.
+USER_SEARCH_DDL = """
+CREATE VIRTUAL TABLE user_search USING fts5(
+    username, full_name, email,
+    content='user', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2',
+    prefix='2 3'
+)
+"""
+
+# Los triggers mantienen el índice al día con cualquier escritura (ORM, insert()
+# masivos de `flask users import` o SQL a mano). El de UPDATE solo salta si
+# cambia una columna indexada, no con cada subida de `version`.
+USER_SEARCH_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS user_search_ai AFTER INSERT ON "user" BEGIN
+        INSERT INTO user_search(rowid, username, full_name, email)
+        VALUES (new.id, new.username, new.full_name, new.email);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS user_search_ad AFTER DELETE ON "user" BEGIN
+        INSERT INTO user_search(user_search, rowid, username, full_name, email)
+        VALUES ('delete', old.id, old.username, old.full_name, old.email);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS user_search_au AFTER UPDATE OF username, full_name, email ON "user" BEGIN
+        INSERT INTO user_search(user_search, rowid, username, full_name, email)
+        VALUES ('delete', old.id, old.username, old.full_name, old.email);
+        INSERT INTO user_search(rowid, username, full_name, email)
+        VALUES (new.id, new.username, new.full_name, new.email);
+    END
+    """,
+]
+
+# Peso de cada columna en bm25(): una coincidencia en el username pesa más
+SEARCH_WEIGHTS = (10.0, 5.0, 2.0)
+
+user_search = table('user_search', column('rowid'))
+
+_TERM = re.compile(r'\w+', re.UNICODE)
+
+
+def install_user_search(engine):
+    """
+    Crea el índice FTS5 y sus triggers si no existen. Si la tabla es nueva
+    se rellena con los usuarios existentes. Devuelve False si SQLite no
+    tiene FTS5 (o la base de datos no es SQLite).
+    """
+    if engine.dialect.name != 'sqlite':
+        return False
+
+    with engine.begin() as conn:
+        has_fts5 = conn.execute(text("SELECT sqlite_compileoption_used('ENABLE_FTS5')")).scalar()
+        if not has_fts5:
+            return False
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_search'")
+        ).first()
+        if not exists:
+            conn.execute(text(USER_SEARCH_DDL))
+            conn.execute(text("INSERT INTO user_search(user_search) VALUES ('rebuild')"))
+        for trigger in USER_SEARCH_TRIGGERS:
+            conn.execute(text(trigger))
+    return True
+
+
+def user_search_available(engine):
+    """
+    True si el índice user_search existe y este SQLite puede leerlo. El
+    esquema puede haberlo creado otro proceso, así que se mira en la base de
+    datos y no en lo que devolvió install_user_search().
+    """
+    if engine.dialect.name != 'sqlite':
+        return False
+    try:
+        with engine.connect() as conn:
+            conn.execute(text('SELECT rowid FROM user_search LIMIT 0'))
+    except OperationalError:
+        # no such table: user_search / no such module: fts5
+        return False
+    return True
+
+
+def build_match_query(query):
+    """
+    Convierte lo que escribe el usuario en una expresión MATCH segura: cada
+    palabra se busca como prefijo y todas deben aparecer. La sintaxis de FTS5
+    (comillas, operadores, columnas) no se interpreta. Devuelve None si no
+    queda ninguna palabra.
+    """
+    terms = _TERM.findall(query)
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def search_users_statement(match, columns, limit, offset):
+    """
+    SELECT de `columns` de User para los usuarios que cumplen `match`,
+    ordenados por relevancia (bm25, menor es mejor) y luego por id.
+    """
+    weights = ', '.join(str(weight) for weight in SEARCH_WEIGHTS)
+    return (
+        select(*columns)
+        .join_from(User, user_search, user_search.c.rowid == User.id)
+        .where(text('user_search MATCH :match').bindparams(match=match))
+        .order_by(text(f'bm25(user_search, {weights})'), User.id)
+        .limit(limit)
+        .offset(offset)
+    )
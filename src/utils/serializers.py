@@ -0,0 +1,57 @@
+def isoformat(value):
+    return value.isoformat() if value else None
+
+
+class Serializer:
+    """
+    Serializador compilado: para cada conjunto de campos genera una única
+    función `obj -> dict` con accesos por atributo directos (sirve para
+    entidades y para filas de select()). Las funciones se cachean; como los
+    campos se normalizan al orden canónico, hay como mucho 2^n variantes.
+    """
+
+    def __init__(self, fields, default_fields=None, formatters=None):
+        self.fields = tuple(fields)
+        self.default_fields = tuple(default_fields or fields)
+        self.formatters = formatters or {}
+        self._compiled = {}
+
+    def parse_fields(self, value, default=None):
+        """
+        Convierte '?fields=a,b' en una tupla de campos en orden canónico.
+        Lanza ValueError si hay campos desconocidos.
+        """
+        if not value:
+            return default or self.default_fields
+        requested = {name.strip() for name in value.split(',') if name.strip()}
+        unknown = requested.difference(self.fields)
+        if unknown or not requested:
+            raise ValueError(', '.join(sorted(unknown)))
+        return tuple(name for name in self.fields if name in requested)
+
+    def compile(self, fields):
+        serialize = self._compiled.get(fields)
+        if serialize is None:
+            namespace = {}
+            items = []
+            for name in fields:
+                if name not in self.fields:
+                    raise ValueError(name)
+                expr = f'obj.{name}'
+                if name in self.formatters:
+                    namespace[f'_format_{name}'] = self.formatters[name]
+                    expr = f'_format_{name}({expr})'
+                items.append(f'{name!r}: {expr}')
+            exec(f"def serialize(obj):\n    return {{{', '.join(items)}}}\n", namespace)
+            serialize = self._compiled[fields] = namespace['serialize']
+        return serialize
+
+    def serialize(self, obj, fields=None):
+        return self.compile(fields or self.default_fields)(obj)
+
+    @staticmethod
+    def project(data, fields):
+        """
+        Selecciona `fields` de un dict ya serializado (p. ej. de la caché).
+        """
+        return {name: data[name] for name in fields}
@@ -0,0 +1,222 @@
+import hashlib
+import secrets
+import threading
+import time
+from datetime import datetime
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSession, SessionInterface
+from sqlalchemy import bindparam, delete, select, update
+from sqlalchemy.dialects.sqlite import insert
+
+from src.models.user import db
+from src.models.session import UserSession
+from src.utils.cache import LRUCache
+
+
+class ServerSideSession(SecureCookieSession):
+    """
+    Misma semántica que la sesión de Flask (modified/accessed), más el
+    identificador de la cookie y el usuario con el que se cargó.
+    """
+
+    def __init__(self, initial=None, sid=None, new=False, user_id=None):
+        super().__init__(initial)
+        self.sid = sid
+        self.new = new
+        self.loaded_user_id = user_id
+
+
+class SQLiteSessionStore:
+    """
+    Backend de sesiones sobre la tabla user_session. Usa conexiones Core del
+    engine para no mezclarse con la transacción de db.session de la vista.
+    """
+
+    def __init__(self):
+        self.table = UserSession.__table__
+        self.serializer = TaggedJSONSerializer()
+
+    def load(self, key, now):
+        with db.engine.connect() as conn:
+            row = conn.execute(
+                select(self.table.c.user_id, self.table.c.data, self.table.c.expires_at)
+                .where(self.table.c.id == key)
+            ).first()
+        if row is None or row.expires_at < now:
+            return None
+        return row.user_id, self.serializer.loads(row.data), row.expires_at
+
+    def save(self, key, user_id, data, now, expires_at):
+        stmt = insert(self.table).values(
+            id=key, user_id=user_id, data=self.serializer.dumps(data),
+            created_at=now, last_seen_at=now, expires_at=expires_at
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[self.table.c.id],
+            set_={'user_id': stmt.excluded.user_id, 'data': stmt.excluded.data,
+                  'last_seen_at': stmt.excluded.last_seen_at, 'expires_at': stmt.excluded.expires_at}
+        )
+        with db.engine.begin() as conn:
+            conn.execute(stmt)
+
+    def delete(self, key):
+        with db.engine.begin() as conn:
+            conn.execute(delete(self.table).where(self.table.c.id == key))
+
+    def delete_user(self, user_id):
+        with db.engine.begin() as conn:
+            return conn.execute(delete(self.table).where(self.table.c.user_id == user_id)).rowcount
+
+    def touch_many(self, touches, lifetime):
+        """
+        Actualiza last_seen_at (y alarga la caducidad) de muchas sesiones en un solo executemany.
+        """
+        stmt = update(self.table).where(self.table.c.id == bindparam('key')).values(
+            last_seen_at=bindparam('seen'), expires_at=bindparam('expires')
+        )
+        params = [{'key': key, 'seen': seen, 'expires': seen + lifetime} for key, seen in touches.items()]
+        with db.engine.begin() as conn:
+            conn.execute(stmt, params)
+
+    def purge_expired(self, now):
+        with db.engine.begin() as conn:
+            return conn.execute(delete(self.table).where(self.table.c.expires_at < now)).rowcount
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """
+    Sesiones en el servidor con una LRU en memoria delante del store. La cookie
+    contiene un identificador aleatorio opaco y no hay que verificar ninguna
+    firma en cada petición.
+
+    Configuración (app.config):
+        SESSION_BACKEND          'sqlite' (por defecto) o 'cookie' (sesión firmada de Flask)
+        SESSION_CACHE_SIZE       sesiones en la caché de cada proceso
+        SESSION_CACHE_TTL        segundos que una sesión se sirve desde caché; limita
+                                 cuánto tarda otro proceso en ver una revocación
+        SESSION_TOUCH_INTERVAL   cada cuántos segundos se escriben en bloque los last_seen_at
+    """
+
+    def __init__(self, store=None, cache_size=10000, cache_ttl=30, touch_interval=60):
+        self.store = store or SQLiteSessionStore()
+        self.cache = LRUCache(maxsize=cache_size, ttl=cache_ttl)
+        self.touch_interval = touch_interval
+        self._touches = {}
+        self._touch_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    @staticmethod
+    def _key(sid):
+        return hashlib.sha256(sid.encode('utf-8')).hexdigest()
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if not sid:
+            return ServerSideSession(new=True)
+
+        key = self._key(sid)
+        now = datetime.utcnow()
+        entry = self.cache.get(key)
+        if entry is None or entry[2] < now:
+            entry = self.store.load(key, now)
+            if entry is None:
+                return ServerSideSession(new=True)
+            self.cache.set(key, entry)
+
+        user_id, data, _ = entry
+        with self._touch_lock:
+            self._touches[key] = now
+        return ServerSideSession(dict(data), sid=sid, user_id=user_id)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        self._maybe_flush_touches(app)
+
+        if not session:
+            if session.modified and session.sid:
+                self._discard(session.sid)
+                response.delete_cookie(name, domain=domain, path=path, secure=secure,
+                                       samesite=samesite, httponly=httponly)
+                response.vary.add('Cookie')
+            return
+
+        if not session.modified and not session.new:
+            return
+
+        user_id = session.get('user_id')
+        sid = session.sid
+        if sid is None or user_id != session.loaded_user_id:
+            # Identificador nuevo al iniciar sesión o cambiar de usuario (evita fijación de sesión)
+            if sid is not None:
+                self._discard(sid)
+            sid = secrets.token_urlsafe(24)
+
+        key = self._key(sid)
+        now = datetime.utcnow()
+        expires_at = now + app.permanent_session_lifetime
+        data = dict(session)
+        self.store.save(key, user_id, data, now, expires_at)
+        self.cache.set(key, (user_id, data, expires_at))
+
+        if sid != session.sid:
+            response.set_cookie(name, sid, expires=self.get_expiration_time(app, session),
+                                httponly=httponly, domain=domain, path=path,
+                                secure=secure, samesite=samesite)
+            response.vary.add('Cookie')
+
+    def _discard(self, sid):
+        key = self._key(sid)
+        self.cache.delete(key)
+        with self._touch_lock:
+            self._touches.pop(key, None)
+        self.store.delete(key)
+
+    def revoke_user(self, user_id):
+        """
+        Cierra todas las sesiones de un usuario. En otros procesos dejan de ser
+        válidas como mucho SESSION_CACHE_TTL segundos después.
+        """
+        revoked = self.store.delete_user(user_id)
+        self.cache.delete_where(lambda entry: entry[0] == user_id)
+        return revoked
+
+    def _maybe_flush_touches(self, app):
+        if time.monotonic() - self._last_flush < self.touch_interval:
+            return
+        self.flush_touches(app)
+
+    def flush_touches(self, app):
+        with self._touch_lock:
+            touches, self._touches = self._touches, {}
+            self._last_flush = time.monotonic()
+        if touches:
+            try:
+                self.store.touch_many(touches, app.permanent_session_lifetime)
+            except Exception as e:
+                print(f"Error actualizando last_seen de sesiones: {str(e)}")
+
+
+def init_sessions(app):
+    app.config.setdefault('SESSION_BACKEND', 'sqlite')
+    app.config.setdefault('SESSION_CACHE_SIZE', 10000)
+    app.config.setdefault('SESSION_CACHE_TTL', 30)
+    app.config.setdefault('SESSION_TOUCH_INTERVAL', 60)
+
+    if app.config['SESSION_BACKEND'] != 'sqlite':
+        return
+
+    app.session_interface = ServerSideSessionInterface(
+        cache_size=app.config['SESSION_CACHE_SIZE'],
+        cache_ttl=app.config['SESSION_CACHE_TTL'],
+        touch_interval=app.config['SESSION_TOUCH_INTERVAL']
+    )
@@ -0,0 +1,76 @@
+from sqlalchemy import event
+
+# Pragmas aplicados a cada conexión nueva según el perfil elegido
+SQLITE_PROFILES = {
+    # Valores por defecto de SQLite (rollback journal, sin busy timeout)
+    'default': {},
+    # Varios hilos/procesos escribiendo: WAL permite lectores concurrentes con
+    # un escritor y busy_timeout hace esperar en vez de fallar con "database is locked"
+    'production': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'mmap_size': 268435456,
+        'cache_size': -65536,
+        'temp_store': 'MEMORY',
+        'foreign_keys': 'ON',
+    },
+}
+
+
+def sqlite_pragmas(app):
+    pragmas = dict(SQLITE_PROFILES[app.config['SQLITE_PROFILE']])
+    pragmas.update(app.config.get('SQLITE_PRAGMAS') or {})
+    return pragmas
+
+
+def configure_sqlite(app):
+    """
+    Prepara las opciones del engine antes de db.init_app(app).
+
+    Configuración (app.config):
+        SQLITE_PROFILE    'production' (por defecto) o 'default'
+        SQLITE_PRAGMAS    pragmas extra o que sustituyen a los del perfil
+        SQLITE_POOL_SIZE  conexiones que se mantienen abiertas (una por hilo de servidor)
+        SQLITE_POOL_MAX_OVERFLOW, SQLITE_POOL_TIMEOUT
+    """
+    app.config.setdefault('SQLITE_PROFILE', 'production')
+    app.config.setdefault('SQLITE_POOL_SIZE', 16)
+    app.config.setdefault('SQLITE_POOL_MAX_OVERFLOW', 16)
+    app.config.setdefault('SQLITE_POOL_TIMEOUT', 30)
+
+    uri = app.config.get('SQLALCHEMY_DATABASE_URI', '')
+    if not uri.startswith('sqlite') or ':memory:' in uri or uri.rstrip('/') == 'sqlite:':
+        return
+
+    busy_timeout = sqlite_pragmas(app).get('busy_timeout', 5000)
+    options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+    options.setdefault('pool_size', app.config['SQLITE_POOL_SIZE'])
+    options.setdefault('max_overflow', app.config['SQLITE_POOL_MAX_OVERFLOW'])
+    options.setdefault('pool_timeout', app.config['SQLITE_POOL_TIMEOUT'])
+    connect_args = options.setdefault('connect_args', {})
+    # Las conexiones del pool pasan de un hilo a otro
+    connect_args.setdefault('check_same_thread', False)
+    connect_args.setdefault('timeout', busy_timeout / 1000)
+
+
+def register_sqlite_pragmas(app, engine):
+    """
+    Aplica los pragmas del perfil en cada conexión que abre `engine`.
+    Debe llamarse antes de la primera conexión.
+    """
+    if engine.dialect.name != 'sqlite':
+        return
+
+    pragmas = sqlite_pragmas(app)
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
@@ -0,0 +1,122 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+from datetime import datetime, timezone
+
+from flask import Response, request, send_file
+
+# Tipos que merece la pena comprimir (las imágenes JPEG/PNG ya lo están)
+COMPRESSIBLE_MIMETYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/javascript', 'application/javascript',
+    'application/json', 'image/svg+xml', 'image/x-icon', 'image/vnd.microsoft.icon'
+}
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+DEFAULT_CACHE_CONTROL = 'public, max-age=3600'
+INDEX_CACHE_CONTROL = 'no-cache'
+
+
+class StaticAsset:
+    def __init__(self, path, filename, mimetype, size, mtime, etag, cache_control):
+        self.path = path
+        self.filename = filename
+        self.mimetype = mimetype
+        self.size = size
+        self.last_modified = datetime.fromtimestamp(mtime, tz=timezone.utc)
+        self.etag = etag
+        self.cache_control = cache_control
+        # Contenido en memoria (solo ficheros pequeños) y su versión gzip
+        self.data = None
+        self.gzip_data = None
+        self.gzip_etag = None
+
+
+class StaticManifest:
+    """
+    Índice de los ficheros estáticos construido una sola vez al arrancar:
+    ruta -> metadatos, ETag y, para los tipos de texto, una copia gzip en memoria.
+    Así las peticiones no tocan el sistema de ficheros para decidir qué servir.
+    """
+
+    def __init__(self, folder, immutable_prefix='assets/', max_memory_size=2 * 1024 * 1024,
+                 min_gzip_size=1024, compress_level=9):
+        self.folder = folder
+        self.immutable_prefix = immutable_prefix
+        self.max_memory_size = max_memory_size
+        self.min_gzip_size = min_gzip_size
+        self.compress_level = compress_level
+        self.assets = {}
+        self.index = None
+        self.build()
+
+    def build(self):
+        assets = {}
+        if self.folder and os.path.isdir(self.folder):
+            for root, _, files in os.walk(self.folder):
+                for name in files:
+                    filename = os.path.join(root, name)
+                    path = os.path.relpath(filename, self.folder).replace(os.sep, '/')
+                    assets[path] = self._load(path, filename)
+        self.assets = assets
+        self.index = assets.get('index.html')
+
+    def _cache_control(self, path):
+        if path == 'index.html':
+            return INDEX_CACHE_CONTROL
+        # Los ficheros de assets/ llevan el hash del contenido en el nombre
+        if path.startswith(self.immutable_prefix):
+            return IMMUTABLE_CACHE_CONTROL
+        return DEFAULT_CACHE_CONTROL
+
+    def _load(self, path, filename):
+        stat = os.stat(filename)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+        digest = hashlib.blake2b(digest_size=10)
+        with open(filename, 'rb') as f:
+            for block in iter(lambda: f.read(65536), b''):
+                digest.update(block)
+
+        asset = StaticAsset(path, filename, mimetype, stat.st_size, stat.st_mtime,
+                            digest.hexdigest(), self._cache_control(path))
+
+        if stat.st_size <= self.max_memory_size:
+            with open(filename, 'rb') as f:
+                asset.data = f.read()
+            if mimetype in COMPRESSIBLE_MIMETYPES and stat.st_size >= self.min_gzip_size:
+                compressed = gzip.compress(asset.data, compresslevel=self.compress_level, mtime=0)
+                if len(compressed) < stat.st_size:
+                    asset.gzip_data = compressed
+                    asset.gzip_etag = f'{asset.etag}-gz'
+        return asset
+
+    def get(self, path):
+        return self.assets.get(path)
+
+    def respond(self, asset):
+        use_gzip = asset.gzip_data is not None and request.accept_encodings['gzip'] > 0
+        etag = asset.gzip_etag if use_gzip else asset.etag
+
+        headers = {'Cache-Control': asset.cache_control}
+        if asset.gzip_data is not None:
+            headers['Vary'] = 'Accept-Encoding'
+
+        if request.if_none_match.contains(etag):
+            response = Response(status=304, headers=headers)
+            response.set_etag(etag)
+            return response
+
+        if asset.data is None:
+            # Ficheros grandes: se envían desde disco
+            response = send_file(asset.filename, mimetype=asset.mimetype, etag=asset.etag,
+                                 last_modified=asset.last_modified, conditional=True)
+            response.headers.update(headers)
+            return response
+
+        response = Response(asset.gzip_data if use_gzip else asset.data, mimetype=asset.mimetype, headers=headers)
+        if use_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+        response.set_etag(etag)
+        response.last_modified = asset.last_modified
+        return response
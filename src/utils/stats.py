@@ -0,0 +1,169 @@
+from datetime import datetime, timedelta
+
+import click
+from sqlalchemy import select, text
+
+from src.models.user import db
+from src.models.user_stats import UserCounter, UserSignupDay
+
+# Los triggers actualizan los contadores en la misma transacción que el
+# INSERT/UPDATE/DELETE sobre `user`, venga del ORM, de los insert() masivos de
+# `flask users import` o de los UPDATE por lotes de mantenimiento. SQLite solo
+# admite un escritor a la vez, así que tocar siempre las mismas filas no añade
+# contención. Los booleanos pueden ser NULL: cuentan como 0.
+USER_STATS_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS user_stats_ai AFTER INSERT ON "user" BEGIN
+        UPDATE user_counter SET value = value + CASE name
+            WHEN 'total' THEN 1
+            WHEN 'verified' THEN coalesce(new.is_verified, 0)
+            WHEN 'premium' THEN coalesce(new.is_premium, 0)
+        END;
+        INSERT INTO user_signup_day (day, signups)
+        VALUES (coalesce(date(new.created_at), date('now')), 1)
+        ON CONFLICT (day) DO UPDATE SET signups = signups + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS user_stats_ad AFTER DELETE ON "user" BEGIN
+        UPDATE user_counter SET value = value - CASE name
+            WHEN 'total' THEN 1
+            WHEN 'verified' THEN coalesce(old.is_verified, 0)
+            WHEN 'premium' THEN coalesce(old.is_premium, 0)
+        END;
+        UPDATE user_signup_day SET signups = signups - 1
+        WHERE day = coalesce(date(old.created_at), date('now'));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS user_deletions_ad AFTER DELETE ON "user" BEGIN
+        INSERT INTO user_deletions (id, value) VALUES (1, 1)
+        ON CONFLICT (id) DO UPDATE SET value = value + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS user_stats_au AFTER UPDATE OF is_verified, is_premium ON "user"
+    WHEN coalesce(old.is_verified, 0) != coalesce(new.is_verified, 0)
+      OR coalesce(old.is_premium, 0) != coalesce(new.is_premium, 0)
+    BEGIN
+        UPDATE user_counter SET value = value + CASE name
+            WHEN 'verified' THEN coalesce(new.is_verified, 0) - coalesce(old.is_verified, 0)
+            WHEN 'premium' THEN coalesce(new.is_premium, 0) - coalesce(old.is_premium, 0)
+        END
+        WHERE name IN ('verified', 'premium');
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS user_stats_au_day AFTER UPDATE OF created_at ON "user"
+    WHEN coalesce(date(old.created_at), '') != coalesce(date(new.created_at), '')
+    BEGIN
+        UPDATE user_signup_day SET signups = signups - 1
+        WHERE day = coalesce(date(old.created_at), date('now'));
+        INSERT INTO user_signup_day (day, signups)
+        VALUES (coalesce(date(new.created_at), date('now')), 1)
+        ON CONFLICT (day) DO UPDATE SET signups = signups + 1;
+    END
+    """,
+]
+
+# Días que devuelve /api/stats por defecto y como máximo
+STATS_DEFAULT_DAYS = 30
+STATS_MAX_DAYS = 366
+
+
+def install_user_stats(engine):
+    """
+    Crea los triggers que mantienen user_counter, user_signup_day y
+    user_deletions. Si los
+    contadores aún no existen (base de datos nueva o anterior a esta tabla)
+    se calculan desde cero.
+    """
+    if engine.dialect.name != 'sqlite':
+        return False
+
+    with engine.begin() as conn:
+        for trigger in USER_STATS_TRIGGERS:
+            conn.execute(text(trigger))
+        if conn.execute(select(UserCounter.name).limit(1)).first() is None:
+            _rebuild(conn)
+    return True
+
+
+def _rebuild(conn):
+    """
+    Recalcula los contadores y las altas por día con un recorrido de `user`.
+    El DELETE inicial coge el bloqueo de escritura, así que ningún alta
+    concurrente puede colarse entre el recuento y la escritura.
+    """
+    conn.execute(UserCounter.__table__.delete())
+    conn.execute(UserSignupDay.__table__.delete())
+    conn.execute(text("""
+        INSERT INTO user_counter (name, value)
+        SELECT 'total', count(*) FROM "user"
+        UNION ALL SELECT 'verified', coalesce(sum(coalesce(is_verified, 0)), 0) FROM "user"
+        UNION ALL SELECT 'premium', coalesce(sum(coalesce(is_premium, 0)), 0) FROM "user"
+    """))
+    conn.execute(text("""
+        INSERT INTO user_signup_day (day, signups)
+        SELECT coalesce(date(created_at), date('now')), count(*) FROM "user"
+        GROUP BY 1
+    """))
+
+
+def reconcile_user_stats():
+    """
+    Recalcula todo desde cero y devuelve {contador: (antes, después)} con los
+    que no cuadraban.
+    """
+    with db.engine.begin() as conn:
+        before = dict(conn.execute(select(UserCounter.name, UserCounter.value)).all())
+        before_days = dict(conn.execute(select(UserSignupDay.day, UserSignupDay.signups)).all())
+        _rebuild(conn)
+        after = dict(conn.execute(select(UserCounter.name, UserCounter.value)).all())
+        after_days = dict(conn.execute(select(UserSignupDay.day, UserSignupDay.signups)).all())
+
+    drift = {name: (before.get(name), value) for name, value in after.items() if before.get(name) != value}
+    for day in set(before_days) | set(after_days):
+        old, new = before_days.get(day, 0), after_days.get(day, 0)
+        if old != new:
+            drift[day.isoformat()] = (old, new)
+    return drift
+
+
+def get_user_stats(days=STATS_DEFAULT_DAYS, today=None):
+    """
+    Contadores y altas de los últimos `days` días (incluido hoy, en UTC), con
+    los días sin altas a 0. Lee 3 filas y un rango de la clave primaria.
+    """
+    today = today or datetime.utcnow().date()
+    first_day = today - timedelta(days=days - 1)
+    counters = dict(db.session.execute(select(UserCounter.name, UserCounter.value)).all())
+    signups = dict(db.session.execute(
+        select(UserSignupDay.day, UserSignupDay.signups)
+        .where(UserSignupDay.day >= first_day, UserSignupDay.day <= today)
+    ).all())
+    return {
+        'total': counters.get(UserCounter.TOTAL, 0),
+        'verified': counters.get(UserCounter.VERIFIED, 0),
+        'premium': counters.get(UserCounter.PREMIUM, 0),
+        'signups': [
+            {'date': day.isoformat(), 'count': signups.get(day, 0)}
+            for day in (first_day + timedelta(days=i) for i in range(days))
+        ]
+    }
+
+
+@click.group('stats')
+def stats_cli():
+    """Estadísticas de usuarios."""
+
+
+@stats_cli.command('reconcile')
+def reconcile_command():
+    """Recalcula los contadores desde la tabla user y muestra las diferencias."""
+    drift = reconcile_user_stats()
+    if not drift:
+        click.echo('Los contadores ya cuadraban')
+        return
+    for name, (old, new) in sorted(drift.items()):
+        click.echo(f'{name}: {old} -> {new}')
@@ -0,0 +1,49 @@
+import hashlib
+from flask import current_app
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+
+VERIFICATION_SALT = 'email-verification'
+VERIFICATION_MAX_AGE = 24 * 60 * 60  # 24 horas
+
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt=VERIFICATION_SALT)
+
+
+def _email_fingerprint(email):
+    # Liga el token al email para que no sirva si el id se reutiliza
+    return hashlib.blake2b(email.encode('utf-8'), digest_size=6).hexdigest()
+
+
+def signed_tokens_enabled():
+    return current_app.config.get('VERIFICATION_TOKEN_MODE', 'signed') == 'signed'
+
+
+def is_signed_token(token):
+    """
+    Los tokens antiguos (secrets.token_urlsafe) nunca contienen '.', los firmados sí.
+    """
+    return '.' in token
+
+
+def generate_verification_token(user_id, email):
+    """
+    Token firmado con el id del usuario y la hora de emisión. No se guarda en la base de datos.
+    """
+    return _serializer().dumps({'uid': user_id, 'e': _email_fingerprint(email)})
+
+
+def load_verification_token(token, max_age=VERIFICATION_MAX_AGE):
+    """
+    Devuelve el id de usuario del token. Lanza SignatureExpired si han pasado
+    más de `max_age` segundos desde su emisión y BadSignature si no es válido.
+    """
+    data = _serializer().loads(token, max_age=max_age)
+    if not isinstance(data, dict) or 'uid' not in data:
+        raise BadSignature('Token de verificación mal formado')
+    return data['uid'], data.get('e')
+
+
+def token_matches_email(fingerprint, email):
+    return fingerprint == _email_fingerprint(email)
+
@@ -0,0 +1,312 @@
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice, repeat
+
+import click
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+from werkzeug.security import generate_password_hash
+
+from src.models.user import User, db
+from src.routes.user import validate_email, validate_password
+from src.utils.availability import availability_index
+from src.utils.passwords import password_hasher
+
+# Columnas de la exportación, en el orden de User.to_dict
+EXPORT_FIELDS = ['id', 'username', 'email', 'full_name', 'phone', 'is_verified', 'is_premium', 'created_at', 'premium_expires_at']
+
+TRUE_VALUES = {'1', 'true', 't', 'yes', 'y', 'si', 'sí', 's'}
+
+
+def _detect_format(path, fmt):
+    if fmt:
+        return fmt
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+
+class InvalidLine:
+    """
+    Línea que no se pudo leer. read_rows la devuelve en lugar de la fila para
+    que se cuente como inválida sin interrumpir la importación.
+    """
+    __slots__ = ('reason',)
+
+    def __init__(self, reason):
+        self.reason = reason
+
+
+def read_rows(stream, fmt):
+    """
+    Devuelve un iterador de dicts leyendo el fichero línea a línea.
+    """
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield InvalidLine(f'JSON inválido ({e.msg})')
+
+
+def _to_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value or '').strip().lower() in TRUE_VALUES
+
+
+def _to_datetime(value):
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value).strip())
+
+
+def _to_text(raw, field):
+    """
+    Valor de texto de `field`: null cuenta como vacío y los números (p. ej. un
+    teléfono en JSON) se convierten; cualquier otro tipo hace la fila inválida.
+    """
+    value = raw.get(field)
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    raise TypeError(f'{field} debe ser texto')
+
+
+def normalize_row(raw):
+    """
+    Aplica las mismas reglas que /api/register. Devuelve (fila, None) o
+    (None, motivo) si la fila no es válida. La fila lleva 'password' o
+    'password_hash' según lo que traiga el fichero.
+    """
+    if isinstance(raw, InvalidLine):
+        return None, raw.reason
+    if not isinstance(raw, dict):
+        return None, 'la fila no es un objeto JSON'
+    try:
+        username = _to_text(raw, 'username').strip()
+        email = _to_text(raw, 'email').strip().lower()
+        full_name = _to_text(raw, 'full_name').strip()
+        password = _to_text(raw, 'password')
+        password_hash = _to_text(raw, 'password_hash').strip()
+        phone = _to_text(raw, 'phone').strip()
+    except TypeError as e:
+        return None, str(e)
+
+    if len(username) < 3:
+        return None, 'username inválido'
+    if not validate_email(email):
+        return None, 'email inválido'
+    if not full_name:
+        return None, 'full_name es requerido'
+    if not password_hash and not validate_password(password):
+        return None, 'contraseña inválida'
+
+    try:
+        row = {
+            'username': username,
+            'email': email,
+            'full_name': full_name,
+            'phone': phone,
+            'is_verified': _to_bool(raw.get('is_verified')),
+            'is_premium': _to_bool(raw.get('is_premium')),
+            'created_at': _to_datetime(raw.get('created_at')) or datetime.utcnow(),
+            'premium_expires_at': _to_datetime(raw.get('premium_expires_at')),
+        }
+    except (TypeError, ValueError):
+        return None, 'fecha inválida'
+
+    if password_hash:
+        row['password_hash'] = password_hash
+    else:
+        row['password'] = password
+    return row, None
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _existing(column, values):
+    if not values:
+        return set()
+    return set(db.session.execute(select(column).where(column.in_(values))).scalars())
+
+
+class UserImporter:
+    """
+    Importa usuarios por lotes: valida, descarta duplicados (dentro del
+    fichero y contra la tabla) con una consulta por lote, calcula los hashes
+    en un pool de procesos y hace un INSERT masivo por lote.
+
+    El INSERT lleva ON CONFLICT DO NOTHING: una fila que otro proceso
+    (p. ej. un registro por la API) inserta entre la comprobación y el INSERT
+    se omite y cuenta como duplicada, en vez de abortar el lote.
+    """
+
+    def __init__(self, executor, method, batch_size=2000):
+        self.executor = executor
+        self.method = method
+        self.batch_size = batch_size
+        self.seen_usernames = set()
+        self.seen_emails = set()
+        self.stats = {'read': 0, 'inserted': 0, 'duplicates': 0, 'invalid': 0}
+        self.errors = []
+
+    def _dedupe(self, rows):
+        usernames = [row['username'] for row in rows]
+        emails = [row['email'] for row in rows]
+        taken_usernames = _existing(User.username, usernames)
+        taken_emails = _existing(User.email, emails)
+
+        fresh = []
+        for row in rows:
+            if (row['username'] in taken_usernames or row['email'] in taken_emails
+                    or row['username'] in self.seen_usernames or row['email'] in self.seen_emails):
+                self.stats['duplicates'] += 1
+                continue
+            self.seen_usernames.add(row['username'])
+            self.seen_emails.add(row['email'])
+            fresh.append(row)
+        return fresh
+
+    def _hash_passwords(self, rows):
+        pending = [row for row in rows if 'password' in row]
+        if not pending:
+            return
+        passwords = [row.pop('password') for row in pending]
+        chunksize = max(len(passwords) // ((os.cpu_count() or 1) * 4), 1)
+        hashes = self.executor.map(generate_password_hash, passwords, repeat(self.method), chunksize=chunksize)
+        for row, password_hash in zip(pending, hashes):
+            row['password_hash'] = password_hash
+
+    def import_batch(self, raw_rows, line_offset):
+        rows = []
+        for number, raw in enumerate(raw_rows, start=line_offset):
+            self.stats['read'] += 1
+            row, error = normalize_row(raw)
+            if error:
+                self.stats['invalid'] += 1
+                self.errors.append((number, error))
+                continue
+            rows.append(row)
+
+        rows = self._dedupe(rows)
+        if not rows:
+            return 0
+        self._hash_passwords(rows)
+
+        inserted_rows = db.session.execute(
+            insert(User).on_conflict_do_nothing().returning(User.username, User.email), rows
+        ).all()
+        db.session.commit()
+        # El INSERT masivo no dispara after_insert: se avisa al índice a mano
+        for username, email in inserted_rows:
+            availability_index.add(username, email)
+        inserted = len(inserted_rows)
+        self.stats['inserted'] += inserted
+        self.stats['duplicates'] += len(rows) - inserted
+        return inserted
+
+    def run(self, raw_rows, progress=None):
+        line = 1
+        for batch in _batches(raw_rows, self.batch_size):
+            self.import_batch(batch, line)
+            line += len(batch)
+            if progress:
+                progress(self.stats)
+        return self.stats
+
+
+def export_users(stream, fmt, chunk=1000):
+    """
+    Escribe User.to_dict de todos los usuarios, por bloques de `chunk` filas
+    con yield_per, sin cargar la tabla entera en memoria. Devuelve cuántos escribió.
+    """
+    result = db.session.execute(
+        select(User).order_by(User.id).execution_options(yield_per=chunk)
+    ).scalars()
+
+    writer = None
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+
+    count = 0
+    for partition in result.partitions():
+        for user in partition:
+            if writer:
+                writer.writerow(user.to_dict())
+            else:
+                stream.write(json.dumps(user.to_dict(), ensure_ascii=False) + '\n')
+        # El identity map guarda referencias débiles: los bloques ya escritos se liberan
+        count += len(partition)
+    return count
+
+
+@click.group('users')
+def users_cli():
+    """Importación y exportación masiva de usuarios."""
+
+
+@users_cli.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Por defecto según la extensión.')
+@click.option('--batch-size', type=int, default=2000, show_default=True, help='Filas por transacción.')
+@click.option('--workers', type=int, help='Procesos para el hashing (por defecto, núcleos disponibles).')
+@click.option('--hash-method', help='Método de werkzeug (por defecto PASSWORD_HASH_METHOD).')
+def users_import_command(path, fmt, batch_size, workers, hash_method):
+    """
+    Importa usuarios desde CSV o JSONL. Columnas: username, email, full_name,
+    password o password_hash, y opcionalmente phone, is_verified, is_premium,
+    created_at y premium_expires_at. Los duplicados se omiten.
+    """
+    fmt = _detect_format(path, fmt)
+    start = time.perf_counter()
+
+    def progress(stats):
+        elapsed = time.perf_counter() - start
+        click.echo(f"{stats['read']} leídas, {stats['inserted']} insertadas "
+                   f"({stats['inserted'] / elapsed:.0f}/s)", err=True)
+
+    with open(path, newline='', encoding='utf-8') as f, ProcessPoolExecutor(max_workers=workers) as executor:
+        importer = UserImporter(executor, hash_method or password_hasher.method, batch_size)
+        stats = importer.run(read_rows(f, fmt), progress)
+
+    for number, error in importer.errors[:20]:
+        click.echo(f'  fila {number}: {error}', err=True)
+    if len(importer.errors) > 20:
+        click.echo(f'  ... y {len(importer.errors) - 20} filas inválidas más', err=True)
+    click.echo(f"{stats['inserted']} insertados, {stats['duplicates']} duplicados, "
+               f"{stats['invalid']} inválidos en {time.perf_counter() - start:.1f}s")
+
+
+@users_cli.command('export')
+@click.argument('path', default='-')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Por defecto según la extensión (jsonl para stdout).')
+def users_export_command(path, fmt):
+    """Exporta todos los usuarios (User.to_dict) a un fichero o a stdout."""
+    if path == '-':
+        count = export_users(sys.stdout, fmt or 'jsonl')
+    else:
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            count = export_users(f, _detect_format(path, fmt))
+    click.echo(f'{count} usuarios exportados', err=True)
@@ -0,0 +1,129 @@
+import socketserver
+import threading
+
+import pytest
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """
+    Servidor SMTP mínimo en el propio proceso para las pruebas: guarda los
+    mensajes recibidos en `messages` como (remitente, destinatarios, datos).
+    `fail_rcpt` y `fail_data` permiten responder a RCPT/DATA con un código
+    de error (p. ej. 451 temporal o 550 permanente).
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPSinkHandler)
+        self.messages = []
+        self.connections = 0
+        self.fail_rcpt = None
+        self.fail_data = None
+        self.lock = threading.Lock()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    @property
+    def recipients(self):
+        return [recipient for _, recipients, _ in self.messages for recipient in recipients]
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        sender, recipients = None, []
+        self.reply('220 sink ESMTP')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip()
+            verb = command[:4].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250 sink')
+            elif verb == 'MAIL':
+                sender, recipients = command.split(':', 1)[1].strip(), []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                if server.fail_rcpt:
+                    self.reply(server.fail_rcpt)
+                else:
+                    recipients.append(command.split(':', 1)[1].strip().strip('<>'))
+                    self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                while True:
+                    line = self.rfile.readline()
+                    if not line or line == b'.\r\n':
+                        break
+                    data.append(line)
+                if server.fail_data:
+                    self.reply(server.fail_data)
+                else:
+                    with server.lock:
+                        server.messages.append((sender, recipients, b''.join(data)))
+                    self.reply('250 OK')
+            elif verb in ('RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+@pytest.fixture
+def smtp_sink():
+    server = SMTPSink()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """
+    App sobre una base de datos temporal, sin hilos de email ni límites de
+    peticiones. Los singletons de las extensiones se reconfiguran en cada
+    create_app(), así que cada prueba empieza limpia.
+    """
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setenv('EMAIL_WORKERS', '0')
+    monkeypatch.delenv('EMAIL_DELIVERY', raising=False)
+    from src.main import create_app
+
+    app = create_app({
+        'TESTING': True,
+        'SCHEMA_AUTO_CREATE': True,
+        'RATE_LIMIT_ENABLED': False,
+        'AUTH_EVENTS_ENABLED': False,
+        # Coste mínimo: las pruebas no miden el hashing
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+        'ADMIN_API_TOKEN': 'test-admin-token'
+    })
+    yield app
+    from src.models.user import db
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def runner(app):
+    return app.test_cli_runner()
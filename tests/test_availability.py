@@ -0,0 +1,121 @@
+import pytest
+from sqlalchemy import event, insert
+
+from src.models.user import User, db
+from src.utils.availability import availability_index
+from src.utils.ratelimit import rate_limiter
+
+
+def register(client, username='ana', email='ana@example.com'):
+    return client.post('/api/register', json={
+        'username': username, 'email': email, 'password': 'secreta123', 'full_name': 'Ana'
+    })
+
+
+def check(client, **params):
+    response = client.get('/api/check-availability', query_string=params)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def insert_from_other_process(app, username):
+    # Como un alta de otro worker: otra conexión, sin el ORM ni el filtro de este proceso
+    with app.app_context():
+        with db.engine.begin() as conn:
+            conn.execute(insert(User), [{
+                'username': username, 'email': f'{username}@example.com',
+                'password_hash': 'x', 'full_name': username.title()
+            }])
+
+
+@pytest.fixture
+def built(app):
+    with app.app_context():
+        availability_index.rebuild()
+    return availability_index
+
+
+@pytest.fixture
+def queries(app):
+    statements = []
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+    return statements
+
+
+def test_free_and_taken_values(client, built):
+    assert register(client).status_code == 201
+
+    result = check(client, username='ana', email='ana@example.com')
+    assert result['username']['available'] is False
+    assert result['email']['available'] is False
+
+    result = check(client, username='luis', email='luis@example.com')
+    assert result['username']['available'] is True
+    assert result['email']['available'] is True
+
+
+def test_clearly_free_values_do_not_query_the_database(client, built, queries):
+    assert check(client, username='luis', email='luis@example.com')['username']['available'] is True
+    assert queries == []
+
+
+def test_possible_matches_are_confirmed_with_the_database(client, app, built, queries):
+    insert_from_other_process(app, 'importado')
+    availability_index.add('importado', 'importado@example.com')
+    with app.app_context():
+        db.session.execute(User.__table__.delete().where(User.username == 'importado'))
+        db.session.commit()
+    queries.clear()
+
+    # El filtro dice "puede existir" pero la fila ya no está
+    assert check(client, username='importado')['username']['available'] is True
+    assert len(queries) == 1
+
+
+def test_rebuild_picks_up_other_processes(client, app, built):
+    insert_from_other_process(app, 'importado')
+    with app.app_context():
+        availability_index.rebuild()
+
+    result = check(client, username='importado', email='importado@example.com')
+    assert result['username']['available'] is False
+    assert result['email']['available'] is False
+
+
+def test_bulk_import_adds_to_the_filter(app, runner, built, tmp_path):
+    path = tmp_path / 'users.jsonl'
+    path.write_text('{"username": "importado", "email": "importado@example.com", '
+                    '"full_name": "Importado", "password_hash": "x"}\n')
+    with app.app_context():
+        runner.invoke(args=['users', 'import', str(path), '--workers', '1'])
+        assert availability_index.is_username_available('importado') is False
+        assert availability_index.is_email_available('importado@example.com') is False
+
+
+def test_keys_added_during_a_rebuild_are_kept(app, built):
+    availability_index._building = True
+    availability_index.add('durante', 'durante@example.com')
+    with app.app_context():
+        availability_index.rebuild()
+    availability_index._building = False
+    assert 'u:durante' in availability_index._filter
+
+
+def test_check_availability_is_rate_limited_per_ip(client, built, monkeypatch):
+    monkeypatch.setattr(rate_limiter, 'enabled', True)
+    for _ in range(60):
+        assert client.get('/api/check-availability?username=luis').status_code == 200
+    assert client.get('/api/check-availability?username=luis').status_code == 429
+
+
+def test_register_reports_duplicates_from_unique_constraints(client):
+    assert register(client).status_code == 201
+
+    response = register(client, email='otra@example.com')
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'El nombre de usuario ya está en uso'
+
+    response = register(client, username='otra')
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'El email ya está registrado'
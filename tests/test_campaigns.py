@@ -0,0 +1,130 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert, select, update
+
+from src.models.email_campaign import EmailCampaign
+from src.models.lease import Lease
+from src.models.user import User, db
+from src.utils.campaigns import (CAMPAIGN_LEASE_SECONDS, CampaignLeaseLost, CampaignRunner, campaign_lease,
+                                 start_campaign)
+from src.utils.leases import acquire_lease
+
+
+@pytest.fixture
+def ctx(app, smtp_sink, monkeypatch):
+    monkeypatch.setenv('EMAIL_DELIVERY', 'smtp')
+    monkeypatch.setenv('EMAIL_SMTP_SERVER', '127.0.0.1')
+    monkeypatch.setenv('EMAIL_SMTP_PORT', str(smtp_sink.port))
+    monkeypatch.setenv('EMAIL_SMTP_STARTTLS', '0')
+    monkeypatch.setenv('EMAIL_PASSWORD', '')
+    with app.app_context():
+        now = datetime.utcnow()
+        db.session.execute(insert(User), [
+            {'username': f'user{i}', 'email': f'user{i}@example.com', 'password_hash': 'x',
+             'full_name': f'Usuario {i}', 'is_premium': True, 'premium_expires_at': now + timedelta(days=i)}
+            for i in range(1, 6)
+        ] + [
+            {'username': 'fuera', 'email': 'fuera@example.com', 'password_hash': 'x', 'full_name': 'Fuera',
+             'is_premium': True, 'premium_expires_at': now + timedelta(days=30)}
+        ])
+        db.session.commit()
+        yield
+
+
+def start(owner=None, force=False):
+    now = datetime.utcnow()
+    return start_campaign('renovacion', 'premium_renewal', 'Renueva', now, now + timedelta(days=7),
+                          force=force, owner=owner)
+
+
+def runner(campaign, **kwargs):
+    return CampaignRunner(campaign.id, batch_size=2, connections=1, render_workers=1, **kwargs)
+
+
+def campaign_row():
+    db.session.expire_all()
+    return EmailCampaign.query.filter_by(name='renovacion').one()
+
+
+def test_campaign_delivers_each_user_once(ctx, smtp_sink):
+    stats = runner(start()).run()
+
+    assert stats['sent'] == 5 and stats['failed'] == 0
+    assert sorted(smtp_sink.recipients) == [f'user{i}@example.com' for i in range(1, 6)]
+    campaign = campaign_row()
+    assert campaign.status == EmailCampaign.STATUS_COMPLETED and campaign.sent == 5
+    assert db.session.get(Lease, campaign_lease(campaign.id)) is None
+    assert start() is None
+
+
+def test_interrupted_campaign_resumes_from_checkpoint(ctx, smtp_sink):
+    def crash(stats, elapsed):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        runner(start(), progress=crash).run()
+    campaign = campaign_row()
+    assert campaign.status == EmailCampaign.STATUS_PAUSED and campaign.sent == 2
+    assert campaign.last_user_id == db.session.scalar(select(User.id).where(User.username == 'user2'))
+
+    stats = runner(start()).run()
+
+    assert stats['sent'] == 3
+    assert sorted(smtp_sink.recipients) == [f'user{i}@example.com' for i in range(1, 6)]
+    assert campaign_row().sent == 5
+
+
+def test_running_campaign_cannot_be_started_twice(ctx):
+    campaign = start(owner='worker-a')
+    assert start(owner='worker-b') is None
+    assert start(owner='worker-b', force=True).id == campaign.id
+    with pytest.raises(CampaignLeaseLost):
+        runner(campaign, owner='worker-a').run()
+
+
+def test_run_stops_sending_when_another_run_takes_over(ctx, smtp_sink):
+    campaign = start(owner='worker-a')
+
+    def take_over(stats, elapsed):
+        # Otra ejecución toma la campaña (p. ej. tras un lote más largo que la concesión)
+        acquire_lease(campaign_lease(campaign.id), 'worker-b', CAMPAIGN_LEASE_SECONDS, force=True)
+        db.session.execute(update(EmailCampaign).values(last_error='de worker-b'))
+        db.session.commit()
+        # Da tiempo al latido de worker-a para ver que la ha perdido
+        time.sleep(0.5)
+
+    with pytest.raises(CampaignLeaseLost):
+        runner(campaign, owner='worker-a', progress=take_over, lease_seconds=0.6).run()
+
+    # Solo el primer lote; el siguiente ya estaba renderizado pero no se envía
+    assert sorted(smtp_sink.recipients) == ['user1@example.com', 'user2@example.com']
+    campaign = campaign_row()
+    assert campaign.status == EmailCampaign.STATUS_RUNNING and campaign.sent == 2
+    assert campaign.last_error == 'de worker-b'
+    assert db.session.get(Lease, campaign_lease(campaign.id)).owner == 'worker-b'
+
+
+def test_heartbeat_keeps_the_lease_during_long_batches(ctx, smtp_sink):
+    def slow(stats, elapsed):
+        # Más que la concesión entera: sin latido otra ejecución podría tomarla
+        time.sleep(0.5)
+        assert start(owner='worker-b') is None
+
+    stats = runner(start(owner='worker-a'), owner='worker-a', progress=slow, lease_seconds=0.3).run()
+
+    assert stats['sent'] == 5
+    assert len(smtp_sink.recipients) == 5
+
+
+def test_user_stream_does_not_hold_a_connection_between_batches(ctx, smtp_sink):
+    open_connections = []
+
+    def progress(stats, elapsed):
+        # Un cursor abierto bloquearía los checkpoints con el journal de rollback
+        open_connections.append(db.engine.pool.checkedout())
+
+    runner(start(), progress=progress).run()
+
+    assert open_connections == [0, 0, 0]
@@ -0,0 +1,208 @@
+import time
+from datetime import datetime, timedelta
+from email import message_from_bytes, policy
+
+import pytest
+
+from src.models.email_outbox import EmailOutbox
+from src.models.user import db
+from src.utils.email_queue import SMTPConnectionPool, email_worker, enqueue_email
+
+
+@pytest.fixture
+def worker(app, smtp_sink):
+    """
+    El worker global entregando por SMTP al servidor de pruebas, sin hilos:
+    las pruebas llaman a process_batch()/drain() directamente.
+    """
+    email_worker.delivery = 'smtp'
+    email_worker.pool = SMTPConnectionPool('127.0.0.1', smtp_sink.port, starttls=False, size=1, timeout=5)
+    email_worker.retry_base = 30
+    email_worker.retry_max = 3600
+    email_worker.max_attempts = 3
+    with app.app_context():
+        yield email_worker
+    email_worker.pool.close()
+    email_worker.pool = None
+
+
+def enqueue(recipient='ana@example.com'):
+    row = enqueue_email('noreply@asforp.com', recipient, 'Asunto', f'Subject: Asunto\r\n\r\nHola {recipient}\r\n')
+    db.session.commit()
+    return row.id
+
+
+def outbox_row(row_id):
+    db.session.expire_all()
+    return db.session.get(EmailOutbox, row_id)
+
+
+def make_due(row_id):
+    db.session.execute(db.update(EmailOutbox).where(EmailOutbox.id == row_id).values(next_attempt_at=datetime.utcnow()))
+    db.session.commit()
+
+
+def test_enqueue_and_deliver(worker, smtp_sink):
+    ids = [enqueue(f'usuario{i}@example.com') for i in range(5)]
+
+    assert worker.drain() == 5
+
+    assert sorted(smtp_sink.recipients) == sorted(f'usuario{i}@example.com' for i in range(5))
+    # Todos los mensajes por la misma conexión del pool
+    assert smtp_sink.connections == 1
+    for row_id in ids:
+        row = outbox_row(row_id)
+        assert row.status == EmailOutbox.STATUS_SENT
+        assert row.attempts == 1
+        assert row.sent_at is not None and row.locked_at is None
+
+
+def test_register_enqueues_verification_email(client, app, smtp_sink, worker):
+    response = client.post('/api/register', json={
+        'username': 'ana', 'email': 'ana@example.com', 'password': 'secreta123', 'full_name': 'Ana'
+    })
+    assert response.status_code == 201
+
+    assert db.session.scalar(db.select(db.func.count()).select_from(EmailOutbox)) == 1
+    worker.drain()
+    assert smtp_sink.recipients == ['ana@example.com']
+    message = message_from_bytes(smtp_sink.messages[0][2], policy=policy.default)
+    assert 'verify-email?token=' in message.get_body(('plain',)).get_content()
+
+
+def test_temporary_failure_retries_with_exponential_backoff(worker, smtp_sink):
+    smtp_sink.fail_data = '451 Try again later'
+    row_id = enqueue()
+
+    delays = []
+    for attempt in (1, 2):
+        before = datetime.utcnow()
+        assert worker.process_batch() == 1
+        row = outbox_row(row_id)
+        assert row.status == EmailOutbox.STATUS_PENDING
+        assert row.attempts == attempt
+        assert '451' in row.last_error
+        delays.append((row.next_attempt_at - before).total_seconds())
+        # Todavía no toca: el siguiente lote no lo reclama
+        assert worker.process_batch() == 0
+        make_due(row_id)
+
+    # 30s y 60s, con ±10 % de jitter
+    assert 27 <= delays[0] <= 33.5
+    assert 54 <= delays[1] <= 66.5
+
+    smtp_sink.fail_data = None
+    assert worker.process_batch() == 1
+    assert outbox_row(row_id).status == EmailOutbox.STATUS_SENT
+    assert smtp_sink.recipients == ['ana@example.com']
+
+
+def test_retry_delay_is_capped():
+    email_worker.retry_base, email_worker.retry_max = 30, 3600
+    assert 3240 <= email_worker.retry_delay(20) <= 3960
+
+
+def test_permanent_failure_goes_to_dead_letter(worker, smtp_sink):
+    smtp_sink.fail_rcpt = '550 No such user'
+    row_id = enqueue()
+
+    assert worker.process_batch() == 1
+
+    row = outbox_row(row_id)
+    assert row.status == EmailOutbox.STATUS_DEAD
+    assert row.attempts == 1
+    assert '550' in row.last_error
+    # La conexión sigue siendo válida tras el rechazo y vuelve al pool
+    smtp_sink.fail_rcpt = None
+    enqueue('luis@example.com')
+    worker.drain()
+    assert smtp_sink.connections == 1
+    assert smtp_sink.recipients == ['luis@example.com']
+
+
+def test_too_many_attempts_goes_to_dead_letter(worker, smtp_sink):
+    smtp_sink.fail_data = '451 Try again later'
+    row_id = enqueue()
+
+    for _ in range(worker.max_attempts):
+        worker.process_batch()
+        make_due(row_id)
+
+    row = outbox_row(row_id)
+    assert row.status == EmailOutbox.STATUS_DEAD
+    assert row.attempts == worker.max_attempts
+
+
+def test_requeue_dead_command(worker, smtp_sink, runner):
+    smtp_sink.fail_rcpt = '550 No such user'
+    row_id = enqueue()
+    worker.process_batch()
+    assert outbox_row(row_id).status == EmailOutbox.STATUS_DEAD
+
+    result = runner.invoke(args=['email', 'requeue-dead'])
+    assert result.exit_code == 0
+    assert '1 mensajes reencolados' in result.output
+
+    row = outbox_row(row_id)
+    assert row.status == EmailOutbox.STATUS_PENDING
+    assert row.attempts == 0
+
+    smtp_sink.fail_rcpt = None
+    assert worker.drain() == 1
+    assert outbox_row(row_id).status == EmailOutbox.STATUS_SENT
+
+
+def test_stale_sending_rows_are_reclaimed(worker, smtp_sink):
+    row_id = enqueue()
+    worker.claim(10)
+    assert outbox_row(row_id).status == EmailOutbox.STATUS_SENDING
+    # Un worker que murió con el mensaje reservado
+    db.session.execute(db.update(EmailOutbox).where(EmailOutbox.id == row_id).values(
+        locked_at=datetime.utcnow() - timedelta(seconds=worker.lock_timeout + 1)
+    ))
+    db.session.commit()
+
+    assert worker.drain() == 1
+    row = outbox_row(row_id)
+    assert row.status == EmailOutbox.STATUS_SENT
+    assert row.attempts == 2
+
+
+def test_slow_batch_keeps_its_claim(worker, smtp_sink, monkeypatch):
+    ids = [enqueue(f'user{i}@example.com') for i in range(4)]
+    worker.lock_timeout = 0.3
+    deliver = worker.deliver
+    reclaimed = []
+
+    def slow_deliver(row):
+        time.sleep(0.15)
+        if row.id == ids[-1]:
+            # Otro worker busca reservas abandonadas cuando el lote ya dura más que EMAIL_LOCK_TIMEOUT
+            reclaimed.extend(worker.claim(10))
+        deliver(row)
+
+    monkeypatch.setattr(worker, 'deliver', slow_deliver)
+    assert worker.process_batch() == 4
+
+    assert reclaimed == []
+    assert len(smtp_sink.messages) == 4
+    assert {outbox_row(row_id).status for row_id in ids} == {EmailOutbox.STATUS_SENT}
+
+
+def test_rows_reclaimed_by_another_worker_are_not_sent_again(worker, smtp_sink, monkeypatch):
+    first, second = enqueue('ana@example.com'), enqueue('luis@example.com')
+    deliver = worker.deliver
+
+    def deliver_and_lose_claim(row):
+        deliver(row)
+        if row.id == first:
+            # Otro worker se queda con el lote (p. ej. tras una pausa más larga que la reserva)
+            db.session.execute(db.update(EmailOutbox).values(locked_at=datetime.utcnow() + timedelta(seconds=1)))
+            db.session.commit()
+            worker.lock_timeout = 0
+
+    monkeypatch.setattr(worker, 'deliver', deliver_and_lose_claim)
+    worker.process_batch()
+
+    assert smtp_sink.recipients == ['ana@example.com']
+    assert outbox_row(second).status == EmailOutbox.STATUS_SENDING
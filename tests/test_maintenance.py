@@ -0,0 +1,127 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert, select
+
+from src.models.user import User, db
+from src.utils.cache import user_cache
+from src.utils.leases import acquire_lease, release_lease
+from src.utils.maintenance import MAINTENANCE_LEASE, expire_premium, purge_unverified, run_maintenance
+
+
+@pytest.fixture
+def ctx(app):
+    with app.app_context():
+        yield
+
+
+def add_user(username, **values):
+    values.setdefault('email', f'{username}@example.com')
+    db.session.execute(insert(User), [dict(username=username, password_hash='x', full_name=username, **values)])
+    db.session.commit()
+    return db.session.scalar(select(User.id).where(User.username == username))
+
+
+def committed_row(app, user_id):
+    # Lectura desde otra conexión: solo ve lo confirmado
+    with db.engine.connect() as conn:
+        return conn.execute(select(User.is_premium).where(User.id == user_id)).first()
+
+
+def test_expire_premium_invalidates_after_commit(app, ctx, monkeypatch):
+    past = datetime.utcnow() - timedelta(days=1)
+    user_id = add_user('ana', is_verified=True, is_premium=True, premium_expires_at=past)
+    assert user_cache.get(user_id)['is_premium'] is True
+
+    seen = []
+    invalidate = user_cache.invalidate
+    monkeypatch.setattr(user_cache, 'invalidate', lambda uid: (seen.append(committed_row(app, uid)), invalidate(uid)))
+
+    result = expire_premium(pause=0)
+
+    assert result['rows'] == 1
+    # Al invalidar, el cambio ya estaba confirmado
+    assert seen == [(False,)]
+    assert user_cache.get(user_id)['is_premium'] is False
+
+
+def test_purge_unverified_invalidates_deleted_users(ctx):
+    old = datetime.utcnow() - timedelta(days=30)
+    user_id = add_user('viejo', is_verified=False, created_at=old)
+    user_cache.get(user_id)
+
+    assert purge_unverified(pause=0)['rows'] == 1
+    assert user_cache.get(user_id) is None
+
+
+def test_lease_has_a_single_owner(ctx):
+    assert acquire_lease(MAINTENANCE_LEASE, 'worker-1', 60)
+    assert not acquire_lease(MAINTENANCE_LEASE, 'worker-2', 60)
+    # El dueño la renueva
+    assert acquire_lease(MAINTENANCE_LEASE, 'worker-1', 60)
+
+    release_lease(MAINTENANCE_LEASE, 'worker-2')
+    assert not acquire_lease(MAINTENANCE_LEASE, 'worker-2', 60)
+    release_lease(MAINTENANCE_LEASE, 'worker-1')
+    assert acquire_lease(MAINTENANCE_LEASE, 'worker-2', 60)
+
+
+def test_expired_lease_is_taken_over(ctx):
+    assert acquire_lease(MAINTENANCE_LEASE, 'worker-1', -1)
+    assert acquire_lease(MAINTENANCE_LEASE, 'worker-2', 60)
+    assert not acquire_lease(MAINTENANCE_LEASE, 'worker-1', 60)
+
+
+def test_run_stops_when_the_lease_is_lost(app, ctx):
+    calls = []
+
+    def heartbeat():
+        calls.append(1)
+        return len(calls) <= 2
+
+    report = run_maintenance(app.config, heartbeat=heartbeat)
+    assert list(report) == ['expire_premium', 'purge_unverified']
+
+
+def test_scheduler_runs_in_one_worker_only(app, ctx):
+    scheduler = app.extensions['maintenance_scheduler']
+    scheduler._owner = 'worker-1'
+    assert scheduler._renew()
+    scheduler._owner = 'worker-2'
+    assert not scheduler._renew()
+
+
+def test_cli_skips_while_another_process_holds_the_lease(ctx, runner):
+    acquire_lease(MAINTENANCE_LEASE, 'otro-proceso', 60)
+
+    result = runner.invoke(args=['maintenance', 'run'])
+    assert 'Otro proceso' in result.output
+
+    result = runner.invoke(args=['maintenance', 'run', '--force'])
+    assert result.exit_code == 0
+    assert 'expire_premium' in result.output and 'purge_auth_events' in result.output
+
+
+def test_task_stops_when_the_lease_expires_mid_task(app, ctx):
+    old = datetime.utcnow() - timedelta(days=30)
+    for i in range(5):
+        add_user(f'viejo{i}', is_verified=False, created_at=old)
+    owner = 'worker-1'
+    assert acquire_lease(MAINTENANCE_LEASE, owner, 60)
+    batches = []
+
+    def heartbeat():
+        batches.append(1)
+        if len(batches) == 3:
+            # La concesión caduca en mitad de la tarea y otro worker la toma
+            assert acquire_lease(MAINTENANCE_LEASE, owner, -1)
+            assert acquire_lease(MAINTENANCE_LEASE, 'worker-2', 60)
+        return acquire_lease(MAINTENANCE_LEASE, owner, 60)
+
+    config = dict(app.config, MAINTENANCE_BATCH_SIZE=2, MAINTENANCE_BATCH_PAUSE=0)
+    report = run_maintenance(config, heartbeat=heartbeat)
+
+    # Latidos antes de cada tarea y tras el primer lote de purge_unverified: ahí se pierde
+    assert list(report) == ['expire_premium', 'purge_unverified']
+    assert report['purge_unverified'] == dict(report['purge_unverified'], rows=2, batches=1, stopped=True)
+    assert db.session.scalar(select(db.func.count()).select_from(User)) == 3
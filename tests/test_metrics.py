@@ -0,0 +1,78 @@
+import gzip
+import re
+
+import pytest
+from sqlalchemy import insert
+
+from src.models.user import User, db
+from src.utils.metrics import metrics
+
+ADMIN = {'X-Admin-Token': 'test-admin-token'}
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics():
+    # `metrics` es global al proceso: cada prueba empieza sin medidas
+    for store in (metrics.requests, metrics.durations, metrics.phases, metrics.sizes, metrics.queries):
+        store.clear()
+
+
+@pytest.fixture
+def users(app):
+    with app.app_context():
+        db.session.execute(insert(User), [
+            {'username': f'usuario{i}', 'email': f'usuario{i}@example.com', 'password_hash': 'x',
+             'full_name': f'Usuario número {i}'}
+            for i in range(300)
+        ])
+        db.session.commit()
+
+
+def sample(text, name, **labels):
+    selector = ','.join(f'{key}="{value}"' for key, value in labels.items())
+    match = re.search(rf'^{name}{{{re.escape(selector)}}} (\S+)$', text, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+
+def test_metrics_require_admin_token(client):
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'X-Admin-Token': 'otro'}).status_code == 401
+    assert client.get('/metrics', headers=ADMIN).status_code == 200
+    assert client.get('/metrics', headers={'Authorization': 'Bearer test-admin-token'}).status_code == 200
+
+
+def test_public_metrics_flag(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'public.db'}")
+    monkeypatch.setenv('EMAIL_WORKERS', '0')
+    from src.main import create_app
+
+    app = create_app({'METRICS_PUBLIC': True, 'SCHEMA_AUTO_CREATE': True})
+    assert app.test_client().get('/metrics').status_code == 200
+
+
+def test_streamed_listing_is_measured_until_the_body_is_sent(client, users):
+    # buffered=True: el cliente lee el cuerpo entero y cierra la respuesta, como un servidor WSGI
+    response = client.get('/api/?limit=300', buffered=True)
+    body = response.get_data()
+    assert response.status_code == 200 and body.count(b'"username"') == 300
+
+    text = client.get('/metrics', headers=ADMIN).get_data(as_text=True)
+    labels = {'endpoint': 'user.get_users', 'phase': 'db'}
+    assert sample(text, 'asforp_request_phase_seconds_count', **labels) == 1
+    assert sample(text, 'asforp_request_phase_seconds_sum', **labels) > 0
+    # El tamaño incluye el cuerpo generado en streaming
+    assert sample(text, 'asforp_response_size_bytes_sum', endpoint='user.get_users', method='GET') == len(body)
+    total = sample(text, 'asforp_request_duration_seconds_sum', endpoint='user.get_users', method='GET')
+    assert total >= sample(text, 'asforp_request_phase_seconds_sum', **labels)
+
+
+def test_compress_phase_is_exported(client, users):
+    response = client.get('/api/?limit=300', headers={'Accept-Encoding': 'gzip'}, buffered=True)
+    assert response.headers['Content-Encoding'] == 'gzip'
+    body = response.get_data()
+    assert gzip.decompress(body).count(b'"username"') == 300
+
+    text = client.get('/metrics', headers=ADMIN).get_data(as_text=True)
+    assert 'fase (db, password_hash, email, json, compress, other)' in text
+    assert sample(text, 'asforp_request_phase_seconds_count', endpoint='user.get_users', phase='compress') == 1
+    assert sample(text, 'asforp_response_size_bytes_sum', endpoint='user.get_users', method='GET') == len(body)
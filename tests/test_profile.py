@@ -0,0 +1,87 @@
+import time
+
+import pytest
+from sqlalchemy import event, update
+
+from src.models.user import User, db
+from src.utils import cache as cache_module
+from src.utils.cache import user_cache
+
+
+@pytest.fixture
+def logged_in(client, app):
+    response = client.post('/api/register', json={
+        'username': 'ana', 'email': 'ana@example.com', 'password': 'secreta123', 'full_name': 'Ana'
+    })
+    user_id = response.get_json()['user_id']
+    with app.app_context():
+        db.session.execute(update(User).where(User.id == user_id).values(is_verified=True))
+        db.session.commit()
+    assert client.post('/api/login', json={'username': 'ana', 'password': 'secreta123'}).status_code == 200
+    return user_id
+
+
+def update_from_other_process(app, user_id, **values):
+    # Como otro worker: escribe sin pasar por la caché de este proceso
+    with app.app_context():
+        with db.engine.begin() as conn:
+            conn.execute(update(User).where(User.id == user_id).values(version=User.version + 1, **values))
+
+
+def test_conditional_get_answers_304(client, logged_in):
+    response = client.get('/api/profile')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+
+    response = client.get('/api/profile', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+
+
+def count_queries(app):
+    queries = []
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: queries.append(args[2]))
+    return queries
+
+
+def test_cached_profile_does_not_query_the_database(client, app, logged_in):
+    client.get('/api/profile')
+    queries = count_queries(app)
+
+    response = client.get('/api/profile')
+    assert response.status_code == 200
+    assert client.get('/api/profile', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+    assert queries == []
+
+
+def test_change_in_other_process_is_seen_after_the_ttl(client, app, logged_in, monkeypatch):
+    response = client.get('/api/profile')
+    etag = response.headers['ETag']
+    assert response.get_json()['user']['is_premium'] is False
+
+    update_from_other_process(app, logged_in, is_premium=True)
+    # Dentro del TTL se acepta la copia de este proceso
+    assert client.get('/api/profile', headers={'If-None-Match': etag}).status_code == 304
+
+    later = time.monotonic() + app.config['USER_CACHE_TTL'] + 1
+    monkeypatch.setattr(cache_module.time, 'monotonic', lambda: later)
+    response = client.get('/api/profile', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert response.get_json()['user']['is_premium'] is True
+
+
+def test_upgrade_checks_the_version_against_the_database(client, app, logged_in):
+    client.get('/api/profile')
+    update_from_other_process(app, logged_in, is_premium=True)
+
+    response = client.post('/api/upgrade-premium', json={'payment_reference': 'BZ-1'})
+    assert response.status_code == 400
+    assert user_cache.stats()['stale'] == 1
+
+
+def test_fields_projection(client, logged_in):
+    response = client.get('/api/profile?fields=username,is_premium')
+    assert response.get_json() == {'user': {'username': 'ana', 'is_premium': False}}
+    assert client.get('/api/profile?fields=password_hash').status_code == 400
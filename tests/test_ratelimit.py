@@ -0,0 +1,69 @@
+import pytest
+
+from src.utils.ratelimit import rate_limiter
+
+
+@pytest.fixture
+def limited(app, monkeypatch):
+    monkeypatch.setattr(rate_limiter, 'enabled', True)
+    return app
+
+
+def login(client, ip, username='ana', password='incorrecta'):
+    return client.post('/api/login', json={'username': username, 'password': password},
+                       environ_base={'REMOTE_ADDR': ip})
+
+
+def test_attacker_cannot_lock_out_account_from_another_ip(client, limited):
+    for _ in range(10):
+        assert login(client, '203.0.113.7').status_code == 401
+    response = login(client, '203.0.113.7')
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+
+    # La misma cuenta desde la IP de la víctima sigue pudiendo intentarlo
+    assert login(client, '198.51.100.2').status_code == 401
+
+
+def test_account_ceiling_applies_across_ips(client, limited, monkeypatch):
+    monkeypatch.setattr(rate_limiter, 'overrides', {
+        'user.login': {'account_ip': '2/minute', 'account': '3/minute', 'account_field': 'username'}
+    })
+    assert login(client, '203.0.113.1').status_code == 401
+    assert login(client, '203.0.113.1').status_code == 401
+    assert login(client, '203.0.113.1').status_code == 429
+    assert login(client, '203.0.113.2').status_code == 401
+    assert login(client, '203.0.113.3').status_code == 429
+    assert login(client, '203.0.113.3', username='otra').status_code == 401
+
+
+def test_spoofed_forwarded_for_does_not_change_the_client_ip(client, limited, monkeypatch):
+    monkeypatch.setattr(rate_limiter, 'trust_proxy', 1)
+
+    def spoofed(i):
+        # El cliente inventa la primera entrada; el proxy añade la dirección real
+        return client.post('/api/login', json={'username': 'ana', 'password': 'incorrecta'},
+                           headers={'X-Forwarded-For': f'10.0.0.{i}, 203.0.113.7'},
+                           environ_base={'REMOTE_ADDR': '192.0.2.1'})
+
+    for i in range(10):
+        assert spoofed(i).status_code == 401
+    assert spoofed(10).status_code == 429
+
+
+def test_client_ip_uses_the_address_added_by_the_trusted_proxies(app, monkeypatch):
+    monkeypatch.setattr(rate_limiter, 'trust_proxy', 2)
+    headers = {'X-Forwarded-For': '127.0.0.1, 203.0.113.7, 10.0.0.2'}
+    with app.test_request_context(headers=headers, environ_base={'REMOTE_ADDR': '10.0.0.1'}):
+        assert rate_limiter.client_ip() == '203.0.113.7'
+    with app.test_request_context(headers={'X-Forwarded-For': '127.0.0.1'}, environ_base={'REMOTE_ADDR': '10.0.0.1'}):
+        assert rate_limiter.client_ip() == '10.0.0.1'
+
+
+@pytest.mark.parametrize('body', ['[1]', '"ana"', '3', 'null'])
+def test_non_object_json_body_does_not_break_the_limiter(client, limited, body):
+    response = client.post('/api/login', data=body, content_type='application/json',
+                           environ_base={'REMOTE_ADDR': '203.0.113.7'})
+    # La vista responde con su propio JSON; el before_request no lanza
+    assert response.is_json
+    assert response.status_code != 429
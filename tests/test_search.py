@@ -0,0 +1,35 @@
+from sqlalchemy import insert, text
+
+from src.models.user import User, db
+
+ADMIN = {'X-Admin-Token': 'test-admin-token'}
+
+
+def add_users(app):
+    with app.app_context():
+        db.session.execute(insert(User), [
+            {'username': 'jose', 'email': 'jose@example.com', 'password_hash': 'x', 'full_name': 'José Pérez'},
+            {'username': 'ana', 'email': 'ana@example.com', 'password_hash': 'x', 'full_name': 'Ana López'},
+        ])
+        db.session.commit()
+
+
+def test_search_matches_prefix_without_accents(client, app):
+    add_users(app)
+    response = client.get('/api/users/search?q=pere&fields=username', headers=ADMIN)
+    assert response.status_code == 200
+    assert response.get_json() == {'users': [{'username': 'jose'}], 'next_offset': None}
+
+
+def test_search_without_fts_index_answers_503(client, app):
+    add_users(app)
+    with app.app_context():
+        with db.engine.begin() as conn:
+            for trigger in ('user_search_ai', 'user_search_ad', 'user_search_au'):
+                conn.execute(text(f'DROP TRIGGER {trigger}'))
+            conn.execute(text('DROP TABLE user_search'))
+
+    response = client.get('/api/users/search?q=ana', headers=ADMIN)
+
+    assert response.status_code == 503
+    assert 'FTS5' in response.get_json()['error']
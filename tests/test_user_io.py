@@ -0,0 +1,96 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import func, insert, select
+
+from src.models.user import User, db
+from src.utils import user_io
+from src.utils.user_io import UserImporter, read_rows
+
+HASH_METHOD = 'pbkdf2:sha256:1000'
+
+
+@pytest.fixture
+def ctx(app):
+    with app.app_context():
+        yield
+
+
+def user(username, **extra):
+    row = {'username': username, 'email': f'{username}@example.com', 'full_name': username.title(),
+           'password': 'secreta123'}
+    row.update(extra)
+    return row
+
+
+def write_jsonl(path, lines):
+    path.write_text('\n'.join(line if isinstance(line, str) else json.dumps(line) for line in lines) + '\n')
+    return path
+
+
+def test_import_counts_invalid_rows_without_aborting(ctx, runner, tmp_path):
+    path = write_jsonl(tmp_path / 'users.jsonl', [
+        user('ana'),
+        '{"username": "roto", ',
+        user('luis', phone=None),
+        user('marta', full_name=None),
+        user('pedro', phone=612345678),
+        user('sara', email=['sara@example.com']),
+        '["no", "es", "un", "objeto"]',
+        user('juan', created_at='ayer'),
+        user('eva'),
+    ])
+
+    result = runner.invoke(args=['users', 'import', str(path), '--workers', '1', '--hash-method', HASH_METHOD])
+
+    assert result.exit_code == 0, result.output
+    assert '4 insertados, 0 duplicados, 5 inválidos' in result.output
+    assert 'fila 2: JSON inválido' in result.output
+    assert 'fila 6: email debe ser texto' in result.output
+    assert set(db.session.scalars(select(User.username))) == {'ana', 'luis', 'pedro', 'eva'}
+    assert db.session.scalar(select(User.phone).where(User.username == 'pedro')) == '612345678'
+
+
+def test_rows_inserted_concurrently_are_skipped(ctx, monkeypatch):
+    db.session.execute(insert(User), [{'username': 'ana', 'email': 'ana@example.com', 'password_hash': 'x',
+                                       'full_name': 'Ana'}])
+    db.session.commit()
+    # Como si otro proceso insertara la fila después de la comprobación de duplicados
+    monkeypatch.setattr(user_io, '_existing', lambda column, values: set())
+
+    with ThreadPoolExecutor(1) as executor:
+        importer = UserImporter(executor, HASH_METHOD)
+        stats = importer.run([user('ana'), user('luis'), user('otra', email='ana@example.com'), user('eva')])
+
+    assert stats == {'read': 4, 'inserted': 2, 'duplicates': 2, 'invalid': 0}
+    assert db.session.scalar(select(func.count()).select_from(User)) == 3
+
+
+def test_duplicates_in_file_and_table(ctx):
+    db.session.execute(insert(User), [{'username': 'ana', 'email': 'ana@example.com', 'password_hash': 'x',
+                                       'full_name': 'Ana'}])
+    db.session.commit()
+
+    with ThreadPoolExecutor(1) as executor:
+        stats = UserImporter(executor, HASH_METHOD, batch_size=2).run(
+            [user('ana'), user('luis'), user('luis', email='otro@example.com'), user('eva', password_hash='pbkdf2:x')]
+        )
+
+    assert stats == {'read': 4, 'inserted': 2, 'duplicates': 2, 'invalid': 0}
+    assert db.session.scalar(select(User.password_hash).where(User.username == 'eva')) == 'pbkdf2:x'
+
+
+def test_read_rows_csv_and_export_roundtrip(ctx, runner, tmp_path):
+    path = tmp_path / 'users.csv'
+    path.write_text('username,email,full_name,password,is_premium\nana,ana@example.com,Ana,secreta123,sí\n')
+    with open(path, newline='') as f:
+        assert list(read_rows(f, 'csv'))[0]['is_premium'] == 'sí'
+
+    result = runner.invoke(args=['users', 'import', str(path), '--workers', '1', '--hash-method', HASH_METHOD])
+    assert '1 insertados' in result.output
+
+    out = tmp_path / 'export.jsonl'
+    runner.invoke(args=['users', 'export', str(out)])
+    exported = [json.loads(line) for line in out.read_text().splitlines()]
+    assert [(row['username'], row['is_premium']) for row in exported] == [('ana', True)]
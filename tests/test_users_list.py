@@ -0,0 +1,37 @@
+from sqlalchemy import insert
+
+from src.models.user import User, db
+
+
+def write(app, statement, rows=None):
+    # Como otro worker o el mantenimiento: otra conexión, sin el ORM
+    with app.app_context():
+        with db.engine.begin() as conn:
+            conn.execute(statement, rows)
+
+
+def user(username):
+    return {'username': username, 'email': f'{username}@example.com', 'password_hash': 'x', 'full_name': username}
+
+
+def test_page_answers_304_while_unchanged(client, app):
+    write(app, insert(User), [user('ana'), user('luis')])
+    response = client.get('/api/?fields=username', buffered=True)
+    etag = response.headers['ETag']
+
+    assert client.get('/api/?fields=username', headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_delete_then_insert_reusing_the_id_changes_the_etag(client, app):
+    write(app, insert(User), [user('ana'), user('luis')])
+    response = client.get('/api/?fields=id,username', buffered=True)
+    etag = response.headers['ETag']
+    assert [row['username'] for row in response.get_json()['users']] == ['ana', 'luis']
+
+    # SQLite reutiliza el id 2: mismo número de filas, último id y suma de versiones
+    write(app, User.__table__.delete().where(User.username == 'luis'))
+    write(app, insert(User), [user('marta')])
+
+    response = client.get('/api/?fields=id,username', headers={'If-None-Match': etag}, buffered=True)
+    assert response.status_code == 200
+    assert response.get_json()['users'] == [{'id': 1, 'username': 'ana'}, {'id': 2, 'username': 'marta'}]